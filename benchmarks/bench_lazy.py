@@ -0,0 +1,89 @@
+"""Lazy attribute benchmark: per-node cost of the first and later accesses.
+
+    python benchmarks/bench_lazy.py [FILES]
+
+Simulates a walk over FILES regular files (1M by default). stat() returns
+a canned result so only the attribute machinery is measured; the legacy
+class restores the previous ``__getattr__`` for comparison.
+"""
+
+import os
+import sys
+from pathlib import Path
+from time import perf_counter
+
+# run as a script from anywhere: the repo root, not benchmarks/, holds ghrapt
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ghrapt.util.tree.local_node import LocalAux, LocalNode  # noqa: E402
+
+ST = os.stat_result((0o100644, 1, 1, 1, 0, 0, 123, 0, 0, 0))
+
+
+class BenchNode(LocalNode):
+    __slots__ = ()
+
+    def stat(self):
+        return ST
+
+    def _get_hash(self):
+        return "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+
+
+class LegacyNode(BenchNode):
+    __slots__ = ()
+
+    def __getattr__(self, name: str):
+        if not name.startswith("_"):
+            getter_name = f"_get_{name}"
+            getter = getattr(self, getter_name, None)
+
+            if getter is not None:
+                setattr(self, name, None)
+                value = getter()
+                setattr(self, name, value)
+                return value
+
+        try:
+            return super(LocalNode, self).__getattr__(name)
+        except AttributeError:
+            raise AttributeError(
+                f"'{self.__class__.__name__}' has no attribute '{name}'. "
+            ) from None
+
+
+def make(cls, n):
+    root = cls("ROOT")
+    root.aux = LocalAux()
+    return [cls(f"f{i}", root) for i in range(n)]
+
+
+def touch(nodes):
+    t = perf_counter()
+    for x in nodes:
+        x.mode, x.size, x.type, x.hash, x.first_child
+    return perf_counter() - t
+
+
+def miss(nodes):
+    t = perf_counter()
+    for x in nodes:
+        getattr(x, "_ignore", None)
+    return perf_counter() - t
+
+
+def main(n=1000000):
+    for cls in (LegacyNode, BenchNode):
+        nodes = make(cls, n)
+        first = touch(nodes)
+        again = touch(nodes)
+        none = miss(nodes)
+        print(
+            f"{cls.__name__:<10} first {first * 1e9 / n:6.0f} ns/node"
+            f"  cached {again * 1e9 / n:5.0f} ns/node"
+            f"  missing {none * 1e9 / n:5.0f} ns/node"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
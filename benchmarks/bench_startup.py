@@ -0,0 +1,69 @@
+"""Startup budget: import time of the command line module.
+
+    python benchmarks/bench_startup.py [--budget MS] [--runs N]
+
+Runs ``python -X importtime -c "import ghrapt.__main__"`` N times and
+takes the best cumulative time of ghrapt.__main__. Exits with 1 when it is
+over the budget, or when a module that should load lazily (hashing, ignore
+rules, network, logging) is imported at startup.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+TOP = Path(__file__).resolve().parent.parent
+
+# modules only the commands that need them may import
+LAZY = (
+    "ghrapt.util.tree",
+    "ghrapt.util.listing",
+    "ghrapt.helper",
+    "hashlib",
+    "json",
+    "logging",
+    "pathlib",
+    "requests",
+)
+
+
+def import_times(module="ghrapt.__main__"):
+    """Returns {module: (self us, cumulative us)} for one fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=str(TOP))
+    r = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in r.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            own, total, name = line[12:].split("|")
+            if own.strip().isdigit():
+                times[name.strip()] = (int(own), int(total))
+    return times
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--budget", type=float, default=20.0, help="Milliseconds")
+    p.add_argument("--runs", type=int, default=5)
+    args = p.parse_args(argv)
+    best = None
+    for _ in range(args.runs):
+        times = import_times()
+        total = times["ghrapt.__main__"][1] / 1000
+        best = total if best is None else min(best, total)
+    eager = sorted(x for x in times if x.startswith(LAZY))
+    print(f"ghrapt.__main__ {best:.2f}ms (budget {args.budget:g}ms)")
+    for name in eager:
+        print(f"imported at startup: {name}")
+    return 1 if best > args.budget or eager else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Walk, ignore and hash throughput over synthetic trees.
+
+    python benchmarks/bench_suite.py run [-o RESULTS.json] [--scale S]
+        [--repeat N] [--only NAME...] [--dir DIR]
+    python benchmarks/bench_suite.py compare OLD.json NEW.json [--threshold T]
+        [--noise SECONDS]
+
+run builds the trees of trees.py (in a temporary directory unless --dir
+is given, where they are kept and reused) and times, for each tree:
+
+    items      listing every directory through LocalAux.items, no ignore
+    ignore     hook_ignore over every listed entry
+    hash_reg   get_hash_reg on every regular file
+    hash_tree  calc_hash_tree of every directory, file hashes known
+    app        ``ghrapt list`` end to end, output discarded
+
+Each benchmark runs --repeat times and keeps the best time; the page
+cache is warm. Results are JSON, keyed "<tree>/<benchmark>". compare
+prints the ratio of the best times and exits with 1 when one of them is
+slower than OLD by more than the threshold (10% by default) and by more
+than the noise (2ms).
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+# run as a script from anywhere: the repo root, not benchmarks/, holds ghrapt
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from trees import TREES  # noqa: E402
+
+from ghrapt.util.tree.hook_ignore import hook_ignore  # noqa: E402
+from ghrapt.util.tree.local_node import LocalAux, get_hash_reg  # noqa: E402
+
+
+def local_tree(top: Path, ignore=True):
+    aux = LocalAux()
+    aux.symlink_strategy("keep", "keep")
+    if not ignore:
+        aux.filter_dir = lambda node: None
+    return aux.node_from(top, "ROOT")
+
+
+def dirs_of(root):
+    return [root, *(x for x in root.iter_preorder() if x.is_dir())]
+
+
+def bench_items(top: Path):
+    def run():
+        return sum(1 for _ in local_tree(top, False).iter_preorder())
+
+    return run, None
+
+
+def bench_ignore(top: Path):
+    dirs = dirs_of(local_tree(top))
+
+    def run():
+        for d in dirs:
+            d.forget("_ignore")
+        n = 0
+        for d in dirs:
+            f = hook_ignore(d)
+            for x in d:
+                n += 1
+                f and f(x)
+        return n
+
+    return run, None
+
+
+def bench_hash_reg(top: Path):
+    root = local_tree(top)
+    files = [x for x in root.iter_preorder() if x.is_file() and not x.is_symlink()]
+    size = sum(x.size for x in files)
+
+    def run():
+        for x in files:
+            get_hash_reg(x)
+        return len(files)
+
+    return run, size
+
+
+def bench_hash_tree(top: Path):
+    root = local_tree(top)
+    dirs = dirs_of(root)
+    root.get_hash()  # lists and hashes the files
+
+    def run():
+        for d in reversed(dirs):
+            d.hash = d.calc_hash_tree()
+        return len(dirs)
+
+    return run, None
+
+
+def bench_app(top: Path):
+    from ghrapt.__main__ import App
+
+    def run():
+        App().main(["list", "-o", os.devnull, str(top)])
+
+    return run, None
+
+
+BENCHMARKS = {
+    "items": bench_items,
+    "ignore": bench_ignore,
+    "hash_reg": bench_hash_reg,
+    "hash_tree": bench_hash_tree,
+    "app": bench_app,
+}
+
+
+def measure(make, top: Path, repeat: int):
+    run, size = make(top)
+    times = []
+    count = None
+    for _ in range(repeat):
+        t = perf_counter()
+        count = run()
+        times.append(perf_counter() - t)
+    v = {"best": min(times), "median": median(times), "runs": times}
+    if count is not None:
+        v["count"] = count
+    if size:
+        v["bytes"] = size
+        v["mb_s"] = size / min(times) / 1e6
+    return v
+
+
+def cmd_run(args) -> int:
+    base = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="ghrapt-"))
+    results = {}
+    try:
+        for name, make_tree in TREES.items():
+            if args.only and name not in args.only:
+                continue
+            top = base / f"{name}-{args.scale:g}"
+            if not top.exists():
+                t = perf_counter()
+                make_tree(top, args.scale)
+                print(f"{name}: built in {perf_counter() - t:.1f}s", file=sys.stderr)
+            for bench, make in BENCHMARKS.items():
+                key = f"{name}/{bench}"
+                v = results[key] = measure(make, top, args.repeat)
+                extra = f"  {v['mb_s']:8.1f} MB/s" if "mb_s" in v else ""
+                print(f"{key:<22} {v['best']:9.4f}s{extra}", file=sys.stderr)
+    finally:
+        args.dir or shutil.rmtree(base)
+    doc = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output and args.output != "-":
+        with open(args.output, "w") as h:
+            json.dump(doc, h, indent=1)
+    else:
+        json.dump(doc, sys.stdout, indent=1)
+    return 0
+
+
+def compare(old: dict, new: dict, threshold=0.10, noise=0.002):
+    """
+    Yields (key, old best, new best, ratio, regressed) for common keys;
+    slowdowns under noise seconds are not regressions.
+    """
+    a = old["results"]
+    b = new["results"]
+    for key in sorted(a.keys() & b.keys()):
+        x = a[key]["best"]
+        y = b[key]["best"]
+        ratio = y / x if x else float("inf")
+        yield key, x, y, ratio, ratio > 1 + threshold and y - x > noise
+
+
+def cmd_compare(args) -> int:
+    docs = []
+    for path in (args.old, args.new):
+        with open(path) as h:
+            docs.append(json.load(h))
+    bad = 0
+    for key, x, y, ratio, regressed in compare(*docs, args.threshold, args.noise):
+        bad += regressed
+        mark = "  REGRESSION" if regressed else ""
+        print(f"{key:<22} {x:9.4f}s {y:9.4f}s {ratio:6.2f}x{mark}")
+    if docs[0].get("scale") != docs[1].get("scale"):
+        print("warning: the runs used different scales", file=sys.stderr)
+    return 1 if bad else 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = p.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("run", help="Run the benchmarks")
+    r.add_argument("-o", "--output", help="Write the JSON results to this file")
+    r.add_argument("--scale", type=float, default=1.0, help="Tree size factor")
+    r.add_argument("--repeat", type=int, default=3, help="Runs per benchmark")
+    r.add_argument("--only", nargs="+", choices=list(TREES), help="Trees to use")
+    r.add_argument("--dir", help="Keep the generated trees in this directory")
+    r.set_defaults(fun=cmd_run)
+    c = sub.add_parser("compare", help="Flag regressions between two runs")
+    c.add_argument("old")
+    c.add_argument("new")
+    c.add_argument(
+        "--threshold", type=float, default=0.10, help="Tolerated slowdown ratio"
+    )
+    c.add_argument(
+        "--noise", type=float, default=0.002, help="Ignored slowdown in seconds"
+    )
+    c.set_defaults(fun=cmd_compare)
+    args = p.parse_args(argv)
+    return args.fun(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Synthetic trees for the benchmarks.
+
+Every generator is deterministic: names, sizes and contents come from a
+random.Random seeded with the generator's parameters, so two runs with the
+same scale produce byte-identical trees. ``scale`` multiplies the entry
+counts (and the huge file sizes).
+"""
+
+import os
+from pathlib import Path
+from random import Random
+
+MB = 1 << 20
+
+
+def _write(path: Path, rng: Random, size: int) -> None:
+    path.write_bytes(rng.randbytes(size))
+
+
+def wide(top: Path, scale=1.0):
+    """One directory with many files."""
+    rng = Random(f"wide {scale}")
+    top.mkdir(parents=True)
+    for i in range(int(20000 * scale)):
+        _write(top / f"f{i:06d}.dat", rng, rng.randrange(256))
+
+
+def deep(top: Path, scale=1.0):
+    """A chain of directories with a few files at each level."""
+    rng = Random(f"deep {scale}")
+    cur = top
+    for i in range(int(400 * scale)):
+        cur = cur / f"d{i}"
+        cur.mkdir(parents=True)
+        for j in range(3):
+            _write(cur / f"f{j}", rng, rng.randrange(1024))
+
+
+def small(top: Path, scale=1.0):
+    """Many small files over a balanced two level layout."""
+    rng = Random(f"small {scale}")
+    n = int(50 * scale) or 1
+    for i in range(n):
+        for j in range(20):
+            d = top / f"a{i:03d}" / f"b{j:02d}"
+            d.mkdir(parents=True)
+            for k in range(40):
+                _write(d / f"f{k:02d}.txt", rng, rng.randrange(4096))
+
+
+def huge(top: Path, scale=1.0):
+    """A few large files; the content repeats a random 1M block."""
+    rng = Random(f"huge {scale}")
+    top.mkdir(parents=True)
+    block = rng.randbytes(MB)
+    for i in range(4):
+        with open(top / f"big{i}.bin", "wb") as h:
+            for _ in range(int(32 * scale) or 1):
+                h.write(block)
+
+
+def symlinks(top: Path, scale=1.0):
+    """Files and directories reached mostly through symlinks."""
+    rng = Random(f"symlinks {scale}")
+    real = top / "real"
+    n = int(100 * scale) or 1
+    for i in range(n):
+        d = real / f"d{i:03d}"
+        d.mkdir(parents=True)
+        for j in range(10):
+            _write(d / f"f{j}", rng, rng.randrange(1024))
+    links = top / "links"
+    links.mkdir()
+    for i in range(n):
+        os.symlink(f"../real/d{i:03d}", links / f"dl{i:03d}")
+        for j in range(10):
+            os.symlink(f"../real/d{i:03d}/f{j}", links / f"fl{i:03d}_{j}")
+
+
+def gitignore(top: Path, scale=1.0):
+    """Directories that each have a .gitignore excluding part of their files."""
+    rng = Random(f"gitignore {scale}")
+    exts = ("o", "so", "pyc", "log", "tmp", "bak", "swp", "class", "obj", "a")
+    top.mkdir(parents=True)
+    (top / ".gitignore").write_text(
+        "".join(f"*.{x}\n" for x in exts) + "build/\n!keep.log\n/.cache/\n"
+    )
+    for i in range(int(200 * scale) or 1):
+        d = top / f"pkg{i:03d}" / "src"
+        (d / "build").mkdir(parents=True)
+        (d.parent / ".gitignore").write_text(
+            "".join(f"gen{j}_*\n" for j in range(20)) + "**/tmp/\n!gen0_keep\n"
+        )
+        for j in range(30):
+            ext = rng.choice(exts + ("py", "txt", "c", "h"))
+            _write(d / f"gen{j % 25}_{j}.{ext}", rng, rng.randrange(512))
+        _write(d / "build" / "out.bin", rng, 100)
+
+
+TREES = {
+    "wide": wide,
+    "deep": deep,
+    "small": small,
+    "huge": huge,
+    "symlinks": symlinks,
+    "gitignore": gitignore,
+}
@@ -1,104 +1,322 @@
-from .util.tree.ignore import FilterMaxSize, collect_ignore
-from .util.extra import mode_name
-from .util.extra import filesizef
-from .util.tree.local_node import LocalAux, LocalNode
-from .helper.httphelp import HttpHelp
-from .helper.ghauth import AuthParams
+from typing import TYPE_CHECKING
+
 from .main import Main, arg, flag
 
+# Everything past argument parsing is imported where it is used: scripts
+# run the command many times, see benchmarks/bench_startup.py.
+if TYPE_CHECKING:
+    from .util.tree.local_node import LocalNode
 
-class Aux(AuthParams, HttpHelp):
-    pass
+FORMATS = ("line", "ndjson", "ls-tree")  # the keys of listing.WRITERS
 
 
-class App(Main):
-    dirs: list[str] = arg("Directory to upload", nargs="+")
-    ##
-    follow_links: int = flag("links", "Follow links", choices=["keep", "follow"])
-    follow_dir_links: int = flag(
+def __getattr__(name: str):
+    if name == "Aux":
+        global Aux
+        from .helper.httphelp import HttpHelp
+        from .helper.ghauth import AuthParams
+
+        class Aux(AuthParams, HttpHelp):
+            pass
+
+        return Aux
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class Walk(Main):
+    follow_links: str = flag("links", "Follow links", choices=["keep", "follow"])
+    follow_dir_links: str = flag(
         "dir-links", "Follow dirtory links", choices=["keep", "follow"]
     )
-    use_gitignore: int = flag("gitignore", "Use .gitignore")
-    max_size: int = flag("max-size", "Include only size below")
+    use_gitignore: int = flag("gitignore", "Use .gitignore (0 to disable)")
+    max_size: str = flag("max-size", "Include only files of this size or less (64M)")
+    min_size: str = flag("min-size", "Include only files of this size or more")
+    newer: str = flag("newer", "Include only entries modified since (7d, a date)")
+    older: str = flag("older", "Include only entries modified before (7d, a date)")
+    types: str = flag("type", "Include only these types (find -type letters, f,l)")
+    ext: list[str] = flag("ext", "Include only files with this extension")
+    verbose: bool = flag("v", "Log progress to stderr")
+    jobs: int = flag("j", "jobs", "Hash files with N threads")
+    list_jobs: int = flag("list-jobs", "List directories with N threads")
+    quick: bool = flag("quick", "Trust size and mtime, hash files only when needed")
+    stats: bool = flag("stats", "Print counters and timings to stderr at the end")
+    stats_json: str = flag("stats-json", "Write counters and timings to a JSON file")
+    cache: str = flag("cache", "Keep file hashes in this file between runs")
+    fingerprint: str = flag(
+        "fingerprint",
+        "With --cache, check files of this size or more (e.g. 64M) by sampling"
+        " them when only their mtime changed",
+    )
+    readahead: str = flag(
+        "readahead",
+        "Hash files in inode order, asking the kernel to read this far ahead"
+        " (e.g. 32M), and drop them from the page cache once hashed",
+    )
+    lfs: str = flag(
+        "lfs",
+        "Hash the files .gitattributes sends to LFS, and files of this size or"
+        " more (e.g. 100M, 0: none), as Git LFS pointers",
+    )
+    lfs_objects: str = flag(
+        "lfs-objects", "With --lfs, write the objects to upload (oid size path)"
+    )
+    object_format: str = flag(
+        "object-format",
+        "Hash as git does with this object format",
+        choices=["sha1", "sha256"],
+    )
+    digest: list[str] = flag(
+        "digest",
+        "Also compute this digest of each file, in the same read (sha256,"
+        " git-sha256...), shown by --format ndjson",
+    )
+    git_index: bool = flag(
+        "index",
+        "Take the hashes of unchanged files from the index of a git work tree",
+        default=None,
+    )
+
+    def ready(self) -> None:
+        if self.verbose:
+            import logging
+
+            logging.basicConfig(format="%(levelname)s: %(message)s", level="INFO")
+
+    def done(self) -> None:
+        if self.cache:
+            self.hash_cache.save()
+        if self.lfs_objects and self.walker.lfs:
+            with open(self.lfs_objects, "w", encoding="utf-8") as h:
+                for oid, (path, size) in self.walker.lfs.objects.items():
+                    h.write(f"{oid} {size} {path}\n")
+        self.walker.close()
+
+    def _get_collector(self):
+        if self.stats or self.stats_json:
+            from logging import DEBUG, getLogger
+            from .util.stats import Stats, log_events
+
+            stats = Stats()
+            if getLogger().isEnabledFor(DEBUG):
+                stats.subscribe(log_events)
+            return stats
+
+    def _get_hash_cache(self):
+        from .util.tree.hash_cache import HashCache
+
+        return HashCache(self.cache)
+
+    def report(self, root: "LocalNode") -> None:
+        from logging import info
+        from .util.extra import filesizef
+
+        aux = root.aux
+        stats = aux.stats
+        hardlink_hits = getattr(aux, "hardlink_hits", 0)  # local trees only
+        fingerprint_hits = getattr(aux, "fingerprint_hits", 0)
+        if stats:
+            stats.count("hash.hardlink_hits", hardlink_hits)
+            stats.count("hash.fingerprint_hits", fingerprint_hits)
+            if self.stats_json:
+                stats.dump(self.stats_json)
+            if self.stats:
+                from sys import stderr
+
+                print(stats.summary(), file=stderr)
+        if hardlink_hits:
+            info(
+                "hardlinks: %d files not read again (%s)",
+                hardlink_hits,
+                filesizef(aux.hardlink_bytes),
+            )
+        if fingerprint_hits:
+            info(
+                "fingerprints: %d files not read again (%s)",
+                fingerprint_hits,
+                filesizef(aux.fingerprint_bytes),
+            )
+
+    def _get_walker(self):
+        from .util.tree.walker import Walker
+
+        from .util.extra import filesizep
+        from .util.tree.lfs import Lfs
+
+        fingerprint_size = 0
+        if self.fingerprint:
+            fingerprint_size = filesizep(self.fingerprint)
+        return Walker(
+            gitignore=self.use_gitignore != 0,
+            links=self.follow_links or "keep",
+            dir_links=self.follow_dir_links or "keep",
+            keep=self.keep,
+            workers=self.jobs or 0,
+            hash_cache=self.hash_cache,
+            fingerprint_size=fingerprint_size,
+            stats=self.collector,
+            git_index=self.git_index is not False,
+            list_workers=self.list_jobs or 0,
+            readahead=self.readahead and filesizep(self.readahead) or 0,
+            lfs=self.lfs and Lfs(filesizep(self.lfs)) or None,
+            object_format=self.object_format or "sha1",
+            digests=self.digest or (),
+            file_mode=True,
+        )
+
+    def _get_keep(self):
+        from .util.extra import filesizep, timep
+        from .util.tree.stat_filter import StatFilter
+
+        return StatFilter(
+            min_size=self.min_size and filesizep(self.min_size),
+            max_size=self.max_size and filesizep(self.max_size),
+            newer=self.newer and timep(self.newer),
+            older=self.older and timep(self.older),
+            types=self.types,
+            extensions=self.ext,
+        )
+
+    def local_tree(self, path: str) -> "LocalNode":
+        return self.walker.tree(path)
+
+
+class List(Walk):
+    dirs: list[str] = arg("Directory, or tar or zip archive, to list", nargs="+")
     ##
-    auth: str = flag("A", "auth", "Authorization")
+    output: str = flag("o", "output", "Write the listing to file")
+    format: str = flag("format", "Listing format", choices=FORMATS, default="line")
+    zero: bool = flag("z", "Terminate entries with NUL, do not quote paths")
 
     def start(self) -> None:
-        from pathlib import Path
-
-        gitignore_ancestors = True
-        max_size = self.max_size
-        import logging
-
-        # logging.basicConfig(**dict(format="%(levelname)s: %(message)s", level="DEBUG"))
-
-        def walk(pn: LocalNode, first=None):
-            if pn.is_dir():
-                if first:
-                    pd = pn.data
-                    excludes = includes = None
-                    if max_size > 0:
-                        excludes = FilterMaxSize(max_size, excludes)
-                    if gitignore_ancestors:
-                        v = collect_ignore(pd._path)
-                        if v:
-                            (exc, inc) = v
-                            if exc:
-                                if excludes:
-                                    excludes.append(exc)
-                                else:
-                                    excludes = exc
-                            if inc:
-                                if includes:
-                                    includes.append(inc)
-                                else:
-                                    includes = inc
-                    if excludes or includes:
-                        pd.filter_dir(pn)
-                        _ignore = getattr(pd, "_ignore", None)
-                        if _ignore:
-                            excludes and excludes.append(_ignore[0])
-                            _ignore = (
-                                excludes or _ignore[0],
-                                includes or _ignore[1],
-                            )
-                        else:
-                            _ignore = (excludes, includes)
-                        # print(excludes, _ignore)
-                        pd._ignore = _ignore
-                for cur in pn:
-                    walk(cur)
-            return pn
-
-        aux = LocalAux()
-        aux.symlink_strategy("keep", "keep")
-        # no = aux.node_from(Path("/mnt/META/wrx/web/flask-render/home/.local"))
-        no = aux.node_from(Path(self.dirs[0]).absolute(), "ROOT")
-        # print(no, hex(no.mode), hex(no.type), no.is_dir())
-        self.walk(no)
-        # root = local_data(Path(self.dirs[0])).new_node("ROOT")
-        # print("token", aux.auth_file)
-        # aux.set_auth_params(self.auth)
-        # # self.
-        # for x in root:
-        #     print(x.name)
-
-        # # print("token", aux.__dict__.items())
-        # # print("token", getattr(aux, "token"))
-
-    def line(self, cur):
-        print(
-            cur.hash,
-            mode_name(cur.mode),
-            filesizef(cur.size).rjust(6),
-            cur.get_path(),
-        )
+        from .util.tree.archive import archive_tree, is_archive
+
+        path = self.dirs[0]
+        if is_archive(path):
+            root = archive_tree(path, stats=self.collector, file_mode=True)
+        else:
+            root = self.local_tree(path)
+            if not self.quick or self.format == "ls-tree":
+                self.walker.hash_files(root)
+        self.walk(root)
+        self.report(root)
 
     def walk(self, cur):
-        for s in cur:
-            self.line(s)
-            (s.is_dir() and self.walk(s))
-        cur.parent or self.line(cur)
+        from .util.extra import as_sink
+        from .util.listing import WRITERS
+
+        sink = as_sink(self.output, "wb")
+        try:
+            WRITERS[self.format](
+                sink, "\0" if self.zero else "\n", quick=self.quick
+            ).write_tree(cur)
+        finally:
+            self.output and self.output != "-" and sink.close()
+
+
+class Verify(Walk):
+    dir: str = arg("Directory to check")
+    expected: str = arg(
+        "Expected tree hash, snapshot (ndjson or ls-tree -t), or a tree-ish of"
+        " the enclosing git repository (HEAD, v1.0:src)"
+    )
+    full: bool = flag("full", "Report every mismatch, not only the first")
+
+    def start(self) -> None:
+        from .util.tree.diff import diff_trees
+        from .util.listing import load_listing
+
+        root = self.local_tree(self.dir)
+        expected = self.expected
+        if is_hash(expected):
+            self.walker.hash_files(root)
+            bad = [] if root.get_hash() == expected.lower() else [("M", "")]
+        else:
+            from os.path import exists
+
+            if exists(expected):
+                with open(expected, encoding="utf-8", errors="surrogateescape") as h:
+                    want = load_listing(h)
+            else:
+                from .util.tree.git_objects import git_tree
+
+                try:
+                    want = git_tree(self.dir, expected)
+                    fmt = want.aux.object_format
+                    if fmt != root.aux.object_format:
+                        raise ValueError(f"{fmt} repository, see --object-format")
+                except (KeyError, ValueError) as e:
+                    from sys import stderr
+
+                    print(f"error: {e.args[0]}", file=stderr)
+                    self.failed = True
+                    return
+            bad = []
+            for x in diff_trees(root, want, self.quick):
+                bad.append(x[:2])
+                if not self.full:
+                    break
+        self.report(root)
+        for status, path in bad:
+            print(status, path or ".")
+        self.failed = bool(bad)
+
+    def done(self) -> None:
+        super().done()  # save the cache and close the walker either way
+        if self.failed:
+            raise SystemExit(1)
+
+
+class Watch(Walk):
+    dir: str = arg("Directory to watch")
+    socket: str = flag("socket", "Answer hash/changed queries on this unix socket")
+    debounce: float = flag(
+        "debounce", "Seconds without events before applying them", default=0.2
+    )
+    poll: float = flag("poll", "Poll every N seconds instead of using inotify")
+
+    def start(self) -> None:
+        from .util.tree.watch import Poller, Watcher
+
+        w = Watcher(
+            self.local_tree(self.dir),
+            Poller(self.poll) if self.poll else None,
+            self.debounce,
+        )
+        if self.socket:
+            w.serve(self.socket)
+            on_change = None
+        else:
+
+            def on_change(w: Watcher):
+                print(w.generation, w.hash(), flush=True)
+
+            on_change(w)
+        try:
+            w.run(on_change=on_change)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            w.close()
+            self.report(w.root)
+
+
+def is_hash(s: str):
+    return len(s) in (40, 64) and all(c in "0123456789abcdefABCDEF" for c in s)
+
+
+class App(Main):
+    auth: str = flag("A", "auth", "Authorization")
+
+    def sub_args(self):
+        yield List(), {"name": "list", "help": "List a directory with its hashes"}
+        yield Verify(), {
+            "name": "verify",
+            "help": "Check a directory against a tree hash or a snapshot",
+        }
+        yield Watch(), {
+            "name": "watch",
+            "help": "Keep the tree hash of a directory current as files change",
+        }
 
 
 (__name__ == "__main__") and App().main()
@@ -0,0 +1,270 @@
+import os
+import shutil
+from collections import deque
+from hashlib import sha1
+from pathlib import Path
+from stat import S_ISDIR
+
+
+def blob_hash(data: bytes) -> str:
+    return sha1(b"blob %d\0%s" % (len(data), data)).hexdigest()
+
+
+def iter_files(root):
+    """Yields (path, node) of the files and symlinks under a RepoNode."""
+    stack = [(iter(root), "")]
+    while stack:
+        it, prefix = stack[-1]
+        for node in it:
+            if node.is_dir():
+                stack.append((iter(node), prefix + node.name + "/"))
+                break
+            if node.type != 0xE000:  # submodules are not in archives
+                yield prefix + node.name, node
+        else:
+            stack.pop()
+
+
+class BulkDownload:
+    """
+    Restores a remote tree into a directory with one archive request.
+
+    Files that already match their hash locally are left alone. The others
+    are taken from the repository tarball (or zipball) of the ref as it
+    streams by: each member is hashed while read and, if its hash is the
+    one expected, handed to a pool of writer threads. Members that do not
+    match (export-subst, LFS, a ref that moved) and files missing from the
+    archive are then fetched one blob at a time. Nothing is downloaded
+    when every file already matches.
+
+    Args:
+        client: An HttpHelp with owner and repo (see AuthParams).
+        dest: The directory to restore into.
+        workers: Writer threads.
+        kind: "tarball" or "zipball"; None fetches blobs only, which is
+            better for a sparse selection of a large repository.
+        max_pending: Bytes read ahead of the writers; larger members are
+            written by the reading thread.
+    """
+
+    def __init__(
+        self, client, dest, workers=4, kind="tarball", max_pending=64 << 20
+    ) -> None:
+        self.client = client
+        self.dest = Path(dest)
+        self.workers = workers
+        self.kind = kind
+        self.max_pending = max_pending
+        self.counts = {"skipped": 0, "archive": 0, "blob": 0}
+        self._pending: "deque[tuple[Future, int]]" = deque()
+        self._pending_bytes = 0
+        self._dest_made = False
+
+    def run(self, want, ref: str) -> "dict[str, int]":
+        """
+        Makes dest hold the files of want, a RepoNode tree with hashes, from
+        the archive of ref.
+
+        Returns:
+            How many files were "skipped" (already there), taken from the
+            "archive" and fetched as a "blob".
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.todo = todo = self.missing(want)
+        if todo:
+            with ThreadPoolExecutor(self.workers, "ghrapt-write") as pool:
+                self.pool = pool
+                try:
+                    self.kind and self.from_archive(ref)
+                finally:
+                    while self._pending:
+                        self._pending.popleft()[0].result()
+                    self._pending_bytes = 0
+            # what the archive did not have right
+            for path, node in todo.items():
+                self.from_blob(path, node)
+        return self.counts
+
+    def missing(self, want) -> "dict[str, object]":
+        """
+        The files of want whose local copy is absent or differs. dest is
+        walked once, listing only the directories that want has files in;
+        symlinks are not followed.
+        """
+        from ..util.tree.walker import Walker
+
+        todo = {}
+        with Walker(gitignore=False, git_index=False) as walker:
+            root = walker.tree(self.dest) if self.dest.is_dir() else None
+            kids: "dict[str, dict]" = {}  # listed directory -> {name: node}
+
+            def local(path: str):
+                parent, _, name = path.rpartition("/")
+                names = kids.get(parent)
+                if names is None:
+                    d = local(parent) if parent else root
+                    names = kids[parent] = (
+                        {x.name: x for x in d} if d is not None and d.is_dir() else {}
+                    )
+                return names.get(name)
+
+            for path, node in iter_files(want):
+                x = local(path)
+                try:
+                    if x is not None and not x.is_dir() and x.hash == node.hash:
+                        self.counts["skipped"] += 1
+                        continue
+                except (OSError, NotImplementedError):
+                    pass
+                todo[path] = node
+        return todo
+
+    def from_archive(self, ref: str) -> None:
+        client = self.client
+        with client.http.request(**client.archive_request(ref, self.kind)) as r:
+            r.raise_for_status()
+            if self.kind == "zipball":
+                self._zip(r)
+            else:
+                r.raw.decode_content = True  # a Content-Encoding, if any
+                self._tar(r.raw)
+
+    def _tar(self, stream) -> None:
+        import tarfile
+
+        todo = self.todo
+        with tarfile.open(fileobj=stream, mode="r|*") as tar:
+            for m in tar:
+                # GitHub archives hold one "<owner>-<repo>-<sha>/" directory
+                path = m.name.partition("/")[2]
+                node = todo.get(path)
+                if node is None:
+                    continue
+                if m.issym():
+                    self._take(path, node, m.linkname.encode("utf-8"))
+                elif m.isreg():
+                    self._take_stream(path, node, tar.extractfile(m), m.size)
+
+    def _zip(self, r) -> None:
+        # the central directory is at the end: spool the archive first
+        from shutil import copyfileobj
+        from tempfile import TemporaryFile
+        from zipfile import ZipFile
+
+        with TemporaryFile() as f:
+            copyfileobj(r.raw, f, 1 << 20)
+            with ZipFile(f) as z:
+                todo = self.todo
+                for info in z.infolist():
+                    path = info.filename.partition("/")[2]
+                    node = todo.get(path)
+                    if node is not None and not info.is_dir():
+                        with z.open(info) as h:
+                            self._take_stream(path, node, h, info.file_size)
+
+    def _take_stream(self, path: str, node, h, size: int) -> None:
+        if size <= self.max_pending >> 2:
+            self._take(path, node, h.read(size))
+            return
+        # large: written while hashed, by this thread
+        m = sha1(b"blob %d\0" % size)
+        target, tmp = self._prepare(path)
+        try:
+            with open(tmp, "wb") as w:
+                for b in iter(lambda: h.read(1 << 20), b""):
+                    m.update(b)
+                    w.write(b)
+            if m.hexdigest() == node.hash:
+                self._finish(tmp, target, node)
+                self._accept(path)
+        finally:
+            os.path.lexists(tmp) and os.unlink(tmp)
+
+    def _accept(self, path: str) -> None:
+        # by the reading thread only
+        del self.todo[path]
+        self.counts["archive"] += 1
+
+    def _take(self, path: str, node, data: bytes) -> None:
+        if blob_hash(data) != node.hash:
+            return  # fetched as a blob afterwards
+        self._accept(path)
+        fut = self.pool.submit(self.write, path, node, data)
+        self._pending.append((fut, len(data)))
+        self._pending_bytes += len(data)
+        while self._pending_bytes > self.max_pending:
+            fut, n = self._pending.popleft()
+            fut.result()
+            self._pending_bytes -= n
+
+    def from_blob(self, path: str, node) -> None:
+        client = self.client
+        with client.http.request(**client.download_request(node)) as r:
+            r.raise_for_status()
+            data = r.content
+        if blob_hash(data) != node.hash:
+            raise ValueError(f"{path}: got {blob_hash(data)}, want {node.hash}")
+        self.write(path, node, data)
+        self.counts["blob"] += 1
+
+    def write(self, path: str, node, data: bytes) -> None:
+        """Writes a file (or symlink) atomically, in a writer thread or not."""
+        target, tmp = self._prepare(path)
+        try:
+            if node.type == 0xA000:
+                os.path.lexists(tmp) and os.unlink(tmp)
+                os.symlink(data.decode("utf-8", "surrogateescape"), tmp)
+            else:
+                with open(tmp, "wb") as w:
+                    w.write(data)
+            self._finish(tmp, target, node)
+        finally:
+            os.path.lexists(tmp) and os.unlink(tmp)
+
+    def _prepare(self, path: str) -> "tuple[Path, Path]":
+        """
+        The target of path under dest and its temporary file. The parents
+        are made real directories: a symlink or file in their place is
+        removed, so that nothing is written outside dest; a directory where
+        the target goes is removed too.
+        """
+        parent = self.dest
+        if not self._dest_made:
+            parent.mkdir(parents=True, exist_ok=True)
+            self._dest_made = True
+        *dirs, name = path.split("/")
+        for d in dirs:
+            parent = parent / d
+            for _ in range(2):  # once more if another writer got there first
+                try:
+                    if S_ISDIR(os.lstat(parent).st_mode):
+                        break
+                    os.unlink(parent)
+                except FileNotFoundError:
+                    pass
+                try:
+                    os.mkdir(parent)
+                    break
+                except FileExistsError:
+                    continue
+            else:
+                raise FileExistsError(f"{parent}: not a directory")
+        target = parent / name
+        try:
+            if S_ISDIR(os.lstat(target).st_mode):
+                shutil.rmtree(target)
+        except FileNotFoundError:
+            pass
+        return target, parent / f".{name}.ghrapt-tmp"
+
+    def _finish(self, tmp: Path, target: Path, node) -> None:
+        if node.type != 0xA000:
+            os.chmod(tmp, 0o755 if node.perm & 0o111 else 0o644)
+        os.replace(tmp, target)
+
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
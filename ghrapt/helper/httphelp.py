@@ -1,4 +1,8 @@
 class HttpHelp:
+    stats: "Stats|None" = None  # see ghrapt.util.stats
+    # GitHub Enterprise: https://<host>/api/v3, or a local stand-in for tests
+    api_url = "https://api.github.com"
+
     # def post_gql(self, json):
     #     d, h = None, {}
     #     x = getattr(self, "token", None)
@@ -16,7 +20,8 @@ class HttpHelp:
 
     def post_gql(self, json, **rkw):
         rkw = self.req_params(**rkw)
-        with self.http.post("https://api.github.com/graphql", json=json, **rkw) as r:
+        self.stats and self.stats.count("http.requests")
+        with self.http.post(f"{self.api_url}/graphql", json=json, **rkw) as r:
             s = r.status_code
             d = r.json()
             return d
@@ -40,15 +45,38 @@ class HttpHelp:
     def download_request(self, cur, **kwargs):
         rkw = self.req_params()
         rkw["headers"]["accept"] = "application/vnd.github.v3.raw"
-        rkw["url"] = "https://api.github.com/repos/%s/%s/git/blobs/%s" % (
+        rkw["url"] = "%s/repos/%s/%s/git/blobs/%s" % (
+            self.api_url,
             self.owner,
             self.repo,
             cur.hash,
         )
         rkw["method"] = "get"
+        self.stats and self.stats.count("http.requests")
+        return rkw
+
+    def archive_request(self, ref: str, kind="tarball", **kwargs):
+        """Request parameters of the whole tree at ref, as a tarball or zipball."""
+        rkw = self.req_params()
+        rkw["url"] = "%s/repos/%s/%s/%s/%s" % (
+            self.api_url,
+            self.owner,
+            self.repo,
+            kind,
+            ref,
+        )
+        rkw["method"] = "get"
+        rkw["stream"] = True
+        self.stats and self.stats.count("http.requests")
         return rkw
 
     def _get_http(self):
         from requests import session
 
         return session()
+
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..util.stats import Stats
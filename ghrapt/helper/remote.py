@@ -0,0 +1,146 @@
+from stat import S_IFMT, S_IMODE
+
+from ..util.tree.repo_node import RepoAux, RepoNode
+from ..util.tree.sparse import KEEP, Sparse
+
+QUERY = (
+    "query($owner: String!, $name: String!) {"
+    " repository(owner: $owner, name: $name) { %s } }"
+    " fragment T on Tree { oid entries {"
+    " name mode oid object { ... on Blob { byteSize } } } }"
+)
+
+
+class RemoteAux(RepoAux):
+    """
+    Lists the trees of a GitHub repository through GraphQL, as they are
+    walked, several trees per request.
+
+    Expanding a directory fetches its tree together with up to batch - 1
+    of the trees known and not fetched yet: the sub directories of every
+    tree fetched so far, breadth first. A walk in any order then costs
+    about one request per batch trees of each level. With a Sparse
+    selection, dropped entries are not created and dropped directories
+    never fetched; directory hashes stay the remote ones.
+
+    Args:
+        client: An HttpHelp with owner and repo (see AuthParams).
+        sparse: The paths to keep, if not all.
+        batch: Trees per request.
+    """
+
+    def __init__(self, client, sparse: "Sparse|None" = None, batch=50) -> None:
+        self.client = client
+        self.sparse = sparse or None
+        self.batch = batch
+        # tree oid -> [(name, mode, oid, size)], fetched ahead
+        self.listed: "dict[str, list[tuple[str, int, str, int|None]]]" = {}
+        self.pending: "dict[str, None]" = {}  # tree oids to fetch, in order
+        # tree oid -> (Sparse.select result, path prefix) where it was seen
+        self.hints: "dict[str, tuple[int, str]]" = {}
+        # directory -> (Sparse.select result, path prefix of its entries)
+        self.state: "dict[RepoNode, tuple[int, str]]" = {}
+
+    def fetch(self, oids: "list[str]") -> None:
+        """Lists the trees of oids in one request."""
+        self.query({f"t{i}": f'object(oid: "{x}")' for i, x in enumerate(oids)})
+
+    def query(self, objects: "dict[str, str]") -> "dict[str, str]":
+        # alias -> GraphQL object selector; returns alias -> tree oid
+        client = self.client
+        fields = " ".join(f"{k}: {v} {{ ...T }}" for k, v in objects.items())
+        d = client.post_gql(
+            {
+                "query": QUERY % fields,
+                "variables": {"owner": client.owner, "name": client.repo},
+            }
+        )
+        if d.get("errors"):
+            raise RuntimeError(f"GraphQL: {d['errors']}")
+        repo = d["data"]["repository"]
+        found = {}
+        for k in objects:
+            tree = repo.get(k)
+            if not tree:
+                raise KeyError(f"Not a tree: {objects[k]}")
+            found[k] = oid = tree["oid"]
+            self.listed[oid] = entries = [
+                (e["name"], e["mode"], e["oid"], (e["object"] or {}).get("byteSize"))
+                for e in tree["entries"]
+            ]
+            self.pending.pop(oid, None)
+            hint = self.hints.pop(oid, None)
+            if hint:
+                self.plan(entries, *hint)
+        return found
+
+    def plan(self, entries, state: int, prefix: str) -> None:
+        """Queues the sub trees of a listed tree that the selection keeps."""
+        sparse = self.sparse
+        for name, mode, oid, size in entries:
+            if S_IFMT(mode) != 0x4000 or oid in self.listed:
+                continue
+            s = sparse.select(prefix + name, True, state == KEEP) if sparse else KEEP
+            if s:
+                self.pending[oid] = None
+                self.hints.setdefault(oid, (s, prefix + name + "/"))
+
+    def items(self, node: RepoNode):
+        if not node.is_dir():
+            return
+        oid = node.hash
+        entries = self.listed.get(oid)
+        if entries is None:
+            self.pending.pop(oid, None)
+            batch = [oid]
+            for x in self.pending:
+                if len(batch) >= self.batch:
+                    break
+                batch.append(x)
+            self.fetch(batch)
+            entries = self.listed[oid]
+        sparse = self.sparse
+        state, prefix = self.state.get(node) or (KEEP, "")
+        for name, mode, x_oid, size in entries:
+            kind = S_IFMT(mode)
+            is_dir = kind == 0x4000
+            if sparse:
+                s = sparse.select(prefix + name, is_dir, state == KEEP)
+                if not s:
+                    continue
+            else:
+                s = KEEP
+            x = RepoNode(name, node)
+            x.type = kind
+            x.perm = S_IMODE(mode)
+            x.hash = x_oid
+            if size is not None:
+                x.size = size
+            if is_dir:
+                self.state[x] = (s, prefix + name + "/")
+            yield x
+
+
+def remote_tree(client, ref="HEAD", include=(), exclude=(), batch=50) -> RepoNode:
+    """
+    The root node of the tree of ref in the client's repository, listed
+    lazily by a RemoteAux; include and exclude make a Sparse selection.
+    """
+    sparse = Sparse(include, exclude)
+    aux = RemoteAux(client, sparse, batch)
+    oid = aux.query({"root": f"object(expression: {_quote(ref + ':')})"})["root"]
+    root = RepoNode("ROOT")
+    root.aux = aux
+    root.type = 0x4000
+    root.perm = 0
+    root.hash = oid
+    aux.state[root] = (sparse.top(), "")
+    aux.plan(aux.listed[oid], sparse.top(), "")
+    return root
+
+
+def _quote(s: str) -> str:
+    from json import dumps
+
+    return dumps(s)
+
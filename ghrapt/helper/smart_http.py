@@ -0,0 +1,282 @@
+from ..util.tree.git_objects import OBJ_COMMIT, GitAux, GitNode, ObjectStore
+from ..util.tree.git_pack import (
+    commit_object,
+    index_pack,
+    object_id,
+    tree_objects,
+    write_pack,
+)
+from ..util.tree.repo_node import RepoNode
+from .smartget import SmartGet
+
+ZERO = "0" * 40
+FLUSH = b"0000"
+DELIM = b"0001"
+
+
+def pkt_line(data: "str|bytes") -> bytes:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return b"%04x" % (len(data) + 4) + data
+
+
+def iter_pkt_lines(chunks):
+    """
+    Yields the payloads of the pkt-lines read from chunks of bytes (b"" for
+    an empty pkt-line, 0004), and None for flush, delimiter and response
+    end packets.
+    """
+    it = iter(chunks)
+    buf = b""
+    pos = 0
+    need = 4
+    header = True  # reading a length, else a payload of need bytes
+    while True:
+        while len(buf) - pos < need:
+            b = next(it, None)
+            if b is None:
+                if len(buf) > pos or not header:
+                    raise ValueError("Truncated pkt-line")
+                return
+            buf = buf[pos:] + b
+            pos = 0
+        if header:
+            n = int(buf[pos : pos + 4], 16)
+            pos += 4
+            if n < 4:
+                yield None
+            elif n == 4:
+                yield b""
+            else:
+                need = n - 4
+                header = False
+            continue
+        yield buf[pos : pos + need]
+        pos += need
+        need = 4
+        header = True
+
+
+class SmartHttp(SmartGet):
+    """
+    A client of the git smart HTTP protocol: version 2 ls-refs and fetch
+    (partial with a filter, as blob:none) and receive-pack for push.
+
+    Fetched packs are indexed into an ObjectStore as they arrive; pushed
+    packs are written from a RepoNode tree (a walked LocalNode tree) as
+    they are sent, file by file, without deltas.
+
+    Args:
+        url: The repository, as for git clone ("https://host/owner/repo").
+        headers: Sent with every request, e.g. an Authorization.
+    """
+
+    stats: "Stats|None" = None  # see ghrapt.util.stats
+    agent = "ghrapt"
+
+    def __init__(self, url: str, headers=None) -> None:
+        self.url = url.rstrip("/")
+        self.headers = dict(headers or ())
+
+    def _get_http(self):
+        from requests import session
+
+        return session()
+
+    def request(self, service: str, body=None, v2=True):
+        """A streamed response of service, to a POST of body or a GET."""
+        headers = dict(self.headers)
+        headers.setdefault("User-Agent", f"git/2.0 ({self.agent})")
+        if v2:
+            headers["Git-Protocol"] = "version=2"
+        self.stats and self.stats.count("http.requests")
+        if body is None:
+            url = f"{self.url}/info/refs?service={service}"
+            return self.http.request("get", url, headers=headers, stream=True)
+        headers["Content-Type"] = f"application/x-{service}-request"
+        headers["Accept"] = f"application/x-{service}-result"
+        url = f"{self.url}/{service}"
+        return self.http.request("post", url, headers=headers, data=body, stream=True)
+
+    def _get_capabilities(self) -> "dict[str, str]":
+        # protocol version 2 advertisement: "version 2", then key[=value]
+        caps = {}
+        with self.request("git-upload-pack") as r:
+            r.raise_for_status()
+            lines = [x for x in iter_pkt_lines(r.iter_content(1 << 16)) if x]
+        if b"version 2\n" not in lines:
+            raise RuntimeError(f"{self.url}: no git protocol version 2")
+        for line in lines:
+            k, _, v = line.decode("utf-8").rstrip("\n").partition("=")
+            if not k.startswith("# ") and k != "version 2":
+                caps[k] = v
+        return caps
+
+    def command(self, name: str, args=()):
+        """The response to a protocol version 2 command."""
+        caps = self.capabilities
+        if name not in caps:
+            raise RuntimeError(f"{self.url}: no {name} command")
+        body = [pkt_line(f"command={name}\n")]
+        if "agent" in caps:
+            body.append(pkt_line(f"agent={self.agent}\n"))
+        if "object-format" in caps:
+            body.append(pkt_line("object-format=sha1\n"))
+        body.append(DELIM)
+        body.extend(pkt_line(x + "\n") for x in args)
+        body.append(FLUSH)
+        return self.request("git-upload-pack", b"".join(body))
+
+    def ls_refs(self, prefixes=("HEAD", "refs/heads/", "refs/tags/")):
+        """The refs of the repository under prefixes, name -> object id."""
+        refs = {}
+        args = ["symrefs"] + [f"ref-prefix {x}" for x in prefixes]
+        with self.command("ls-refs", args) as r:
+            r.raise_for_status()
+            for line in iter_pkt_lines(r.iter_content(1 << 16)):
+                if line is None:
+                    break
+                if not line:
+                    continue
+                _check(line)
+                oid, name = line.decode("utf-8").split()[:2]
+                refs[name] = oid
+        return refs
+
+    def fetch(self, wants, store: ObjectStore, filter: "str|None" = "blob:none"):
+        """
+        Fetches the objects of wants (commits, trees or blobs by id) into
+        store, with those they reach unless filter leaves them out.
+
+        Returns:
+            The name of the pack added and its number of objects.
+        """
+        if filter and "filter" not in self.capabilities["fetch"].split():
+            raise RuntimeError(f"{self.url}: no fetch filter (uploadpack.allowFilter)")
+        args = ["ofs-delta", "no-progress"]
+        args.extend(f"want {x}" for x in wants)
+        if filter:
+            args.append(f"filter {filter}")
+        args.append("done")
+        with self.command("fetch", args) as r:
+            r.raise_for_status()
+            lines = iter_pkt_lines(r.iter_content(1 << 16))
+            for line in lines:
+                if line == b"packfile\n":
+                    break
+                line and _check(line)
+            else:
+                raise RuntimeError(f"{self.url}: no packfile in the response")
+            return index_pack(_sideband(lines), store)
+
+    def checkout(self, store: ObjectStore, rev: str, dest) -> int:
+        """
+        Writes the tree of rev, in store, to the directory dest, fetching
+        the blobs that store lacks (after a blob:none fetch) in one go.
+        Files that already match are left alone.
+
+        Returns:
+            The number of files written.
+        """
+        from .bulk import BulkDownload
+
+        root = GitNode("ROOT")
+        root.aux = GitAux(store)
+        root.type = 0x4000
+        root.perm = 0
+        root.hash = store.tree_id(rev)
+        bulk = BulkDownload(None, dest)
+        todo = bulk.missing(root)
+        lacking = {x.hash: None for x in todo.values() if not store.has(x.hash)}
+        if lacking:
+            self.fetch(lacking, store, None)
+        for path, node in todo.items():
+            bulk.write(path, node, store.read(node.hash)[1])
+        return len(todo)
+
+    def receive_refs(self) -> "dict[str, str]":
+        """The refs advertised by receive-pack, name -> object id."""
+        refs = {}
+        with self.request("git-receive-pack", v2=False) as r:
+            r.raise_for_status()
+            for line in iter_pkt_lines(r.iter_content(1 << 16)):
+                if not line or line.startswith(b"# service="):
+                    continue
+                _check(line)
+                oid, name = line.split(b"\0")[0].decode("utf-8").split()[:2]
+                if name != "capabilities^{}":  # an empty repository
+                    refs[name] = oid
+        return refs
+
+    def push(
+        self,
+        ref: str,
+        root: RepoNode,
+        message: str,
+        store: "ObjectStore|None" = None,
+        author="ghrapt <ghrapt@localhost>",
+    ) -> str:
+        """
+        Commits the tree of root on top of ref and pushes it.
+
+        With a store holding the trees of the current commit of ref (see
+        fetch), only the files and directories that differ from it are
+        sent; otherwise the whole tree is.
+
+        Returns:
+            The id of the new commit.
+
+        Raises:
+            RuntimeError: The remote refused the push.
+        """
+        old = self.receive_refs().get(ref, ZERO)
+        parents = [] if old == ZERO else [old]
+        have = None
+        if parents and store is not None:
+            try:
+                have = store.tree_id(old)
+            except KeyError:
+                pass
+        tree, objects = tree_objects(root, store, have)
+        commit = commit_object(tree, parents, message, author)
+        new = object_id(OBJ_COMMIT, commit)
+        objects.append((OBJ_COMMIT, len(commit), commit))
+        self.stats and self.stats.count("push.objects", len(objects))
+
+        def body():
+            yield pkt_line(f"{old} {new} {ref}\0report-status agent={self.agent}\n")
+            yield FLUSH
+            yield from write_pack(objects)
+
+        with self.request("git-receive-pack", body(), v2=False) as r:
+            r.raise_for_status()
+            report = [x for x in iter_pkt_lines(r.iter_content(1 << 16)) if x]
+        status = [x.decode("utf-8").rstrip("\n") for x in report]
+        if not status or status[0] != "unpack ok" or f"ok {ref}" not in status:
+            raise RuntimeError(f"{self.url}: push refused: {'; '.join(status)}")
+        return new
+
+
+def _check(line: bytes) -> None:
+    if line.startswith(b"ERR "):
+        raise RuntimeError(line[4:].decode("utf-8", "replace").strip())
+
+
+def _sideband(lines):
+    # the pack data of band 1, until the flush; 2 is progress, 3 an error
+    for line in lines:
+        if line is None:
+            return
+        if not line:
+            continue
+        band = line[0]
+        if band == 1:
+            yield line[1:]
+        elif band == 3:
+            raise RuntimeError(line[1:].decode("utf-8", "replace").strip())
+
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..util.stats import Stats
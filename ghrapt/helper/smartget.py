@@ -1,3 +1,6 @@
+from ..util.lazy import NoAttribute, lazy_getters
+
+
 class SmartGet:
     """Handles dynamic attribute computation and caching using '_get_*' methods.
 
@@ -16,6 +19,11 @@ class SmartGet:
         print(loader.users)  # Subsequent calls use cached value
     """
 
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # Getter table built once per class, see lazy_getters
+        cls._lazy = lazy_getters(cls)
+
     def __getattr__(self, name: str):
         """Intercept attribute access for dynamic computation.
 
@@ -29,31 +37,34 @@ class SmartGet:
             AttributeError: If no matching _get_* method exists
         """
         # Skip magic/private names and our own _get_* methods
-        if not name.startswith("_"):
-            # Check for corresponding _get_* method
-            getter_name = f"_get_{name}"
-            getter = getattr(self, getter_name, None)
-
-            if getter is not None:
-                # Prevent infinite recursion during computation:
-                # 1. Temporarily set the attribute to None
-                setattr(self, name, None)
-                # 2. Compute the real value
-                value = getter()
-                # 3. Permanently cache the result
-                setattr(self, name, value)
-                return value
+        getter = self._lazy.get(name)
+
+        if getter is not None:
+            # Prevent infinite recursion during computation:
+            # 1. Temporarily set the attribute to None
+            setattr(self, name, None)
+            # 2. Compute the real value
+            value = getter(self)
+            # 3. Permanently cache the result
+            setattr(self, name, value)
+            return value
 
         # Fallback to standard attribute lookup if no _get_* method exists
         try:
-            return super().__getattr__(name)
+            m = super().__getattr__
         except AttributeError:
-            # Provide clear error including available _get_* methods
-            raise AttributeError(
-                f"'{self.__class__.__name__}' has no attribute '{name}'. "
-                f"Available dynamic attributes: {[
-                m[5:]
-                for m in dir(self)
-                if m.startswith("_get_") and not m.startswith("_get__")
-            ]}"
-            ) from None
+            raise _NoDynamicAttribute(self, name) from None
+        else:
+            return m(name)
+
+
+class _NoDynamicAttribute(NoAttribute):
+    def __str__(self):
+        # Provide clear error including available _get_* methods
+        return (
+            f"{super().__str__()}. "
+            f"Available dynamic attributes: {sorted(self.args[0]._lazy)}"
+        )
+
+
+SmartGet._lazy = lazy_getters(SmartGet)
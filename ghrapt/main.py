@@ -1,9 +1,11 @@
-from typing import TYPE_CHECKING, Any, Sequence
+from typing import TYPE_CHECKING
+
+from .util.lazy import NoAttribute, lazy_getters
 
 __version__ = "0.0.0"
 if TYPE_CHECKING:
     import argparse
-    from typing import Sequence
+    from typing import Any, Sequence
 
 INVALID = object()
 
@@ -16,9 +18,10 @@ class Argument:
         self.kwargs = kwargs
 
     def _add(
-        self, name: str, type_: type, argp: "argparse.ArgumentParser", that: Any
+        self, name: str, type_: type, argp: "argparse.ArgumentParser", that: "Any"
     ) -> None:
         """Add argument to parser."""
+        type_ = getattr(type_, "__origin__", type_)  # list[str] -> list
         args = []
         kwargs = {**self.kwargs}
         flag_arg = kwargs.pop("flag", None)
@@ -94,8 +97,17 @@ class Argument:
         argp.add_argument(*args, **kwargs)
 
 
-def _arg_fields(inst: Any) -> Any:
-    for c in inst.__class__.__mro__:
+def _arg_fields(inst: "Any") -> "Any":
+    """The (name, Argument, type) fields of an instance's class, bases included."""
+    cls = inst.__class__
+    v = _ARG_FIELDS.get(cls)
+    if v is None:
+        v = _ARG_FIELDS[cls] = tuple(_iter_arg_fields(cls))
+    return v
+
+
+def _iter_arg_fields(cls: type) -> "Any":
+    for c in cls.__mro__:
         for k, v in tuple(c.__dict__.items()):
             if isinstance(v, Argument):
                 yield k, v, c.__annotations__.get(k)
@@ -104,6 +116,9 @@ def _arg_fields(inst: Any) -> Any:
                     yield k, x, c.__annotations__.get(k)
 
 
+_ARG_FIELDS: "dict[type, tuple]" = {}
+
+
 def arg(*args: str, **kwargs) -> Argument:
     """Define positional argument."""
     return Argument(*args, **kwargs)
@@ -117,24 +132,27 @@ def flag(*args: str, **kwargs) -> Argument:
 class Main:
     """Base class for all CLI commands."""
 
-    def __getattr__(self, name: str) -> Any:
-        if not name.startswith("_get_"):
-            f = getattr(self, f"_get_{name}", None)
-            if f:
-                setattr(self, name, None)
-                v = f()
-                setattr(self, name, v)
-                return v
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._lazy = lazy_getters(cls, private=True)
+
+    def __getattr__(self, name: str) -> "Any":
+        f = self._lazy.get(name)
+        if f:
+            setattr(self, name, None)
+            v = f(self)
+            setattr(self, name, v)
+            return v
         try:
             m = super().__getattr__
         except AttributeError:
-            raise AttributeError(
-                f"{self.__class__.__name__} has no attribute {name}"
-            ) from None
+            raise NoAttribute(self, name) from None
         else:
             return m(name)
 
-    def main(self, args: Sequence[str] = None, argp: "argparse.ArgumentParser" = None):
+    def main(
+        self, args: "Sequence[str]" = None, argp: "argparse.ArgumentParser" = None
+    ):
         """Main entry point for the command."""
         if argp is None:
             argp = self.new_argparse()
@@ -162,7 +180,7 @@ class Main:
             v._add(k, t, argp, self)
 
     def parse_arguments(
-        self, argp: "argparse.ArgumentParser", args: Sequence[str]
+        self, argp: "argparse.ArgumentParser", args: "Sequence[str]"
     ) -> None:
         """Parse command line arguments."""
         sp = None
@@ -209,6 +227,9 @@ class Main:
         """Main command execution."""
         pass
 
-    def sub_args(self) -> Any:
+    def sub_args(self) -> "Any":
         """Yield subcommands."""
         yield None, {}
+
+
+Main._lazy = lazy_getters(Main, private=True)
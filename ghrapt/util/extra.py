@@ -28,6 +28,23 @@ def filesizep(s):
     return int(s)
 
 
+def timep(s, now=None):
+    """Epoch seconds from an age ("90s", "15m", "12h", "7d", "2w") or a date."""
+    for unit, n in (("s", 1), ("m", 60), ("h", 3600), ("d", 86400), ("w", 604800)):
+        if s[-1:].lower() == unit and s[:-1].replace(".", "", 1).isdigit():
+            if now is None:
+                from time import time
+
+                now = time()
+            return now - float(s[:-1]) * n
+    try:
+        return float(s)
+    except ValueError:
+        from datetime import datetime
+
+        return datetime.fromisoformat(s).timestamp()
+
+
 def base_encode(number, alphabet):
     # Special case for zero
     if number == 0:
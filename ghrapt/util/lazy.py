@@ -0,0 +1,34 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing import Callable
+
+
+class NoAttribute(AttributeError):
+    """AttributeError that formats its message only when it is displayed."""
+
+    def __str__(self):
+        obj, name = self.args
+        return f"'{obj.__class__.__name__}' has no attribute '{name}'"
+
+
+def lazy_getters(cls: type, private=False) -> "dict[str, Callable]":
+    """
+    Maps attribute names to the ``_get_<name>`` getters of a class.
+
+    The table is built once per class (from ``__init_subclass__``) so a
+    missing attribute costs one dictionary lookup instead of a formatted
+    getter name and a ``getattr`` walk over the MRO.
+
+    Args:
+        cls: The class to scan, bases included.
+        private: Also map ``_get__<name>`` getters to ``_<name>``.
+
+    Returns:
+        A dictionary of attribute name to the unbound getter.
+    """
+    return {
+        k[5:]: getattr(cls, k)
+        for k in dir(cls)
+        if k.startswith("_get_") and (private or not k.startswith("_get__"))
+    }
@@ -0,0 +1,289 @@
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+from re import compile as re_compile
+from stat import S_IXUSR
+from typing import TYPE_CHECKING, BinaryIO, Iterable
+
+from .extra import filesizef, mode_name
+
+if TYPE_CHECKING:
+    from .tree.repo_node import RepoNode
+
+GIT_KIND = {
+    0x4000: ("040000", "tree"),
+    0xA000: ("120000", "blob"),
+    0xE000: ("160000", "commit"),
+}
+
+
+def git_kind(node: "RepoNode", file_mode=None):
+    """
+    Returns the git (mode, object type) of a node; executables are 100755
+    with file_mode, by default when its tree hashes them so.
+    """
+    kind = node.type
+    v = GIT_KIND.get(kind)
+    if v:
+        return v
+    if file_mode is None:
+        file_mode = node.aux.file_mode
+    if file_mode and node.perm & S_IXUSR:
+        return ("100755", "blob")
+    return ("100644", "blob")
+
+
+_C_ESCAPES = {
+    "\a": "\\a",
+    "\b": "\\b",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\v": "\\v",
+    "\f": "\\f",
+    "\r": "\\r",
+    '"': '\\"',
+    "\\": "\\\\",
+}
+_NEEDS_QUOTE = re_compile('[\x00-\x1f"\\\\\x7f-\U0010ffff]')
+
+
+def _c_escape(m) -> str:
+    c = m.group(0)
+    v = _C_ESCAPES.get(c)
+    if v:
+        return v
+    return "".join("\\%03o" % b for b in c.encode("utf-8", "surrogateescape"))
+
+
+def quote_path(path: str) -> str:
+    """Quotes a path the way git does with core.quotePath enabled."""
+    if _NEEDS_QUOTE.search(path) is None:
+        return path
+    return '"' + _NEEDS_QUOTE.sub(_c_escape, path) + '"'
+
+
+_C_UNESCAPES = {v[1].encode(): k.encode() for k, v in _C_ESCAPES.items()}
+_UNQUOTE = re_compile(rb"\\([0-7]{3}|.)")
+
+
+def _c_unescape(m) -> bytes:
+    c = m.group(1)
+    if len(c) == 3:
+        return bytes((int(c, 8) & 0xFF,))
+    return _C_UNESCAPES.get(c, c)
+
+
+def unquote_path(path: str) -> str:
+    """
+    Reverses quote_path; also reads the paths git quotes with
+    core.quotePath disabled, which keep their non-ASCII characters.
+    """
+    if not path.startswith('"'):
+        return path
+    b = path[1:-1].encode("utf-8", "surrogateescape")
+    return _UNQUOTE.sub(_c_unescape, b).decode("utf-8", "surrogateescape")
+
+
+def iter_listing(lines: Iterable[str]):
+    """
+    Parses a NDJSON or ``git ls-tree [-r] [-t] [-l]`` listing.
+
+    Yields:
+        (path, mode, hash, size, mtime) records, with None for the fields
+        the listing does not have.
+    """
+    from json import loads
+
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line:
+            continue
+        if line.startswith("{"):
+            v = loads(line)
+            yield v["path"], v["mode"], v.get("hash"), v.get("size"), v.get("mtime")
+        else:
+            info, _, path = line.partition("\t")
+            mode, kind, sha, *size = info.split()
+            size = size[0] if size and size[0] != "-" else None
+            yield unquote_path(path), mode, sha, size, None
+
+
+def load_listing(lines: Iterable[str]) -> "RepoNode":
+    """Builds a RepoNode tree from a listing, see iter_listing."""
+    from .tree.repo_node import build_tree
+
+    top = {}
+
+    def records():
+        for rec in iter_listing(lines):
+            if rec[0]:
+                yield rec
+            else:
+                top["hash"] = rec[2]
+
+    root = build_tree(records())
+    root.aux.file_mode = True  # the modes are those listed
+    if top.get("hash"):
+        root.hash = top["hash"]
+    return root
+
+
+class TreeWriter:
+    """
+    Writes one record per node of a tree to a binary sink.
+
+    The walk keeps an explicit stack and carries each directory's path down
+    to its children, so a record costs one string concatenation instead of
+    a walk back to the root. Records are joined and written in chunks.
+    """
+
+    top = ""  # prefix of the root's children
+
+    def __init__(
+        self, sink: BinaryIO, terminator="\n", chunk=4096, quick=False
+    ) -> None:
+        self.sink = sink
+        self.terminator = terminator
+        self.chunk = chunk
+        self.quick = quick  # do not hash, show known hashes only
+
+    def hash(self, node: "RepoNode") -> "str|None":
+        return node.peek("hash") if self.quick else node.hash
+
+    def size(self, node: "RepoNode") -> "int|None":
+        if self.quick and node.is_dir():
+            return node.peek("size")  # a tree size comes with its hash
+        return node.size
+
+    def children(self, node: "RepoNode") -> Iterable["RepoNode"]:
+        return node
+
+    def record(self, node: "RepoNode", path: str) -> "str|None":
+        raise NotImplementedError()
+
+    def record_root(self, node: "RepoNode") -> "str|None":
+        return None
+
+    def write_tree(self, root: "RepoNode") -> int:
+        """Writes the records of the tree under root; returns their count."""
+        record = self.record
+        children = self.children
+        end = self.terminator
+        chunk = self.chunk
+        buf = []
+        count = 0
+        stack = [(iter(children(root)), self.top)]
+        while stack:
+            it, prefix = stack[-1]
+            for node in it:
+                path = prefix + node.name
+                v = record(node, path)
+                if v is not None:
+                    buf.append(v)
+                    buf.append(end)
+                if node.is_dir():
+                    stack.append((iter(children(node)), path + "/"))
+                    break
+            else:
+                stack.pop()
+            if len(buf) >= chunk:
+                count += self._flush(buf)
+        v = self.record_root(root)
+        if v is not None:
+            buf.append(v)
+            buf.append(end)
+        count += self._flush(buf)
+        self.sink.flush()
+        return count
+
+    def _flush(self, buf: "list[str]") -> int:
+        self.sink.write("".join(buf).encode("utf-8", "surrogateescape"))
+        n = len(buf) // 2
+        buf.clear()
+        return n
+
+
+class LineWriter(TreeWriter):
+    """``<hash> <kind> <size> /<path>`` lines, the root last as ``/``."""
+
+    top = "/"
+    unknown = "-" * 40  # hash placeholder in quick mode
+
+    def __init__(
+        self, sink: BinaryIO, terminator="\n", chunk=4096, quick=False
+    ) -> None:
+        super().__init__(sink, terminator, chunk, quick)
+        self.mode_name = lru_cache(maxsize=None)(mode_name)
+        self.size_text = lru_cache(maxsize=1 << 16)(
+            lambda size: ("-" if size is None else filesizef(size)).rjust(6)
+        )
+
+    def record(self, node: "RepoNode", path: str) -> str:
+        return " ".join(
+            (
+                self.hash(node) or self.unknown,
+                self.mode_name(node.mode),
+                self.size_text(self.size(node)),
+                path,
+            )
+        )
+
+    def record_root(self, node: "RepoNode") -> str:
+        return self.record(node, "/")
+
+
+class NdjsonWriter(TreeWriter):
+    """
+    One JSON object per line; the root comes last with an empty path.
+
+    The hash, and the size of a tree, are null when unknown in quick mode;
+    mtime is null for nodes without one. Files have their "digests" too
+    when the walk computes some (see Walker digests).
+    """
+
+    def record(self, node: "RepoNode", path: str) -> str:
+        mode, kind = git_kind(node)
+        h = self.hash(node)
+        size = self.size(node)
+        line = (
+            '{"path":%s,"mode":"%s","type":"%s","hash":%s,"size":%s,"mtime":%r'
+        ) % (
+            encode_basestring_ascii(path),
+            mode,
+            kind,
+            f'"{h}"' if h else "null",
+            "null" if size is None else size,
+            getattr(node, "mtime", None),
+        )
+        if getattr(node.aux, "digests", None) and mode.startswith("100"):
+            d = node.peek("digests") if self.quick else node.digests
+            if d:
+                line += ',"digests":{%s}' % ",".join(
+                    f'"{k}":"{v}"' for k, v in d.items()
+                )
+        return line + "}"
+
+    def record_root(self, node: "RepoNode") -> str:
+        return self.record(node, "")
+
+
+class LsTreeWriter(TreeWriter):
+    """Same output as ``git ls-tree -r -l`` (``-z`` when NUL terminated)."""
+
+    def children(self, node: "RepoNode") -> Iterable["RepoNode"]:
+        return [x[-1] for x in sorted(node.iter_sort())]
+
+    def record(self, node: "RepoNode", path: str) -> "str|None":
+        mode, kind = git_kind(node)
+        if kind == "tree":
+            return None
+        if self.terminator == "\n":
+            path = quote_path(path)
+        size = "-" if kind == "commit" else str(node.size)
+        return f"{mode} {kind} {node.hash} {size:>7}\t{path}"
+
+
+WRITERS = {
+    "line": LineWriter,
+    "ndjson": NdjsonWriter,
+    "ls-tree": LsTreeWriter,
+}
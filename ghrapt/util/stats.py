@@ -0,0 +1,92 @@
+from collections import defaultdict
+from threading import Lock
+from time import perf_counter
+from typing import Callable
+
+
+class Stats:
+    """
+    Counters and timers of the walk, ignore, hash and HTTP stages.
+
+    Instrumented code holds a Stats or None (``aux.stats``, ``HttpHelp.stats``)
+    and checks it before recording, so nothing is measured when disabled.
+    Subscribers registered with subscribe are called with every record:
+    ``(name, value)`` for counts and times, ``(name, *args)`` for events.
+
+    Names in use: ``listdir``, ``listdir.entries``, ``stat``,
+    ``ignore.<filter>.hit``, ``ignore.<filter>.miss``, ``hash.files``,
+    ``hash.bytes``, ``tree.built``, ``tree.bytes``, ``http.requests``;
+    ``listdir``, ``stat`` and ``hash`` are timed too. Events:
+    ``ignore.dir`` (node, filters) and ``ignore.exclude`` (filter, path).
+
+    Counts and times may be recorded from several threads (hash pool,
+    writers, listers); subscribers are called from the recording thread.
+    """
+
+    clock = staticmethod(perf_counter)
+
+    def __init__(self) -> None:
+        self.counts: "dict[str, int]" = defaultdict(int)
+        self.times: "dict[str, float]" = defaultdict(float)
+        self.subscribers: "list[Callable[..., None]]" = []
+        self.lock = Lock()
+
+    def subscribe(self, fn: "Callable[..., None]") -> "Callable[..., None]":
+        self.subscribers.append(fn)
+        return fn
+
+    def count(self, name: str, n=1) -> None:
+        with self.lock:
+            self.counts[name] += n
+        for fn in self.subscribers:
+            fn(name, n)
+
+    def lap(self, name: str, start: float) -> None:
+        """Adds the time since start (a clock() value) to the timer name."""
+        t = perf_counter() - start
+        with self.lock:
+            self.times[name] += t
+        for fn in self.subscribers:
+            fn(name, t)
+
+    def emit(self, name: str, *args) -> None:
+        """An event only subscribers see."""
+        for fn in self.subscribers:
+            fn(name, *args)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "counts": dict(sorted(self.counts.items())),
+                "times": dict(sorted(self.times.items())),
+            }
+
+    def dump(self, path: str) -> None:
+        from json import dump
+
+        with open(path, "w") as h:
+            dump(self.as_dict(), h, indent=1)
+
+    def summary(self) -> str:
+        from .extra import filesizef
+
+        lines = []
+        for name, n in sorted(self.counts.items()):
+            v = filesizef(n) if name.endswith(".bytes") else str(n)
+            t = self.times.get(name)
+            lines.append(f"{v:>10} {name}" + (f" ({t:.3f}s)" if t else ""))
+        for name, t in sorted(self.times.items()):
+            if name not in self.counts:
+                lines.append(f"{t:>9.3f}s {name}")
+        return "\n".join(lines)
+
+
+def log_events(name: str, *args) -> None:
+    """A subscriber logging the events at debug level."""
+    if name == "ignore.dir":
+        debug("hook_ignore %r %r", *args)
+    elif name == "ignore.exclude":
+        debug("EXC %r %s", *args)
+
+
+from logging import debug
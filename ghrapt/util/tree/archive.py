@@ -0,0 +1,182 @@
+from hashlib import sha1
+from stat import S_IFLNK, S_IFMT, S_IFREG, S_IMODE
+
+from .repo_node import RepoNode, build_tree
+
+SUFFIXES = (
+    ".tar",
+    ".tar.gz",
+    ".tgz",
+    ".tar.bz2",
+    ".tbz2",
+    ".tar.xz",
+    ".txz",
+    ".tar.zst",
+    ".tzst",
+    ".zip",
+)
+ZIP_MAGIC = (b"PK\x03\x04", b"PK\x05\x06")
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def is_archive(path: str) -> bool:
+    """Tells if path names an archive this module reads, by its suffix."""
+    from os.path import isfile
+
+    return path.lower().endswith(SUFFIXES) and isfile(path)
+
+
+def hash_stream(h, size: int, stats=None, bufsiz=64 * 1024) -> str:
+    """The blob hash of the size bytes read from h, a chunk at a time."""
+    if stats:
+        t = stats.clock()
+    m = sha1(b"blob %d\0" % size)
+    left = size
+    while left > 0:
+        b = h.read(min(bufsiz, left))
+        if not b:
+            raise ValueError(f"Truncated member: {left} bytes missing")
+        m.update(b)
+        left -= len(b)
+    if stats:
+        stats.lap("hash", t)
+        stats.count("hash.files")
+        stats.count("hash.bytes", size)
+    return m.hexdigest()
+
+
+def _clean(name: str) -> str:
+    """
+    The member name without its leading "./" and trailing "/"; "" for the
+    top directory.
+
+    Raises:
+        ValueError: An absolute name, or one with empty, "." or ".."
+            components, which git does not accept in a tree.
+    """
+    while name.startswith("./"):
+        name = name[2:]
+    name = name.rstrip("/")
+    if name in ("", "."):
+        return ""  # the top directory
+    if name.startswith("/") or any(x in ("", ".", "..") for x in name.split("/")):
+        raise ValueError(f"Unsafe path in archive: {name!r}")
+    return name
+
+
+def iter_tar(fileobj, stats=None):
+    """
+    Yields (path, mode, hash, size, mtime) of the members of a tar stream,
+    hashing each file as it goes by; the stream is read once, forwards.
+    """
+    import tarfile
+
+    seen: "dict[str, tuple[int, str, int]]" = {}  # hardlink targets
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for m in tar:
+            path = _clean(m.name)
+            if not path:
+                continue
+            perm = S_IMODE(m.mode)
+            if m.isreg():
+                h = hash_stream(tar.extractfile(m), m.size, stats)
+                mode = S_IFREG | perm
+                seen[path] = (mode, h, m.size)
+                yield path, mode, h, m.size, m.mtime
+            elif m.islnk():
+                v = seen.get(_clean(m.linkname))
+                if v is None:
+                    raise ValueError(
+                        f"{path}: hard link to {m.linkname!r}, not an earlier file"
+                    )
+                yield path, v[0], v[1], v[2], m.mtime
+            elif m.issym():
+                target = m.linkname.encode("utf-8", "surrogateescape")
+                h = sha1(b"blob %d\0" % len(target) + target).hexdigest()
+                yield path, S_IFLNK | 0o777, h, len(target), m.mtime
+            elif m.isdir():
+                yield path, 0o40000, None, None, m.mtime
+            # devices and fifos have no git equivalent
+
+
+def iter_zip(path, stats=None):
+    """Yields (path, mode, hash, size, mtime) of the members of a zip file."""
+    from time import mktime
+    from zipfile import ZipFile
+
+    with ZipFile(path) as z:
+        for info in z.infolist():
+            name = _clean(info.filename)
+            if not name:
+                continue
+            mtime = mktime(info.date_time + (0, 0, -1))
+            if info.is_dir():
+                yield name, 0o40000, None, None, mtime
+                continue
+            mode = info.external_attr >> 16
+            kind = S_IFMT(mode)
+            if kind != S_IFLNK:
+                kind = S_IFREG
+            perm = S_IMODE(mode) or 0o644
+            with z.open(info) as h:
+                sha = hash_stream(h, info.file_size, stats)
+            yield name, kind | perm, sha, info.file_size, mtime
+
+
+def iter_archive(path: str, stats=None):
+    """
+    Yields the records of a tar (plain, gz, bz2, xz or zst) or zip archive,
+    told apart by their first bytes. zst needs the zstandard package.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+        f.seek(0)
+        if magic in ZIP_MAGIC:
+            yield from iter_zip(f, stats)
+        elif magic == ZSTD_MAGIC:
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError(
+                    f"{path}: reading .tar.zst archives needs the zstandard package"
+                ) from None
+            with zstandard.ZstdDecompressor().stream_reader(f) as z:
+                yield from iter_tar(z, stats)
+        else:
+            yield from iter_tar(f, stats)
+
+
+def archive_tree(
+    path: str, strip: "int|None" = None, stats=None, file_mode=False
+) -> RepoNode:
+    """
+    A tree of the content of an archive, with its blob and tree hashes.
+
+    Nothing is extracted: each file is hashed while it is read from the
+    archive, so memory depends on the number of members only.
+
+    Args:
+        path: A tar or zip archive, see iter_archive.
+        strip: Leading path components to drop (like tar
+            --strip-components); None drops the top directory when it holds
+            every member, as in release tarballs.
+        stats: Counters and timers to record into.
+        file_mode: Hash user-executable files as 100755, see RepoAux.
+    """
+    # a path added again later in a tar replaces the earlier one
+    records = list({rec[0]: rec for rec in iter_archive(path, stats)}.values())
+    if strip is None:
+        tops = {p.partition("/")[0] for p, *_ in records}
+        strip = 1 if len(tops) == 1 and any("/" in p for p, *_ in records) else 0
+    if strip:
+        cut = []
+        for rec in records:
+            parts = rec[0].split("/", strip)
+            if len(parts) > strip:
+                cut.append((parts[strip], *rec[1:]))
+        records = cut
+    root = build_tree(records)
+    root.aux.stats = stats
+    root.aux.file_mode = file_mode
+    root.get_hash()  # the trees, bottom-up
+    return root
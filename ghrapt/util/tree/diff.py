@@ -0,0 +1,82 @@
+from collections import deque
+from typing import Iterable
+
+from ..listing import git_kind
+from .repo_node import RepoNode
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+def has_files(node: RepoNode):
+    """Tells if a directory holds anything a tree hash would include."""
+    for x in node.iter_preorder():
+        if not x.is_dir():
+            return True
+    return False
+
+
+def same_kind(a: RepoNode, b: RepoNode):
+    return a.is_dir() == b.is_dir() and a.is_symlink() == b.is_symlink()
+
+
+def diff_trees(
+    left: RepoNode, right: RepoNode, quick=False
+) -> Iterable["tuple[str, str, RepoNode|None, RepoNode|None]"]:
+    """
+    Compares two trees top-down, level by level.
+
+    Files are compared by git mode (the executable bit, with the file_mode
+    of each side's aux), by size (when both sides know it) and then by
+    hash. A directory whose right side has a hash is compared by its tree
+    hash first, and descended into only when they differ; otherwise it is
+    always descended into. Empty directories on either side are ignored,
+    as in tree hashes.
+
+    With quick, a file whose size and mtime match the right side is taken
+    as unchanged without hashing it; the same holds when the right side
+    has no hash to compare with. A directory is then compared only by a
+    tree hash known without reading its files (see cached_tree_hash).
+    The generator is lazy, so stopping at the first result stops the work.
+
+    Yields:
+        (status, path, left, right) where status is "M" (differs), "+"
+        (only in left) or "-" (only in right).
+    """
+    queue = deque(((left, right, ""),))
+    while queue:
+        a, b, prefix = queue.popleft()
+        other = {x.name: x for x in b}
+        for x in a:
+            path = prefix + x.name
+            y = other.pop(x.name, None)
+            if y is None:
+                if not x.is_dir() or has_files(x):
+                    yield "+", path, x, None
+            elif not same_kind(x, y):
+                yield "M", path, x, y
+            elif x.is_dir():
+                h = y.peek("hash")
+                if h:
+                    known = x.peek("hash") or x.aux.cached_tree_hash(x)
+                    if known is None and not quick:
+                        known = x.get_hash()
+                    if known == h:
+                        continue
+                queue.append((x, y, path + "/"))
+            elif git_kind(x)[0] != git_kind(y)[0]:
+                yield "M", path, x, y
+            else:
+                size = y.peek("size")
+                if size is not None and size != x.size:
+                    yield "M", path, x, y
+                    continue
+                h = y.peek("hash")
+                if quick or h is None:
+                    mtime = y.peek("mtime")
+                    if mtime is not None and mtime == x.mtime:
+                        continue
+                if h is None or x.hash != h:
+                    yield "M", path, x, y
+        for y in other.values():
+            if not y.is_dir() or has_files(y):
+                yield "-", prefix + y.name, None, y
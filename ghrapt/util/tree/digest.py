@@ -0,0 +1,72 @@
+from functools import lru_cache
+from hashlib import new
+
+# git object formats and the size of their ids, as in tree entries
+OBJECT_FORMATS = {"sha1": 20, "sha256": 32}
+
+
+@lru_cache(maxsize=None)
+def empty_tree(object_format="sha1") -> str:
+    """The id of the empty tree in an object format."""
+    return new(object_format, b"tree 0\0").hexdigest()
+
+
+@lru_cache(maxsize=None)
+def empty_blob(object_format="sha1") -> str:
+    """The id of the empty blob in an object format."""
+    return new(object_format, b"blob 0\0").hexdigest()
+
+
+def object_hash(object_format: str, kind: bytes, data: bytes) -> str:
+    """The id of a git object ("blob", "tree"...) in an object format."""
+    m = new(object_format, b"%s %d\0" % (kind, len(data)))
+    m.update(data)
+    return m.hexdigest()
+
+
+def check_digest(name: str) -> None:
+    """
+    Raises:
+        ValueError: name is not a digest Digests computes: neither a
+            hashlib name of fixed size nor "git-" and an object format.
+    """
+    if name.startswith("git-"):
+        if name[4:] not in OBJECT_FORMATS:
+            raise ValueError(f"Unknown object format in digest {name!r}")
+        return
+    try:
+        size = new(name).digest_size
+    except (ValueError, TypeError):
+        size = 0
+    if not size:  # shake_128 and the like need a length
+        raise ValueError(f"Unknown digest {name!r}")
+
+
+class Digests:
+    """
+    Several digests of one content, fed from the same buffers, so that
+    the content is read once for all of them.
+
+    Names are those of hashlib for digests of the content itself
+    ("sha256", "blake2b"), and "git-" followed by an object format for
+    git object ids ("git-sha1", "git-sha256").
+
+    Args:
+        names: The digests to compute.
+        size: The size of the content, for the git object header.
+        kind: The git object type.
+    """
+
+    def __init__(self, names, size: int, kind=b"blob") -> None:
+        self.names = names = tuple(names)
+        head = b"%s %d\0" % (kind, size)
+        self.hashes = [
+            new(x[4:], head) if x.startswith("git-") else new(x) for x in names
+        ]
+
+    def update(self, b) -> None:
+        for m in self.hashes:
+            m.update(b)
+
+    def hexdigests(self) -> "dict[str, str]":
+        return {k: m.hexdigest() for k, m in zip(self.names, self.hashes)}
@@ -0,0 +1,313 @@
+import os
+from pathlib import Path
+from stat import S_IFMT, S_ISLNK, S_IXUSR
+from struct import unpack_from
+
+SIGNATURE = b"DIRC"
+M32 = 0xFFFFFFFF
+# entry flags
+F_EXTENDED = 0x4000
+F_STAGE = 0x3000
+F_NAMEMASK = 0x0FFF
+# extended flags (v3 and up)
+F_SKIP_WORKTREE = 0x4000
+F_INTENT_TO_ADD = 0x2000
+# attributes that make the work tree bytes differ from the blob
+CONVERSIONS = (b"filter", b"eol", b"text", b"ident", b"working-tree-encoding")
+
+
+def _varint(data, i: int):
+    """Decodes git's offset varint at i; returns (value, next offset)."""
+    c = data[i]
+    i += 1
+    v = c & 0x7F
+    while c & 0x80:
+        c = data[i]
+        i += 1
+        v = ((v + 1) << 7) | (c & 0x7F)
+    return v, i
+
+
+def read_index(data, hash_size=20):
+    """
+    Parses the content of a git index file, versions 2 to 4.
+
+    Entries of stage 0 map the path (bytes) to (ctime_s, ctime_ns, mtime_s,
+    mtime_ns, ino, mode, size, hash); entries of other stages, and those
+    marked skip-worktree or intent-to-add, are left out. The cache-tree
+    extension maps a directory path (b"" for the top) to (entry count,
+    tree hash) for its valid entries.
+
+    Returns:
+        (version, entries, trees)
+
+    Raises:
+        ValueError: Not an index, or one that needs another file (split).
+    """
+    if data[:4] != SIGNATURE:
+        raise ValueError("Not a git index")
+    version, count = unpack_from(">II", data, 4)
+    if version not in (2, 3, 4):
+        raise ValueError(f"Unsupported index version {version}")
+    entries: "dict[bytes, tuple]" = {}
+    fixed = 40 + hash_size  # stat data and hash
+    i = 12
+    name = b""
+    for _ in range(count):
+        start = i
+        st = unpack_from(">10I", data, i)
+        sha = bytes(data[i + 40 : i + fixed])
+        (flags,) = unpack_from(">H", data, i + fixed)
+        i += fixed + 2
+        xflags = 0
+        if flags & F_EXTENDED and version > 2:
+            (xflags,) = unpack_from(">H", data, i)
+            i += 2
+        if version == 4:
+            strip, i = _varint(data, i)
+            end = data.index(b"\0", i)
+            name = name[: len(name) - strip] + bytes(data[i:end])
+            i = end + 1
+        else:
+            end = data.index(b"\0", i + (flags & F_NAMEMASK))
+            name = bytes(data[i:end])
+            # NUL padded to a multiple of 8 bytes
+            i = start + ((end - start + 8) & ~7)
+        if flags & F_STAGE or xflags & (F_SKIP_WORKTREE | F_INTENT_TO_ADD):
+            continue
+        # ctime, ctime ns, mtime, mtime ns, dev, ino, mode, uid, gid, size
+        entries[name] = (st[0], st[1], st[2], st[3], st[5], st[6], st[9], sha)
+    trees: "dict[bytes, tuple[int, bytes]]" = {}
+    end = len(data) - hash_size
+    while i + 8 <= end:
+        sig = bytes(data[i : i + 4])
+        (size,) = unpack_from(">I", data, i + 4)
+        i += 8
+        if sig == b"TREE":
+            _read_cache_tree(data, i, i + size, hash_size, trees)
+        elif sig == b"link":
+            raise ValueError("Split index")
+        i += size
+    return version, entries, trees
+
+
+def _read_cache_tree(data, i: int, end: int, hash_size: int, trees: dict) -> None:
+    # preorder: "path NUL count SP subtrees LF [hash]" per directory
+    stack: "list[list]" = []  # [path, subtrees left]
+    while i < end:
+        j = data.index(b"\0", i)
+        name = bytes(data[i:j])
+        j, i = data.index(b" ", j), j + 1
+        count = int(data[i:j])
+        i = j + 1
+        j = data.index(b"\n", i)
+        subtrees = int(data[i:j])
+        i = j + 1
+        if stack:
+            top = stack[-1]
+            top[1] -= 1
+            path = top[0] + b"/" + name if top[0] else name
+        else:
+            path = name
+        if count >= 0:
+            trees[path] = (count, bytes(data[i : i + hash_size]))
+            i += hash_size
+        stack.append([path, subtrees])
+        while stack and stack[-1][1] <= 0:
+            stack.pop()
+
+
+def find_git_dir(path: Path):
+    """The work tree top and git directory of path or of an ancestor."""
+    for top in (path, *path.parents):
+        git = top / ".git"
+        if git.is_dir():
+            return top, git
+        if git.is_file():
+            # linked work trees and submodules: "gitdir: <path>"
+            line = git.read_text().strip()
+            if line.startswith("gitdir:"):
+                return top, (top / line[7:].strip()).resolve()
+            return None
+    return None
+
+
+def _read(path: Path) -> bytes:
+    try:
+        return path.read_bytes()
+    except OSError:
+        return b""
+
+
+class GitIndex:
+    """
+    Blob and tree hashes of a git work tree, as its index records them.
+
+    A blob hash is used when the file's lstat still matches the index
+    entry (size, mtime, ctime and inode, as git itself checks) and the
+    entry is not racily clean, i.e. modified no earlier than the index was
+    written. Files under a .gitattributes that sets filters, eol or text
+    conversion are never matched, nor are any when core.autocrlf is set,
+    as the blob then is not the bytes on disk.
+
+    A directory reuses the cache-tree hash only when every entry under it
+    is such a match, their number is the one the index records and each
+    file has the mode the local tree is hashed with (all 100644 unless its
+    aux has file_mode).
+
+    Args:
+        top: The top of the work tree.
+        git_dir: Its git directory.
+    """
+
+    def __init__(self, top: Path, git_dir: Path) -> None:
+        self.top = top
+        self.prefix = str(top).rstrip("/") + "/"
+        path = git_dir / "index"
+        common = _read(git_dir / "commondir").strip()
+        common_dir = git_dir / os.fsdecode(common) if common else git_dir
+        config = _read(common_dir / "config")
+        sha256 = b"sha256" in config
+        with path.open("rb") as h:
+            self.mtime_ns = os.fstat(h.fileno()).st_mtime_ns
+            data = h.read()
+        self.version, entries, trees = read_index(data, 32 if sha256 else 20)
+        fsdecode = os.fsdecode
+        self.entries = {fsdecode(k): v for k, v in entries.items()}
+        self.trees = {fsdecode(k): v for k, v in trees.items()}
+        self.filtered: "list[str]" = []
+        if (
+            sha256  # local trees are hashed with SHA-1
+            or _autocrlf(config)
+            or _converts(_read(common_dir / "info/attributes"))
+            or _converts(_read(top / ".gitattributes"))
+        ):
+            self.entries = {}
+        else:
+            for k in self.entries:
+                if k == ".gitattributes" or k.endswith("/.gitattributes"):
+                    if _converts(_read(top / k)):
+                        self.filtered.append(k[:-14])
+        # directory node -> (entry count, tree size), None if not clean
+        self.verified: "dict[object, tuple[int, int]|None]" = {}
+
+    @classmethod
+    def find(cls, path: Path) -> "GitIndex|None":
+        """The index of the work tree path is in, None if there is none."""
+        v = find_git_dir(path)
+        if v is None:
+            return None
+        try:
+            return cls(*v)
+        except (OSError, ValueError):
+            return None
+
+    def key(self, node) -> "str|None":
+        path = str(node._path)
+        if path.startswith(self.prefix):
+            return path[len(self.prefix) :]
+        if path == self.prefix[:-1]:
+            return ""
+        return None
+
+    def entry(self, node):
+        """The index entry of a file whose stat data still matches."""
+        key = self.key(node)
+        if not key:
+            return None
+        e = self.entries.get(key)
+        if e is None:
+            return None
+        for p in self.filtered:
+            if key.startswith(p):
+                return None
+        st = node.st
+        ctime_s, ctime_ns, mtime_s, mtime_ns, ino, mode, size, sha = e
+        t = st.st_mtime_ns
+        if (
+            st.st_size & M32 != size
+            or S_IFMT(st.st_mode) != S_IFMT(mode)
+            or t // 1000000000 & M32 != mtime_s
+            or (mtime_ns and t % 1000000000 != mtime_ns)
+            or (ino and st.st_ino & M32 != ino)
+        ):
+            return None
+        c = st.st_ctime_ns
+        if c // 1000000000 & M32 != ctime_s or (
+            ctime_ns and c % 1000000000 != ctime_ns
+        ):
+            return None
+        if mtime_s * 1000000000 + mtime_ns >= self.mtime_ns:
+            return None  # racily clean: may have changed within the same tick
+        return e
+
+    def blob_hash(self, node) -> "str|None":
+        e = self.entry(node)
+        return e and e[7].hex()
+
+    def tree_hash(self, node) -> "tuple[str, int]|None":
+        """The cache-tree (hash, size) of a directory none of whose files changed."""
+        key = self.key(node)
+        if key is None:
+            return None
+        v = self.trees.get(key)
+        if v is None:
+            return None
+        w = self._verify(node)
+        if w is None or w[0] != v[0]:
+            return None
+        return v[1].hex(), w[1]
+
+    def _verify(self, top):
+        # (files, tree size) of each directory below top, bottom-up
+        memo = self.verified
+        if top in memo:
+            return memo[top]
+        for d in (*top.iter_postorder(lambda x: not x.is_dir() or x in memo), top):
+            if d in memo or not d.is_dir():
+                continue
+            files = size = 0
+            for x in d:
+                name = len(x.name.encode())
+                if x.is_dir():
+                    w = memo.get(x)
+                    if w is None:
+                        break
+                    if w[0]:
+                        files += w[0]
+                        size += name + 27  # "40000 " name NUL hash
+                    continue
+                e = self.entry(x)
+                if e is None:
+                    break
+                if not S_ISLNK(e[5]):
+                    exe = x.aux.file_mode and x.perm & S_IXUSR
+                    if e[5] & 0o777 != (0o755 if exe else 0o644):
+                        break
+                files += 1
+                size += name + 28  # "100644 " or "120000 "
+            else:
+                memo[d] = (files, size + len(b"tree %d\0" % size))
+                continue
+            memo[d] = None
+        return memo[top]
+
+
+def _autocrlf(config: bytes) -> bool:
+    for line in config.splitlines():
+        k, _, v = line.partition(b"=")
+        if k.strip().lower() == b"autocrlf":
+            return v.strip().lower() not in (b"false", b"0", b"no", b"off")
+    return False
+
+
+def _converts(attributes: bytes) -> bool:
+    """Tells if .gitattributes content may set a content conversion."""
+    for line in attributes.splitlines():
+        line = line.strip()
+        if line and not line.startswith(b"#"):
+            for word in line.split()[1:]:
+                # "-text" and "!text" unset or unspecify: no conversion
+                if word[:1] not in b"-!" and word.split(b"=")[0] in CONVERSIONS:
+                    return True
+    return False
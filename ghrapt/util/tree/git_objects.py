@@ -0,0 +1,597 @@
+import os
+import re
+import zlib
+from collections import OrderedDict
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+from stat import S_IFMT, S_IMODE
+from struct import unpack_from
+
+from .repo_node import RepoAux, RepoNode
+
+OBJ_COMMIT = 1
+OBJ_TREE = 2
+OBJ_BLOB = 3
+OBJ_TAG = 4
+OBJ_OFS_DELTA = 6
+OBJ_REF_DELTA = 7
+TYPES = {b"commit": OBJ_COMMIT, b"tree": OBJ_TREE, b"blob": OBJ_BLOB, b"tag": OBJ_TAG}
+HASH_SIZES = {"sha1": 20, "sha256": 32}
+# "~N", "^N" (N defaults to 1) and "^{type}" suffixes of a revision
+_SUFFIX = re.compile(r"(?:~(\d*)|\^(\d*)|\^\{(\w*)\})$")
+
+
+def object_format(config: bytes) -> str:
+    """The extensions.objectformat of a repository config, sha1 by default."""
+    section = b""
+    for line in config.splitlines():
+        line = line.split(b"#")[0].split(b";")[0].strip()
+        if line.startswith(b"["):
+            section = line.strip(b"[]").strip().lower()
+        elif section == b"extensions":
+            k, _, v = line.partition(b"=")
+            if k.strip().lower() == b"objectformat":
+                return v.strip().lower().decode("ascii", "replace")
+    return "sha1"
+
+
+def _map(path: Path) -> mmap:
+    with open(path, "rb") as h:
+        return mmap(h.fileno(), 0, access=ACCESS_READ)
+
+
+def _delta_size(data, i: int):
+    # little-endian base 128, as in the delta header
+    v = shift = 0
+    while True:
+        c = data[i]
+        i += 1
+        v |= (c & 0x7F) << shift
+        shift += 7
+        if not c & 0x80:
+            return v, i
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    """Rebuilds an object from its delta base and a git delta."""
+    size, i = _delta_size(delta, 0)
+    if size != len(base):
+        raise ValueError("Delta base size mismatch")
+    size, i = _delta_size(delta, i)
+    src = memoryview(base)
+    out = bytearray()
+    n = len(delta)
+    while i < n:
+        c = delta[i]
+        i += 1
+        if c & 0x80:
+            # copy: offset and size bytes present as the low 7 bits say
+            off = length = 0
+            for k in range(4):
+                if c & (1 << k):
+                    off |= delta[i] << (8 * k)
+                    i += 1
+            for k in range(3):
+                if c & (0x10 << k):
+                    length |= delta[i] << (8 * k)
+                    i += 1
+            out += src[off : off + (length or 0x10000)]
+        elif c:
+            out += delta[i : i + c]
+            i += c
+        else:
+            raise ValueError("Bad delta opcode")
+    if len(out) != size:
+        raise ValueError("Delta result size mismatch")
+    return bytes(out)
+
+
+def parse_tree(data: bytes, hash_size=20):
+    """
+    Yields (mode, name, hash) of each "mode name NUL hash" tree entry; the
+    hash has 32 bytes in sha256 repositories.
+    """
+    i = 0
+    n = len(data)
+    while i < n:
+        sp = data.index(b" ", i)
+        nul = data.index(b"\0", sp)
+        end = nul + 1 + hash_size
+        yield int(data[i:sp], 8), data[sp + 1 : nul], data[nul + 1 : end]
+        i = end
+
+
+class Pack:
+    """
+    A packfile and its version 2 .idx, both mmap-ed.
+
+    Args:
+        idx_path: The .idx file; the .pack is next to it.
+        hash_size: The bytes of an object id, 32 in sha256 repositories.
+    """
+
+    def __init__(self, idx_path: Path, hash_size=20) -> None:
+        self.idx = idx = _map(idx_path)
+        if idx[:4] != b"\377tOc" or unpack_from(">I", idx, 4)[0] != 2:
+            idx.close()
+            raise ValueError(f"Unsupported pack index {idx_path}")
+        self.fanout = unpack_from(">256I", idx, 8)
+        n = self.fanout[255]
+        self.hash_size = hash_size
+        self.names = 8 + 256 * 4
+        self.offsets = self.names + n * (hash_size + 4)  # past names and CRCs
+        self.large = self.offsets + n * 4
+        self.pack = _map(idx_path.with_suffix(".pack"))
+        self.name = idx_path.stem
+
+    def find(self, sha: bytes) -> "int|None":
+        """The offset of an object in the pack, by binary search."""
+        first = sha[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        idx = self.idx
+        names = self.names
+        size = self.hash_size
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            p = names + mid * size
+            v = idx[p : p + size]
+            if v < sha:
+                lo = mid + 1
+            elif v > sha:
+                hi = mid
+            else:
+                (off,) = unpack_from(">I", idx, self.offsets + mid * 4)
+                if off & 0x80000000:
+                    p = self.large + (off & 0x7FFFFFFF) * 8
+                    (off,) = unpack_from(">Q", idx, p)
+                return off
+        return None
+
+    def matches(self, prefix: str) -> "list[bytes]":
+        """The ids of the objects whose hex id starts with prefix."""
+        first = int(prefix[:2], 16)
+        lo = self.fanout[first - 1] if first else 0
+        size = self.hash_size
+        found = []
+        for i in range(lo, self.fanout[first]):
+            p = self.names + i * size
+            v = self.idx[p : p + size]
+            if v.hex().startswith(prefix):
+                found.append(v)
+        return found
+
+    def header(self, pos: int):
+        """(type, size, data offset) of the object at pos."""
+        pack = self.pack
+        c = pack[pos]
+        pos += 1
+        kind = (c >> 4) & 7
+        size = c & 15
+        shift = 4
+        while c & 0x80:
+            c = pack[pos]
+            pos += 1
+            size |= (c & 0x7F) << shift
+            shift += 7
+        return kind, size, pos
+
+    def base_offset(self, pos: int):
+        """The relative base offset of an ofs-delta, and its data offset."""
+        pack = self.pack
+        c = pack[pos]
+        pos += 1
+        off = c & 0x7F
+        while c & 0x80:
+            c = pack[pos]
+            pos += 1
+            off = ((off + 1) << 7) | (c & 0x7F)
+        return off, pos
+
+    def inflate(self, pos: int, size: int, limit=0) -> bytes:
+        """Inflates the zlib stream at pos (only its first limit bytes)."""
+        d = zlib.decompressobj()
+        step = size + 64
+        out = []
+        while not d.eof:
+            chunk = self.pack[pos : pos + step]
+            if not chunk:
+                raise ValueError(f"Truncated object in pack {self.name}")
+            if limit:
+                return d.decompress(chunk, limit)
+            out.append(d.decompress(chunk))
+            pos += step
+        return b"".join(out)
+
+    def close(self) -> None:
+        self.idx.close()
+        self.pack.close()
+
+
+class ObjectStore:
+    """
+    Reads objects and refs of a local git repository, without running git.
+
+    Objects are looked up in the packs (and their alternates) first, then
+    as loose files. Deltas are resolved iteratively; the objects they are
+    based on are kept in a cache of cache_size bytes, least recently used
+    first out, since the objects of one tree often share their bases.
+    Object ids are of the repository's extensions.objectformat, sha1 or
+    sha256.
+
+    Args:
+        git_dir: The git directory (.git, or a bare repository).
+        cache_size: Bytes of delta bases to keep.
+
+    Raises:
+        ValueError: Another object format.
+    """
+
+    def __init__(self, git_dir: Path, cache_size=32 << 20) -> None:
+        self.git_dir = git_dir = Path(git_dir)
+        try:
+            common = (git_dir / "commondir").read_text().strip()
+        except OSError:
+            common = ""
+        self.common_dir = git_dir / common if common else git_dir
+        try:
+            config = (self.common_dir / "config").read_bytes()
+        except OSError:
+            config = b""
+        self.object_format = fmt = object_format(config)
+        if fmt not in HASH_SIZES:
+            raise ValueError(f"Unsupported object format {fmt!r} in {git_dir}")
+        self.hash_size = HASH_SIZES[fmt]
+        objects = self.common_dir / "objects"
+        self.dirs = [objects]
+        try:
+            with (objects / "info" / "alternates").open() as h:
+                for line in h:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        self.dirs.append(objects / line)
+        except OSError:
+            pass
+        self.packs: "list[Pack]" = []
+        self.load_packs()
+        self.cache: "OrderedDict[tuple[Pack, int], tuple[int, bytes]]" = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_bytes = 0
+
+    def load_packs(self) -> None:
+        """Opens the packs not opened yet, e.g. after a repack."""
+        known = {p.name for p in self.packs}
+        for d in self.dirs:
+            for idx in sorted((d / "pack").glob("*.idx")):
+                if idx.stem not in known and idx.with_suffix(".pack").exists():
+                    self.packs.append(Pack(idx, self.hash_size))
+
+    def _find(self, sha: bytes):
+        for pack in self.packs:
+            off = pack.find(sha)
+            if off is not None:
+                return pack, off
+        return None
+
+    def _loose(self, sha: bytes) -> "Path|None":
+        h = sha.hex()
+        for d in self.dirs:
+            path = d / h[:2] / h[2:]
+            if path.exists():
+                return path
+        return None
+
+    def has(self, sha: "str|bytes") -> bool:
+        """Tells if the object is in a pack or loose."""
+        if isinstance(sha, str):
+            sha = bytes.fromhex(sha)
+        return bool(self._find(sha) or self._loose(sha))
+
+    def read(self, sha: "str|bytes") -> "tuple[int, bytes]":
+        """
+        The type (OBJ_*) and content of an object.
+
+        Raises:
+            KeyError: No such object.
+        """
+        if isinstance(sha, str):
+            sha = bytes.fromhex(sha)
+        v = self._find(sha)
+        if v:
+            return self._unpack(*v)
+        path = self._loose(sha)
+        if path:
+            data = zlib.decompress(path.read_bytes())
+            i = data.index(b"\0")
+            kind, _ = data[:i].split(b" ")
+            return TYPES[kind], data[i + 1 :]
+        self.load_packs()
+        v = self._find(sha)
+        if v:
+            return self._unpack(*v)
+        raise KeyError(sha.hex())
+
+    def size(self, sha: "str|bytes") -> int:
+        """The size of an object, read from its header only."""
+        if isinstance(sha, str):
+            sha = bytes.fromhex(sha)
+        v = self._find(sha)
+        if v:
+            pack, off = v
+            kind, size, pos = pack.header(off)
+            if kind == OBJ_OFS_DELTA:
+                pos = pack.base_offset(pos)[1]
+            elif kind == OBJ_REF_DELTA:
+                pos += self.hash_size
+            else:
+                return size
+            delta = pack.inflate(pos, size, 32)
+            return _delta_size(delta, _delta_size(delta, 0)[1])[0]
+        path = self._loose(sha)
+        if path:
+            with path.open("rb") as h:
+                head = zlib.decompressobj().decompress(h.read(256), 32)
+            return int(head[head.index(b" ") + 1 : head.index(b"\0")])
+        return len(self.read(sha)[1])
+
+    def _unpack(self, pack: Pack, off: int) -> "tuple[int, bytes]":
+        cache = self.cache
+        chain = []  # (pack, offset, delta), outermost first
+        while True:
+            v = cache.get((pack, off))
+            if v:
+                cache.move_to_end((pack, off))
+                kind, data = v
+                break
+            kind, size, pos = pack.header(off)
+            if kind == OBJ_OFS_DELTA:
+                rel, pos = pack.base_offset(pos)
+                chain.append((pack, off, pack.inflate(pos, size)))
+                off -= rel
+            elif kind == OBJ_REF_DELTA:
+                end = pos + self.hash_size
+                base = pack.pack[pos:end]
+                chain.append((pack, off, pack.inflate(end, size)))
+                v = self._find(base)
+                if v is None:
+                    kind, data = self.read(base)  # loose base: thin packs
+                    break
+                pack, off = v
+            else:
+                data = pack.inflate(pos, size)
+                if chain:
+                    self._remember(pack, off, kind, data)
+                break
+        while chain:
+            pack, off, delta = chain.pop()
+            data = apply_delta(data, delta)
+            if chain:
+                self._remember(pack, off, kind, data)
+        return kind, data
+
+    def _remember(self, pack: Pack, off: int, kind: int, data: bytes) -> None:
+        size = len(data)
+        if size > self.cache_size >> 2:
+            return
+        cache = self.cache
+        cache[(pack, off)] = (kind, data)
+        self.cache_bytes += size
+        while self.cache_bytes > self.cache_size:
+            _, (_, old) = cache.popitem(last=False)
+            self.cache_bytes -= len(old)
+
+    def ref(self, name: str) -> "str|None":
+        """The object a ref points to, following symbolic refs."""
+        for _ in range(10):
+            base = self.git_dir if name == "HEAD" else self.common_dir
+            try:
+                v = (base / name).read_text().strip()
+            except OSError:
+                v = self._packed_ref(name)
+                if v is None:
+                    return None
+            if not v.startswith("ref:"):
+                return v
+            name = v[4:].strip()
+        return None
+
+    def _packed_ref(self, name: str) -> "str|None":
+        target = " " + name
+        try:
+            with (self.common_dir / "packed-refs").open() as h:
+                for line in h:
+                    line = line.rstrip("\n")
+                    if line.endswith(target) and line[0] not in "#^":
+                        return line.partition(" ")[0]  # sha1 or sha256
+        except OSError:
+            pass
+        return None
+
+    def resolve(self, rev: str) -> str:
+        """
+        The object id of a revision: a full or abbreviated hash or a ref
+        name, tried like git rev-parse does (refs/, refs/tags/,
+        refs/heads/, refs/remotes/...), followed by any "~N", "^N" and
+        "^{type}" suffixes.
+
+        Raises:
+            KeyError: Unknown or ambiguous revision.
+            ValueError: A suffix that does not apply to its object.
+        """
+        m = _SUFFIX.search(rev)
+        if m and m.start():
+            oid = self.resolve(rev[: m.start()])
+            back, parent, kind = m.groups()
+            if kind is not None:
+                return self._peel(oid, kind, rev)
+            if back is not None:
+                oid = self._peel(oid, "commit", rev)
+                for _ in range(int(back or 1)):
+                    oid = self._parent(oid, 1, rev)
+                return oid
+            return self._parent(oid, int(parent or 1), rev)
+        n = self.hash_size * 2
+        hexa = all(c in "0123456789abcdefABCDEF" for c in rev)
+        if len(rev) == n and hexa:
+            return rev.lower()
+        for fmt in (
+            "%s",
+            "refs/%s",
+            "refs/tags/%s",
+            "refs/heads/%s",
+            "refs/remotes/%s",
+            "refs/remotes/%s/HEAD",
+        ):
+            v = self.ref(fmt % rev)
+            if v:
+                return v
+        if 4 <= len(rev) < n and hexa:
+            return self._abbreviated(rev.lower())
+        raise KeyError(f"Unknown revision {rev!r}")
+
+    def _abbreviated(self, prefix: str) -> str:
+        found = set()
+        for pack in self.packs:
+            found.update(pack.matches(prefix))
+        for d in self.dirs:
+            for path in (d / prefix[:2]).glob(prefix[2:] + "*"):
+                found.add(bytes.fromhex(prefix[:2] + path.name))
+        if len(found) > 1:
+            raise KeyError(f"Ambiguous revision {prefix!r}")
+        if not found:
+            raise KeyError(f"Unknown revision {prefix!r}")
+        return found.pop().hex()
+
+    def _peel(self, oid: str, want: str, rev: str) -> str:
+        # tags to their object and, for a tree, a commit to its tree, until
+        # an object of type want (any but a tag when want is "")
+        n = self.hash_size * 2
+        want_kind = TYPES.get(want.encode())
+        while True:
+            kind, data = self.read(oid)
+            if kind == want_kind or not want and kind != OBJ_TAG:
+                return oid
+            if kind == OBJ_TAG:
+                oid = data[7 : 7 + n].decode()  # "object <hash>"
+            elif kind == OBJ_COMMIT and want_kind == OBJ_TREE:
+                oid = data[5 : 5 + n].decode()  # "tree <hash>"
+            else:
+                raise ValueError(f"Not a {want}: {rev}")
+
+    def _parent(self, oid: str, i: int, rev: str) -> str:
+        oid = self._peel(oid, "commit", rev)
+        if not i:
+            return oid
+        head = self.read(oid)[1].split(b"\n\n", 1)[0]
+        parents = [x[7:] for x in head.split(b"\n") if x.startswith(b"parent ")]
+        if len(parents) < i:
+            raise KeyError(f"Unknown revision {rev!r}")
+        return parents[i - 1].decode()
+
+    def tree_id(self, rev: str) -> str:
+        """
+        The tree of a tree-ish: a commit, tag or tree revision (see
+        resolve), with an optional ":path" into it.
+
+        Raises:
+            KeyError: Unknown revision or path.
+            ValueError: Not a tree.
+        """
+        rev, _, path = rev.partition(":")
+        oid = self._peel(self.resolve(rev or "HEAD"), "tree", rev)
+        data = self.read(oid)[1]
+        for part in path.strip("/").split("/") if path.strip("/") else ():
+            want = part.encode()
+            for mode, name, sha in parse_tree(data, self.hash_size):
+                if name == want:
+                    oid = sha.hex()
+                    break
+            else:
+                raise KeyError(f"No path {path!r} in {rev or 'HEAD'}")
+            kind, data = self.read(oid)
+            if kind != OBJ_TREE:
+                raise ValueError(f"Not a tree: {rev}:{path}")
+        return oid
+
+    def close(self) -> None:
+        for pack in self.packs:
+            pack.close()
+        self.packs = []
+        self.cache.clear()
+        self.cache_bytes = 0
+
+    def __enter__(self) -> "ObjectStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class GitNode(RepoNode):
+    __slots__ = ()
+
+    def _get_size(self):
+        if self.type == 0xE000:
+            return 0  # a gitlink: the commit is in the submodule's store
+        size = self.aux.store.size(self.hash)
+        if self.type == 0x4000:
+            # the size of a tree node counts the object header too
+            size += len(b"tree %d\0" % size)
+        return size
+
+
+class GitAux(RepoAux):
+    """Lists trees of an ObjectStore as their nodes are descended into."""
+
+    file_mode = True  # the modes are those of the trees
+
+    def __init__(self, store: ObjectStore) -> None:
+        self.store = store
+        self.object_format = store.object_format
+
+    def items(self, node: RepoNode):
+        if not node.is_dir():
+            return
+        kind, data = self.store.read(node.hash)
+        for mode, name, sha in parse_tree(data, self.store.hash_size):
+            x = GitNode(name.decode("utf-8", "surrogateescape"), node)
+            x.type = S_IFMT(mode)
+            x.perm = S_IMODE(mode)
+            x.hash = sha.hex()
+            yield x
+
+    def read(self, node: RepoNode) -> bytes:
+        """The content of a blob."""
+        return self.store.read(node.hash)[1]
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, str(self.store.git_dir))
+
+
+def git_tree(path: "str|os.PathLike", rev="HEAD") -> GitNode:
+    """
+    The root node of a tree-ish of the repository at path (a work tree or
+    a bare repository); its children are read as they are walked.
+
+    Raises:
+        ValueError: path is not in a repository, of an unsupported object
+            format, or rev is not a tree-ish.
+        KeyError: Unknown revision or path.
+    """
+    from .git_index import find_git_dir
+
+    path = Path(path).absolute()
+    if (path / "objects").is_dir() and (path / "HEAD").is_file():
+        git_dir = path
+    else:
+        v = find_git_dir(path)
+        if v is None:
+            raise ValueError(f"Not a git repository: {path}")
+        git_dir = v[1]
+    store = ObjectStore(git_dir)
+    root = GitNode("ROOT")
+    root.aux = GitAux(store)
+    root.type = 0x4000
+    root.perm = 0
+    root.hash = store.tree_id(rev)
+    return root
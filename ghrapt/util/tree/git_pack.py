@@ -0,0 +1,390 @@
+import os
+import zlib
+from hashlib import sha1
+from pathlib import Path
+from stat import S_IXUSR
+from struct import pack as st_pack
+
+from .git_objects import (
+    OBJ_BLOB,
+    OBJ_OFS_DELTA,
+    OBJ_REF_DELTA,
+    OBJ_TREE,
+    TYPES,
+    ObjectStore,
+    Pack,
+    _map,
+    parse_tree,
+)
+from .repo_node import RepoNode
+
+NAMES = {v: k for k, v in TYPES.items()}
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+def object_id(kind: int, data: bytes) -> str:
+    m = sha1(b"%s %d\0" % (NAMES[kind], len(data)))
+    m.update(data)
+    return m.hexdigest()
+
+
+class _Input:
+    """
+    Reads a pack from chunks of any size, copying what it reads to out and
+    keeping the checksum of the pack and the CRC of the current entry.
+    """
+
+    def __init__(self, chunks, out) -> None:
+        self.it = iter(chunks)
+        self.out = out
+        self.buf = b""
+        self.pos = 0
+        self.offset = 0  # in the pack, of buf[pos]
+        self.sha = sha1()
+        self.crc = 0
+
+    def _more(self) -> None:
+        for b in self.it:
+            if b:
+                self.buf = self.buf[self.pos :] + b
+                self.pos = 0
+                return
+        raise ValueError("Truncated pack")
+
+    def _take(self, n: int) -> bytes:
+        pos = self.pos
+        b = self.buf[pos : pos + n]
+        self.pos = pos + n
+        self.offset += n
+        self.sha.update(b)
+        self.crc = zlib.crc32(b, self.crc)
+        self.out.write(b)
+        return b
+
+    def read(self, n: int) -> bytes:
+        while len(self.buf) - self.pos < n:
+            self._more()
+        return self._take(n)
+
+    def inflate(self, m=None) -> int:
+        """Inflates one zlib stream, into m if given; returns its size."""
+        d = zlib.decompressobj()
+        n = 0
+        while not d.eof:
+            if self.pos == len(self.buf):
+                self._more()
+            view = memoryview(self.buf)[self.pos :]
+            data = d.decompress(view)
+            self._take(len(view) - len(d.unused_data))
+            n += len(data)
+            m and m.update(data)
+        return n
+
+    def rest(self) -> bytes:
+        b = self.buf[self.pos :] + b"".join(self.it)
+        self.buf = b""
+        self.pos = 0
+        return b
+
+
+class _Unindexed(Pack):
+    # a pack being indexed: objects are found by the ids resolved so far
+    def __init__(self, path: Path, ids: "dict[bytes, int]") -> None:
+        self.pack = _map(path)
+        self.name = path.stem
+        self.ids = ids
+
+    def find(self, sha: bytes) -> "int|None":
+        return self.ids.get(sha)
+
+    def close(self) -> None:
+        self.pack.close()
+
+
+def index_pack(chunks, store: ObjectStore) -> "tuple[str, int]":
+    """
+    Adds a pack, read from chunks of bytes as they arrive, to the packs of
+    store, like git index-pack.
+
+    The pack is written as it is read, the ids of whole objects hashed on
+    the way; deltas are then resolved through the store (so that their
+    bases may be in it already) and the .idx written next to the pack.
+
+    Returns:
+        The name of the pack and its number of objects.
+
+    Raises:
+        ValueError: Not a pack, or a corrupt one, or a store not in sha1.
+        KeyError: A delta base is nowhere.
+    """
+    if store.object_format != "sha1":
+        raise ValueError(f"Packs are indexed in sha1 only, not {store.object_format}")
+    pack_dir = store.dirs[0] / "pack"
+    pack_dir.mkdir(parents=True, exist_ok=True)
+    tmp = pack_dir / f"tmp_pack_{os.getpid()}.pack"
+    ids: "dict[bytes, int]" = {}  # object id -> offset
+    crcs: "dict[int, int]" = {}  # offset -> CRC32 of the entry
+    deltas: "list[int]" = []
+    try:
+        with open(tmp, "wb") as out:
+            r = _Input(chunks, out)
+            head = r.read(12)
+            if head[:4] != b"PACK" or head[4:8] not in (b"\0\0\0\2", b"\0\0\0\3"):
+                raise ValueError("Not a pack")
+            count = int.from_bytes(head[8:], "big")
+            for _ in range(count):
+                off = r.offset
+                r.crc = 0
+                c = r.read(1)[0]
+                kind = (c >> 4) & 7
+                size = c & 15
+                shift = 4
+                while c & 0x80:
+                    c = r.read(1)[0]
+                    size |= (c & 0x7F) << shift
+                    shift += 7
+                if kind == OBJ_OFS_DELTA:
+                    while r.read(1)[0] & 0x80:
+                        pass
+                elif kind == OBJ_REF_DELTA:
+                    r.read(20)
+                if kind in NAMES:
+                    m = sha1(b"%s %d\0" % (NAMES[kind], size))
+                    n = r.inflate(m)
+                    ids[m.digest()] = off
+                else:
+                    n = r.inflate()
+                    deltas.append(off)
+                if n != size:
+                    raise ValueError(f"Bad object size at {off} in pack")
+                crcs[off] = r.crc
+            digest = r.sha.digest()
+            if r.read(20) != digest or r.rest():
+                raise ValueError("Bad pack checksum")
+        name = "pack-" + digest.hex()
+        if deltas:
+            _resolve(tmp, ids, deltas, store)
+        if not (pack_dir / (name + ".idx")).exists():
+            idx = _idx(ids, crcs, digest)
+            os.replace(tmp, pack_dir / (name + ".pack"))
+            (pack_dir / (name + ".idx")).write_bytes(idx)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    store.load_packs()
+    return name, count
+
+
+def _resolve(path: Path, ids, deltas: "list[int]", store: ObjectStore) -> None:
+    pack = _Unindexed(path, ids)
+    store.packs.append(pack)  # bases in the pack are found like the others
+    try:
+        while deltas:
+            later = []
+            for off in deltas:
+                try:
+                    kind, data = store._unpack(pack, off)
+                except KeyError:
+                    later.append(off)  # its base is a delta not resolved yet
+                    continue
+                ids[bytes.fromhex(object_id(kind, data))] = off
+            if len(later) == len(deltas):
+                raise KeyError(f"{len(later)} deltas without a base")
+            deltas = later
+    finally:
+        store.packs.remove(pack)
+        for k in [k for k in store.cache if k[0] is pack]:
+            store.cache_bytes -= len(store.cache.pop(k)[1])
+        pack.close()
+
+
+def _idx(ids: "dict[bytes, int]", crcs: "dict[int, int]", digest: bytes) -> bytes:
+    names = sorted(ids)
+    fanout = [0] * 256
+    for sha in names:
+        fanout[sha[0]] += 1
+    total = 0
+    for i, n in enumerate(fanout):
+        total += n
+        fanout[i] = total
+    offsets = []
+    large = []
+    for sha in names:
+        off = ids[sha]
+        if off < 0x80000000:
+            offsets.append(off)
+        else:
+            offsets.append(0x80000000 | len(large))
+            large.append(off)
+    n = len(names)
+    body = b"".join(
+        (
+            b"\377tOc\0\0\0\2",
+            st_pack(">256I", *fanout),
+            *names,
+            st_pack(">%dI" % n, *(crcs[ids[sha]] for sha in names)),
+            st_pack(">%dI" % n, *offsets),
+            st_pack(">%dQ" % len(large), *large),
+            digest,
+        )
+    )
+    return body + sha1(body).digest()
+
+
+def _entry_header(kind: int, size: int) -> bytes:
+    c = (kind << 4) | (size & 15)
+    size >>= 4
+    out = bytearray()
+    while size:
+        out.append(c | 0x80)
+        c = size & 0x7F
+        size >>= 7
+    out.append(c)
+    return bytes(out)
+
+
+def write_pack(objects, bufsiz=1 << 20):
+    """
+    Yields a pack of objects in chunks, without deltas.
+
+    Args:
+        objects: A list of (type, size, source): the content as bytes, or
+            the path of a file to read it from while the pack is sent.
+
+    Raises:
+        ValueError: A file changed size since it was listed.
+    """
+    m = sha1()
+    b = b"PACK" + st_pack(">II", 2, len(objects))
+    m.update(b)
+    yield b
+    for kind, size, src in objects:
+        z = zlib.compressobj(1)
+        parts = [_entry_header(kind, size)]
+        if isinstance(src, bytes):
+            parts.append(z.compress(src))
+        else:
+            n = 0
+            with open(src, "rb") as h:
+                for b in iter(lambda: h.read(bufsiz), b""):
+                    n += len(b)
+                    parts.append(z.compress(b))
+                    if len(parts) > 16:
+                        b = b"".join(parts)
+                        m.update(b)
+                        yield b
+                        parts = []
+            if n != size:
+                raise ValueError(f"{src}: changed while packed")
+        parts.append(z.flush())
+        b = b"".join(parts)
+        m.update(b)
+        yield b
+    yield m.digest()
+
+
+def tree_objects(root: RepoNode, store: "ObjectStore|None" = None, have=None):
+    """
+    The objects of a RepoNode tree that a repository lacks, to be packed.
+
+    Files are recorded with their executable bit (100755), as git does;
+    empty directories are left out. With store and have, the tree id of
+    what the other side has, directories are compared to it path by path
+    and the objects found unchanged left out; their sub trees are read
+    from store, which must hold them (a blob:none fetch is enough).
+
+    Returns:
+        The tree id of root and a list of (type, size, source) for
+        write_pack: blob sources are the files of a LocalNode tree (their
+        pointers in LFS mode), or read by the aux of other trees.
+    """
+    trees: "dict[RepoNode, tuple[str, bytes]]" = {}
+    dirs = [x for x in root.iter_postorder() if x.is_dir()]
+    dirs.append(root)
+    for node in dirs:
+        rows = []
+        for x in node:
+            kind = x.type
+            if kind == 0x4000:
+                oid = trees[x][0]
+                if oid == EMPTY_TREE:
+                    continue
+                mode = b"40000"
+            elif kind == 0xE000:
+                mode, oid = b"160000", x.hash
+            elif kind == 0xA000:
+                mode, oid = b"120000", x.get_hash()
+            else:
+                mode = b"100755" if x.perm & S_IXUSR else b"100644"
+                oid = x.get_hash()
+            name = x.name.encode("utf-8", "surrogateescape")
+            key = name + b"/" if kind == 0x4000 else name
+            rows.append((key, mode + b" " + name + b"\0" + bytes.fromhex(oid)))
+        rows.sort()
+        content = b"".join(row for _, row in rows)
+        trees[node] = (object_id(OBJ_TREE, content), content)
+
+    objects = []
+    seen = set()
+    todo = [(root, have)]
+    while todo:
+        node, other = todo.pop()
+        oid, content = trees[node]
+        if oid == other or oid in seen:
+            continue
+        seen.add(oid)
+        objects.append((OBJ_TREE, len(content), content))
+        theirs = {}
+        if other and store is not None:
+            try:
+                data = store.read(other)[1]
+                theirs = {n: (m, sha.hex()) for m, n, sha in parse_tree(data)}
+            except KeyError:
+                pass  # not fetched: send it all
+        for x in node:
+            name = x.name.encode("utf-8", "surrogateescape")
+            if x.type == 0x4000:
+                mode, sub = theirs.get(name, (0, None))
+                if trees[x][0] != EMPTY_TREE:
+                    todo.append((x, sub if mode == 0o40000 else None))
+                continue
+            if x.type == 0xE000:
+                continue  # the commit of a submodule is not ours to send
+            oid = x.get_hash()
+            if oid == theirs.get(name, (0, None))[1] or oid in seen:
+                continue
+            seen.add(oid)
+            objects.append((OBJ_BLOB, *_blob_source(x, oid)))
+    return trees[root][0], objects
+
+
+def _blob_source(node: RepoNode, oid: str):
+    lfs = getattr(node.aux, "lfs", None)
+    data = lfs and lfs.pointers.get(oid)  # hashed as a Git LFS pointer
+    if not data:
+        path = getattr(node, "_path", None)
+        if path is None:
+            data = node.aux.read(node)
+        elif node.type == 0xA000:
+            data = os.readlink(path).encode("utf-8", "surrogateescape")
+        else:
+            return node.size, path
+    return len(data), data
+
+
+def commit_object(
+    tree: str, parents=(), message="", author="ghrapt <ghrapt@localhost>", when=None
+) -> bytes:
+    """The content of a commit by author (also its committer) at when."""
+    from time import time
+
+    stamp = b"%s %d +0000" % (author.encode("utf-8"), when or time())
+    lines = [b"tree " + tree.encode()]
+    lines.extend(b"parent " + p.encode() for p in parents)
+    lines.append(b"author " + stamp)
+    lines.append(b"committer " + stamp)
+    body = message.encode("utf-8")
+    if not body.endswith(b"\n"):
+        body += b"\n"
+    return b"\n".join(lines) + b"\n\n" + body
+
@@ -0,0 +1,103 @@
+import os
+from hashlib import sha1
+from time import time_ns
+
+HEADER = "# ghrapt hash cache 1\n"
+# mtimes this close to the read may be those of a later write (coarse clocks)
+RACY_NS = 2 * 10**9
+
+
+def fingerprint(path, size: int, block=64 * 1024, count=8) -> str:
+    """
+    A cheap digest of a large file: its size, head, tail and evenly spaced
+    blocks in between, read with ``count`` preads of ``block`` bytes.
+    """
+    m = sha1(b"%d\0" % size)
+    last = max(size - block, 0)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for i in range(count):
+            m.update(os.pread(fd, block, last * i // (count - 1)))
+    finally:
+        os.close(fd)
+    return m.hexdigest()
+
+
+class HashCache:
+    """
+    Blob hashes of local files kept between runs.
+
+    Entries map a path to (size, mtime_ns, hash, fingerprint), fingerprint
+    being None for files checked by mtime only. The file has one
+    ``size mtime_ns hash fingerprint<TAB>path`` line per entry, paths
+    quoted as git does; malformed lines, as left by an interrupted write,
+    are skipped.
+
+    Like git with racily clean index entries, a file modified less than
+    RACY_NS before it was read is not entered: a write right after the
+    read could leave it the same size and mtime.
+    """
+
+    def __init__(self, path: "str|None" = None) -> None:
+        self.path = path
+        self.entries: "dict[str, tuple[int, int, str, str|None]]" = {}
+        self.dirty = False
+        path and self.load(path)
+
+    def get(self, key: str):
+        return self.entries.get(key)
+
+    def put(
+        self, key: str, size: int, mtime_ns: int, hash: str, fp=None, since=None
+    ):
+        """
+        Enters the hash of a file read from the time since (time_ns(), now
+        by default) on; racily clean ones are dropped instead.
+        """
+        if mtime_ns + RACY_NS > (time_ns() if since is None else since):
+            if self.entries.pop(key, None):
+                self.dirty = True
+            return
+        self.entries[key] = (size, mtime_ns, hash, fp)
+        self.dirty = True
+
+    def load(self, path: str) -> None:
+        from ..listing import unquote_path
+
+        try:
+            h = open(path, encoding="utf-8", errors="surrogateescape")
+        except FileNotFoundError:
+            return
+        entries = self.entries
+        with h:
+            if h.readline() != HEADER:
+                return  # unknown format: start over
+            for line in h:
+                info, tab, name = line.partition("\t")
+                try:
+                    if not (tab and name.endswith("\n")):
+                        raise ValueError("truncated")
+                    size, mtime_ns, sha, fp = info.split(" ")
+                    entries[unquote_path(name[:-1])] = (
+                        int(size),
+                        int(mtime_ns),
+                        sha,
+                        None if fp == "-" else fp,
+                    )
+                except ValueError:
+                    self.dirty = True  # rewrite it without the line
+
+    def save(self, path: "str|None" = None) -> None:
+        """Writes the entries if they changed, replacing the file atomically."""
+        from ..listing import quote_path
+
+        path = path or self.path
+        if not (path and self.dirty):
+            return
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8", errors="surrogateescape") as h:
+            h.write(HEADER)
+            for name, (size, mtime_ns, sha, fp) in self.entries.items():
+                h.write(f"{size} {mtime_ns} {sha} {fp or '-'}\t{quote_path(name)}\n")
+        os.replace(tmp, path)
+        self.dirty = False
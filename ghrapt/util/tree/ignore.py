@@ -43,7 +43,8 @@ class FilterRel(FilterBase):
     def matches(self, data, rel):
         # debug("matches %s %s %r", data, rel, (self))
 
-        return ((not self.dir_only) or (data.is_dir())) and self.re.match(rel)
+        # unanchored patterns match at any level: "(?:^|/)name$"
+        return ((not self.dir_only) or (data.is_dir())) and self.re.search(rel)
 
     def __str__(self):
         # return "%s(<%s>, %s)" % (self.dir_only and "Dir" or "Path",  self.re.pattern, self.next and str(self.next))
@@ -66,7 +67,7 @@ class FilterPath(FilterBase):
         self.glob = glob
 
     def matches(self, data, rel):
-        return ((not self.dir_only) or (data.is_dir())) and self.re.match(
+        return ((not self.dir_only) or (data.is_dir())) and self.re.search(
             str(data._path)
         )
 
@@ -82,27 +83,6 @@ class FilterPath(FilterBase):
         return str(self)
 
 
-class FilterMaxSize(FilterBase):
-    __slots__ = "max_size"
-
-    def __init__(self, max_size, next_item):
-        self.max_size = max_size
-        self.next = next_item
-
-    def matches(self, data, rel):
-        return data.is_file() and data.size > self.max_size
-        # debug("matches %s %s %r", data, rel, (self))
-
-    def __str__(self):
-        return "%s<%s>" % (
-            self.__class__.__name__,
-            self.max_size,
-        )
-
-    def __repr__(self):
-        return str(self)
-
-
 class GitIgnore:
     def parse_line(
         self, line: str, base_path: "Optional[str]" = None
@@ -158,7 +138,7 @@ class GitIgnore:
                     # **/ → match in any subdirectory
                     if i < n and line[i] == "/":
                         i += 1
-                        regex_parts.append("(?:/[^/]+)*")
+                        regex_parts.append("(?:[^/]+/)*")
                     else:
                         regex_parts.append(".*")
                 else:
@@ -228,33 +208,60 @@ class GitIgnore:
                 yield self.parse_line(line, base)
 
 
-def collect_ignore(path: Path):
+def read_gitignore(igno: Path, base: "Optional[str]" = None):
+    """Parses a .gitignore file into GitIgnore.parse_line tuples; None if missing."""
+    if igno.is_file():
+        with igno.open("r") as h:
+            return list(GitIgnore().parse(h, base))
+
+
+class GitIgnoreCache:
+    """
+    A read_gitignore that parses each file once while it is unchanged.
+
+    Files are checked with one stat per call (size and mtime), so a
+    long-lived caller does not read and compile the same rules again.
+    """
+
+    def __init__(self) -> None:
+        self.files: "dict[tuple[str, str|None], tuple[int, int, list|None]]" = {}
+
+    def __call__(self, igno: Path, base: "Optional[str]" = None):
+        try:
+            st = igno.stat()
+        except OSError:
+            return None
+        key = (str(igno), base)
+        v = self.files.get(key)
+        if v and v[0] == st.st_mtime_ns and v[1] == st.st_size:
+            return v[2]
+        rules = read_gitignore(igno, base)
+        self.files[key] = (st.st_mtime_ns, st.st_size, rules)
+        return rules
+
+
+def collect_ignore(path: Path, read=read_gitignore):
     excludes = includes = None
 
     while path and path.name:
         cur = path
         path = path.parent
         base = str(cur)
-        igno = cur / ".gitignore"
-        gi = GitIgnore()
-        if igno.is_file():
-            # debug(".gitignore %r", igno)
-            # base = "/".join(node.enum_names())
-            with igno.open("r") as h:
-                for neg, re, dirOnly, pattern in gi.parse(h, base):
-                    debug(
-                        "%s%s <%s>",
-                        neg and "in" or "ex",
-                        dirOnly and "d" or "p",
-                        re.pattern,
-                    )
-                    if neg:
-                        includes = FilterPath(re, dirOnly, includes, pattern)
-                    else:
-                        excludes = FilterPath(re, dirOnly, excludes, pattern)
+        # debug(".gitignore %r", igno)
+        for neg, re, dirOnly, pattern in read(cur / ".gitignore", base) or ():
+            debug(
+                "%s%s <%s>",
+                neg and "in" or "ex",
+                dirOnly and "d" or "p",
+                re.pattern,
+            )
+            if neg:
+                includes = FilterPath(re, dirOnly, includes, pattern)
+            else:
+                excludes = FilterPath(re, dirOnly, excludes, pattern)
         gitd = cur / ".git"
         if gitd.is_dir():
-            (neg, re, dirOnly, pattern) = gi.parse_line("/.git/", base)
+            (neg, re, dirOnly, pattern) = GitIgnore().parse_line("/.git/", base)
             excludes = FilterPath(re, dirOnly, excludes, pattern)
     if excludes or includes:
         return (excludes, includes)
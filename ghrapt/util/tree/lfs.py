@@ -0,0 +1,169 @@
+from time import time_ns
+
+from .digest import Digests, empty_blob, object_hash
+from .ignore import GitIgnore
+from .readahead import dont_need
+
+POINTER = b"version https://git-lfs.github.com/spec/v1\noid sha256:%s\nsize %d\n"
+
+
+def pointer(oid: str, size: int) -> bytes:
+    """The pointer blob git lfs commits for content of that sha256 and size."""
+    return POINTER % (oid.encode(), size)
+
+
+def parse_attributes(data: bytes) -> "list[tuple[object, bool]]":
+    """
+    The (regex, is lfs) rules of .gitattributes content that set or unset
+    the filter attribute, in file order; patterns match paths relative to
+    its directory, as .gitignore patterns do.
+    """
+    g = GitIgnore()
+    rules = []
+    for line in data.decode("utf-8", "surrogateescape").splitlines():
+        words = line.split()
+        if not words or words[0].startswith(("#", "[attr]", "!")):
+            continue
+        value = None
+        for a in words[1:]:
+            if a.startswith("filter="):
+                value = a == "filter=lfs"
+            elif a in ("-filter", "!filter"):
+                value = False
+        if value is not None:
+            neg, rx, dir_only, _ = g.parse_line(words[0])
+            if not dir_only:  # attributes do not apply to directories
+                rules.append((rx, value))
+    return rules
+
+
+class Lfs:
+    """
+    Git LFS pointer mode of a walk: the files that .gitattributes sends to
+    the lfs filter, and those of min_size bytes or more unless their
+    attributes say otherwise, are hashed as the pointer blob that git lfs
+    would commit for them.
+
+    Such a file is read once, for its sha256; the pointer and its blob
+    hash follow from that and the size, so a HashCache entry (the sha256,
+    under "lfs:<path>") spares the read on the next run. The .gitattributes
+    of the walked directory and of those below it are read; the ones
+    above it, and info/attributes, are not.
+
+    The rules, objects and pointers are those of one tree: a Walker calls
+    reset for each tree it makes, so they do not pile up across walks.
+
+    Args:
+        min_size: Files of this size or more are LFS objects (0: by
+            attributes only).
+    """
+
+    def __init__(self, min_size=0) -> None:
+        self.min_size = min_size
+        # sha256 -> (path, size) of the content to upload
+        self.objects: "dict[str, tuple[str, int]]" = {}
+        # blob hash -> pointer blob, of the pointers computed
+        self.pointers: "dict[str, bytes]" = {}
+        # directory node -> its .gitattributes rules
+        self.rules: "dict[object, list[tuple[object, bool]]]" = {}
+
+    def reset(self) -> None:
+        """Forgets the rules, objects and pointers of the previous tree."""
+        self.objects = {}
+        self.pointers = {}
+        self.rules = {}
+
+    def wants(self, node) -> bool:
+        """Tells if the file node is stored in LFS."""
+        v = self.attribute(node)
+        if v is None:
+            return 0 < self.min_size <= node.size
+        return v
+
+    def attribute(self, node) -> "bool|None":
+        """The filter=lfs attribute of node: set, unset or None."""
+        rel = node.name
+        for d in node.iter_parents():
+            # the deepest .gitattributes first, its last matching line first
+            for rx, value in reversed(self._rules(d)):
+                if rx.search(rel):
+                    return value
+            rel = d.name + "/" + rel
+        return None
+
+    def _rules(self, d) -> "list[tuple[object, bool]]":
+        rules = self.rules.get(d)
+        if rules is None:
+            try:
+                data = (d._path / ".gitattributes").read_bytes()
+            except OSError:
+                data = b""
+            rules = self.rules[d] = parse_attributes(data)
+        return rules
+
+    def get_hash(self, node, bufsiz=64 * 1024, read=False) -> str:
+        """
+        The blob hash of the pointer of the file node; records its content.
+        An empty file stays an empty blob, as git lfs commits it.
+
+        Args:
+            read: Read the file even if its sha256 is cached, for the
+                digests of the walk (node.digests), see Digests.
+        """
+        if not node.st.st_size:
+            if node.aux.digests:
+                node.digests = Digests(node.aux.digests, 0).hexdigests()
+            return empty_blob(node.aux.object_format)
+        oid = None if read else self._cached_oid(node)
+        if oid is None:
+            st = node.st
+            since = time_ns()
+            oid = self._read(node, bufsiz)
+            cache = node.aux.hash_cache
+            key = "lfs:" + str(node._path)
+            cache and cache.put(key, st.st_size, st.st_mtime_ns, oid, since=since)
+        return self._pointer_hash(node, oid)
+
+    def cached_hash(self, node) -> "str|None":
+        """get_hash if the sha256 of node is in the HashCache, else None."""
+        if not node.st.st_size:
+            return self.get_hash(node)
+        oid = self._cached_oid(node)
+        return oid and self._pointer_hash(node, oid)
+
+    def _cached_oid(self, node) -> "str|None":
+        cache = node.aux.hash_cache
+        v = cache and cache.get("lfs:" + str(node._path))
+        st = node.st
+        if v and v[0] == st.st_size and v[1] == st.st_mtime_ns:
+            return v[2]
+        return None
+
+    def _pointer_hash(self, node, oid: str) -> str:
+        size = node.st.st_size
+        self.objects[oid] = (str(node._path), size)
+        data = pointer(oid, size)
+        h = object_hash(node.aux.object_format, b"blob", data)
+        self.pointers[h] = data
+        return h
+
+    def _read(self, node, bufsiz: int) -> str:
+        # the sha256, and the digests of the walk in the same read
+        aux = node.aux
+        stats = aux.stats
+        if stats:
+            t = stats.clock()
+        m = Digests(dict.fromkeys(("sha256", *aux.digests)), node.size)
+        with node._path.open("rb") as h:
+            for b in iter(lambda: h.read(bufsiz), b""):
+                m.update(b)
+            if aux.drop_cache:
+                dont_need(h.fileno())
+        if stats:
+            stats.lap("hash", t)
+            stats.count("lfs.files")
+            stats.count("lfs.bytes", node.size)
+        d = m.hexdigests()
+        if aux.digests:
+            node.digests = {k: d[k] for k in aux.digests}
+        return d["sha256"]
@@ -0,0 +1,82 @@
+from collections import deque
+from threading import Condition, Thread
+
+from .node import Node
+
+
+def list_tree(root: Node, workers=8) -> int:
+    """
+    Lists every directory under root with several threads, so that many
+    listings are in flight at once: on NFS or SMB each one is a round trip.
+
+    Each thread takes directories from its own queue, newest first (depth
+    first, near what it listed last), and when that is empty steals the
+    oldest directory of another queue: those sit high in the tree and lead
+    to more work. A directory is listed whole by one thread through its
+    aux, as when walked, so the children keep their order and the ignore
+    filters of its ancestors, listed before it, apply.
+
+    Returns:
+        The number of directories listed.
+
+    Raises:
+        OSError: The first listing that failed; the others stop.
+    """
+    stats = getattr(root.aux, "stats", None)
+    queues = [deque() for _ in range(max(1, workers))]
+    queues[0].append(root)
+    lock = Condition()
+    state = {"pending": 1, "listed": 0, "error": None}
+
+    def take(i: int) -> "Node|None":
+        try:
+            return queues[i].pop()
+        except IndexError:
+            pass
+        n = len(queues)
+        for k in range(1, n):
+            try:
+                node = queues[(i + k) % n].popleft()
+            except IndexError:
+                continue
+            stats and stats.count("listdir.steals")
+            return node
+        return None
+
+    def work(i: int) -> None:
+        while True:
+            node = take(i)
+            if node is None:
+                with lock:
+                    while not (state["error"] or any(queues)) and state["pending"]:
+                        lock.wait()
+                    if state["error"] or not state["pending"]:
+                        return
+                continue
+            try:
+                subs = [x for x in node if x.is_dir()]
+            except BaseException as e:
+                with lock:
+                    state["error"] = state["error"] or e
+                    lock.notify_all()
+                return
+            with lock:
+                queues[i].extend(reversed(subs))
+                state["listed"] += 1
+                state["pending"] += len(subs) - 1
+                if not state["pending"]:
+                    lock.notify_all()
+                elif subs:
+                    lock.notify(len(subs))
+
+    threads = [
+        Thread(target=work, args=(i,), name=f"ghrapt-list-{i}", daemon=True)
+        for i in range(len(queues))
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if state["error"]:
+        raise state["error"]
+    return state["listed"]
@@ -1,9 +1,14 @@
+from os import scandir, stat_result
 from pathlib import Path
+from typing import Iterable
 
-from .hook_ignore import hook_ignore
+from .digest import Digests
+from .hash_cache import HashCache, fingerprint
+from .readahead import dont_need
 from .repo_node import RepoAux, RepoNode
-from .ignore import FilterBase
-from stat import S_IFMT, S_IMODE
+from stat import S_IFMT, S_IMODE, S_ISDIR, S_ISLNK
+from threading import Lock
+from time import time_ns
 
 SEPARATOR = "/"
 
@@ -17,14 +22,19 @@ _reserve_symlink = [reserve_symlink, reserve_symlink]
 
 class LocalNode(RepoNode):
     __slots__ = (
-        "mode",
+        "st",
         "_path",
         "_ignore",
-    )  # type: tuple[int,Path, None|tuple[None|FilterBase,None|FilterBase]]
+        "_target",
+        "digests",
+    )  # type: tuple[stat_result, Path, None|tuple[None|FilterBase,None|FilterBase], str, dict[str, str]]
 
-    def stat(self):
+    def _get_st(self):
         return self._path.lstat()
 
+    def stat(self):
+        return self.st
+
     def _get_mode(self):
         return self.stat().st_mode
 
@@ -42,36 +52,168 @@ class LocalNode(RepoNode):
 
     def _get_hash(self):
         if self.is_symlink():
-            from os import readlink
+            target = self.peek("_target")
+            if target is None:
+                from os import readlink
 
-            return self.calc_hash_symlink_target(readlink(str(self._path)))
+                target = readlink(str(self._path))
+            return self.calc_hash_symlink_target(target)
         elif self.is_file():
             return get_hash_reg(self)
         elif self.is_dir():
-            return self.calc_hash_tree()
+            return self.calc_hash_subtree()
         raise NotImplementedError(f"{self!r}")
 
     def _get__ignore(self):
         return None
 
+    def _get_digests(self):
+        # the digests of aux.digests of a file, see Digests
+        aux = self.aux
+        if not aux.digests or self.is_symlink() or not self.is_file():
+            return {}
+        # sets them, in the same read as the hash
+        if aux.lfs is not None and aux.lfs.wants(self):
+            h = aux.lfs.get_hash(self, read=True)
+        else:
+            h = hash_reg(self)
+        if self.peek("hash") is None:
+            self.hash = h
+        return self.digests
+
+    def invalidate_hash(self) -> None:
+        super().invalidate_hash()
+        self.aux.forget_tree_hashes(self.iter_self_and_parents())
+
     def __repr__(self):
         return f"{self.__class__.__name__}({self.aux!r}, {self._path!r})"
 
 
 def get_hash_reg(self: LocalNode, bufsiz=64 * 1024):
     # debug("calc_hash_blob %r", self)
+    aux = self.aux
+    lfs = aux.lfs
+    if lfs is not None and lfs.wants(self):
+        return lfs.get_hash(self, bufsiz)
+    index = aux.git_index
+    if index is not None:
+        h = index.blob_hash(self)
+        if h:
+            aux.stats and aux.stats.count("index.blobs")
+            return h
+    cache = aux.hash_cache
+    if cache is None:
+        return hash_inode(self, bufsiz)
+    st = self.st
+    size = st.st_size
+    key = _cache_key(self)
+    v = cache.get(key)
+    big = 0 < aux.fingerprint_size <= size
+    if v and v[0] == size:
+        if v[1] == st.st_mtime_ns:
+            return v[2]
+        if big and v[3]:
+            # touched only? sample the file instead of reading it all
+            since = time_ns()
+            fp = fingerprint(self._path, size)
+            if fp == v[3]:
+                with aux.lock:
+                    aux.fingerprint_hits += 1
+                    aux.fingerprint_bytes += size
+                cache.put(key, size, st.st_mtime_ns, v[2], fp, since)
+                return v[2]
+    since = time_ns()
+    h = hash_inode(self, bufsiz)
+    fp = fingerprint(self._path, size) if big else None
+    cache.put(key, size, st.st_mtime_ns, h, fp, since)
+    return h
+
+
+def _cache_key(self: LocalNode) -> str:
+    fmt = self.aux.object_format
+    return str(self._path) if fmt == "sha1" else f"{fmt}:{self._path}"
+
+
+def cached_hash_reg(self: LocalNode) -> "str|None":
+    """
+    The blob hash of a regular file if get_hash_reg can tell it without
+    reading the file: from the git index, the hash cache (same size and
+    mtime) or another link to the same inode already hashed.
+    """
+    aux = self.aux
+    lfs = aux.lfs
+    if lfs is not None and lfs.wants(self):
+        return lfs.cached_hash(self)
+    index = aux.git_index
+    if index is not None:
+        h = index.blob_hash(self)
+        if h:
+            aux.stats and aux.stats.count("index.blobs")
+            return h
+    st = self.st
+    cache = aux.hash_cache
+    key = cache and _cache_key(self)
+    v = cache and cache.get(key)
+    if v and v[0] == st.st_size and v[1] == st.st_mtime_ns:
+        return v[2]
+    if st.st_nlink > 1:
+        v = aux.inode_hashes.get((st.st_dev, st.st_ino))
+        if v and v[0] == st.st_size and v[1] == st.st_mtime_ns:
+            with aux.lock:
+                aux.hardlink_bytes += st.st_size
+                aux.hardlink_hits += 1
+            cache and cache.put(key, st.st_size, st.st_mtime_ns, v[2])
+            return v[2]
+    return None
+
+
+def hash_inode(self: LocalNode, bufsiz=64 * 1024):
+    st = self.st
+    if st.st_nlink > 1:
+        # hardlinks: read each inode once
+        aux = self.aux
+        key = (st.st_dev, st.st_ino)
+        v = aux.inode_hashes.get(key)
+        if v and v[0] == st.st_size and v[1] == st.st_mtime_ns:
+            with aux.lock:
+                aux.hardlink_bytes += st.st_size
+                aux.hardlink_hits += 1
+            return v[2]
+        h = hash_reg(self, bufsiz)
+        aux.inode_hashes[key] = (st.st_size, st.st_mtime_ns, h)
+        return h
+    return hash_reg(self, bufsiz)
+
+
+def hash_reg(self: LocalNode, bufsiz=64 * 1024):
+    stats = self.aux.stats
+    if stats:
+        t = stats.clock()
+        h = _hash_reg(self, bufsiz)
+        stats.lap("hash", t)
+        stats.count("hash.files")
+        stats.count("hash.bytes", self.size)
+        return h
+    return _hash_reg(self, bufsiz)
+
+
+def _hash_reg(self: LocalNode, bufsiz=64 * 1024):
     size = self.size
     path = self._path
-    m = sha1()
-    m.update(b"blob ")
-    m.update(str(size).encode())
-    m.update(b"\x00")
+    aux = self.aux
+    primary = "git-" + aux.object_format
+    m = Digests(dict.fromkeys((primary, *aux.digests)), size)
     with path.open("rb") as h:
         b = h.read(bufsiz)
         while b:
             m.update(b)
             b = h.read(bufsiz)
-    return m.hexdigest()
+        if aux.drop_cache:
+            dont_need(h.fileno())
+    d = m.hexdigests()
+    if aux.digests:
+        self.digests = {k: d[k] for k in aux.digests}
+    return d[primary]
 
 
 # class PathDataOverlay(LocalData):
@@ -102,13 +244,87 @@ def get_hash_reg(self: LocalNode, bufsiz=64 * 1024):
 
 
 class LocalAux(RepoAux):
+    def __init__(self) -> None:
+        # symlink target (st_dev, st_ino) -> resolved path
+        self.resolved: "dict[tuple[int, int], Path]" = {}
+        # directory (st_dev, st_ino) -> (tree hash, tree size)
+        self.tree_hashes: "dict[tuple[int, int], tuple[str, int]]" = {}
+        # hardlinked file (st_dev, st_ino) -> (size, mtime_ns, blob hash)
+        self.inode_hashes: "dict[tuple[int, int], tuple[int, int, str]]" = {}
+        # guards the counters below, updated from the hash threads
+        self.lock = Lock()
+        self.hardlink_hits = 0
+        self.hardlink_bytes = 0  # not read again thanks to inode_hashes
+        # blob hashes kept between runs, see HashCache
+        self.hash_cache: "HashCache|None" = None
+        # files of this size or more are checked by fingerprint (0: never)
+        self.fingerprint_size = 0
+        self.fingerprint_hits = 0
+        self.fingerprint_bytes = 0  # not read again thanks to fingerprints
+        # size, mtime, type and extension tests of the entries, if any
+        self.stat_filter: "StatFilter|None" = None
+        # hashes recorded by the index of the git work tree, if any
+        self.git_index: "GitIndex|None" = None
+        # drop the pages of the files hashed from the page cache
+        self.drop_cache = False
+        # files hashed as Git LFS pointers, if any
+        self.lfs: "Lfs|None" = None
+        # more digests of each file read, in the same read, see Digests
+        self.digests: "tuple[str, ...]" = ()
+
+    def reserve_symlink_reg(self, x: LocalNode, target=None):
+        return False
 
-    def reserve_symlink_reg(self, x: LocalNode):
+    def reserve_symlink_dir(self, x: LocalNode, target=None):
         return False
 
-    def reserve_symlink_dir(self, x: LocalNode):
+    def resolve(self, path: Path, target: "stat_result|None" = None) -> Path:
+        """Resolves a symlink; each target (device, inode) is resolved once."""
+        if target is None:
+            target = path.stat()
+        key = (target.st_dev, target.st_ino)
+        real = self.resolved.get(key)
+        if real is None:
+            real = self.resolved[key] = path.resolve()
+        return real
+
+    def is_cycle(self, parent: "LocalNode|None", target: stat_result):
+        """Tells if a directory is already one of parent and its ancestors."""
+        key = (target.st_dev, target.st_ino)
+        cur = parent
+        while cur:
+            st = cur.st
+            if (st.st_dev, st.st_ino) == key:
+                return True
+            cur = cur.parent
         return False
 
+    def cached_tree_hash(self, node: LocalNode):
+        st = node.st
+        v = self.tree_hashes.get((st.st_dev, st.st_ino))
+        if v:
+            node.size = v[1]
+            return v[0]
+        index = self.git_index
+        if index is not None:
+            v = index.tree_hash(node)
+            if v:
+                self.stats and self.stats.count("index.trees")
+                node.size = v[1]
+                return v[0]
+
+    def cache_tree_hash(self, node: LocalNode, h: str):
+        st = node.st
+        self.tree_hashes[(st.st_dev, st.st_ino)] = (h, node.size)
+
+    def forget_tree_hashes(self, nodes: Iterable[LocalNode]):
+        index = self.git_index
+        for node in nodes:
+            index and index.verified.pop(node, None)
+            st = node.peek("st")
+            if st:
+                self.tree_hashes.pop((st.st_dev, st.st_ino), None)
+
     def open(self, mode="r", buffering=-1, encoding=None, errors=None, newline=None):
         # print("open", mode, self.path)
         return self._path.open(
@@ -125,24 +341,61 @@ class LocalAux(RepoAux):
         return "%s()" % (self.__class__.__name__)
 
     def filter_dir(self, node):
+        from .hook_ignore import hook_ignore
+
         return hook_ignore(node)
 
+    def read_gitignore(self, igno: Path, base=None):
+        from .ignore import read_gitignore
+
+        return read_gitignore(igno, base)
+
     def items(self, node: LocalNode):
         # print(f"LIST {node!r}", node.is_dir(), node.mode, node.type)
         if not node.is_dir():
             return
         path = node._path
         ignore = self.filter_dir(node)
+        keep = self.stat_filter
+        by_name = keep and keep.by_name
+        by_stat = keep and keep.by_stat
         # info("ITEMS %r", path)
-        for child in path.iterdir():
-            # print(f"CHLD {child!r}")
-            v = self.node_from(child, child.name, node)
+        stats = self.stats
+        if stats:
+            t = stats.clock()
+        with scandir(path) as it:
+            entries = list(it)
+        if stats:
+            stats.lap("listdir", t)
+            stats.count("listdir")
+            stats.count("listdir.entries", len(entries))
+        for e in entries:
+            name = e.name
+            if by_name and not by_name(name) and not e.is_dir():
+                continue  # the type comes with the scan, links aside
+            if stats:
+                t = stats.clock()
+            try:
+                st = e.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue  # gone since the scan
+            finally:
+                stats and stats.lap("stat", t)
+                stats and stats.count("stat")
+            v = self.node_from(path / name, name, node, st)
             assert v.parent is node
             assert v.aux is self
+            if by_stat and not by_stat(v.st):
+                continue
             if not (ignore and ignore(v)):
                 # info("\titem %r", child)
                 yield v
 
+    def keeps(self, node: LocalNode) -> bool:
+        """Tells if the stat filter keeps the node."""
+        keep = self.stat_filter
+        return not keep or keep(node.name, node.st)
+
     def symlink_strategy(self, *args):
         from logging import error
 
@@ -157,75 +410,100 @@ class LocalAux(RepoAux):
                     return None
                     assert 0, f"{(pto, pfrom, sep)}"
 
-        def safe(cur: LocalNode):
-            if not cur:
+        def safe(cur: LocalNode, target=None):
+            if not cur or target is None:
                 return False
             try:
                 ptop = cur.root._path
             except AttributeError:
                 return False
+            pcur = cur._path
+            real = self.resolve(pcur, target)
             try:
-                pcur = cur.root._path
-            except AttributeError:
-                return False
-            target = pcur.resolve()
-            try:
-                rel1 = target.relative_to(ptop)
+                real.relative_to(ptop)
             except ValueError:
-                info("SLF %r => %r", pcur, target)
+                info("SLF %r => %r", pcur, real)
                 return False
             except Exception:
                 error(
-                    "symlink_strategy:safe %r", ((cur, pcur), (cur.root, pcur), target)
+                    "symlink_strategy:safe %r", ((cur, pcur), (cur.root, ptop), real)
                 )
                 raise
             else:
-                rel1 = rel_path(target, pcur)
-                rel2 = cur.readlink()
+                from os import readlink
+
+                rel1 = rel_path(real, pcur)
+                rel2 = readlink(pcur)
                 if rel1 is None or rel2 == rel1:
-                    info("SYM Keep %r => %r => %r", pcur, rel2, target)
+                    info("SYM Keep %r => %r => %r", pcur, rel2, real)
                     return True
-                info("SYM Alter %r => %r | %r => %r", pcur, target, rel1, rel2)
+                info("SYM Alter %r => %r | %r => %r", pcur, real, rel1, rel2)
                 return rel1
 
         for v, n in zip(args, ("reserve_symlink_reg", "reserve_symlink_dir")):
             if v == "keep":
-                setattr(self, n, lambda syml: True)
+                setattr(self, n, lambda syml, target=None: True)
             elif v == "follow":
-                setattr(self, n, lambda syml: False)
+                setattr(self, n, lambda syml, target=None: False)
             elif v == "safe":
                 setattr(self, n, safe)
             else:
                 raise RuntimeError(f"Invalid follow_links {v!r}")
 
-    def node_from(self, path: Path, name="?", parent: "LocalNode|None" = None):
+    def node_from(
+        self,
+        path: Path,
+        name="?",
+        parent: "LocalNode|None" = None,
+        st: "stat_result|None" = None,
+    ):
+        """A node for path; st is its lstat when the caller already has it."""
         n = LocalNode(name, parent)
         n.aux = self
-        if path.is_symlink():
-            n._path = path
-            r = (
-                self.reserve_symlink_dir(n)
-                if path.is_dir()
-                else self.reserve_symlink_reg(n)
-            )
+        n._path = path
+        stats = self.stats
+        if st is not None:
+            n.st = st
+        else:
+            if stats:
+                t = stats.clock()
+            try:
+                n.st = st = path.lstat()
+            except FileNotFoundError:
+                return n
+            finally:
+                stats and stats.lap("stat", t)
+                stats and stats.count("stat")
+        if S_ISLNK(st.st_mode):
+            try:
+                target = path.stat()
+            except OSError:
+                target = None  # dangling or looping
+            stats and stats.count("stat")
+            if target is not None and S_ISDIR(target.st_mode):
+                r = self.reserve_symlink_dir(n, target)
+                if r is False and self.is_cycle(parent, target):
+                    info("SYM cycle %r", path)
+                    r = True
+            else:
+                r = self.reserve_symlink_reg(n, target)
             info("SYM %r %r", path, r)
             if r is True:
                 # n._path = path.resolve()
                 pass
             elif r:
                 n._target = r  # retain symlink supply target
-            else:
-                assert r is False
-                try:
-                    return self.node_from(path.resolve(), name, parent)
-                except FileNotFoundError:
-                    n._path = path
-        elif path.is_dir():
-            n._path = path
-        else:
-            n._path = path
+            elif target is not None:
+                n._path = self.resolve(path, target)
+                n.st = target
         return n
 
 
 from logging import debug, info
-from hashlib import sha1
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .git_index import GitIndex
+    from .ignore import FilterBase
+    from .lfs import Lfs
+    from .stat_filter import StatFilter
@@ -1,4 +1,7 @@
-from typing import Iterable
+from collections import deque
+from typing import Callable, Iterable
+
+from ..lazy import NoAttribute, lazy_getters
 
 
 class Aux:
@@ -45,23 +48,19 @@ class Node:
         # self.next_sibling = None
         # self.first_child = None
 
-    def __getattr__(self, name: str):
-        if not name.startswith("_"):
-            getter_name = f"_get_{name}"
-            getter = getattr(self, getter_name, None)
-
-            if getter is not None:
-                setattr(self, name, None)
-                value = getter()
-                setattr(self, name, value)
-                return value
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._lazy = lazy_getters(cls)
 
-        try:
-            return super().__getattr__(name)
-        except AttributeError:
-            raise AttributeError(
-                f"'{self.__class__.__name__}' has no attribute '{name}'. "
-            ) from None
+    def __getattr__(self, name: str):
+        # only reached when the slot is empty: fill it from _get_<name>
+        getter = self._lazy.get(name)
+        if getter is None:
+            raise NoAttribute(self, name)
+        setattr(self, name, None)
+        value = getter(self)
+        setattr(self, name, value)
+        return value
 
     @property
     def root(self) -> "Node":
@@ -340,14 +339,15 @@ class Node:
         if not name:
             raise ValueError("Child node name cannot be empty.")
 
-        child = self.get_child_by_name(name)  # Assuming you've renamed get_name
+        child = self.get_child_by_name(name)
         if not child:
-            child = self.__class__(name, self)
-            self.append_child(child)  # Assuming you've renamed append
+            child = self.__class__(name)
+            child.aux = self.aux
+            self.append_child(child)
         return child
 
     def get_sub(self, names):
-        sub = self.get_name(names[0])
+        sub = self.get_child_by_name(names[0])
         if sub:
             return sub.get_sub(names[1:]) if len(names) > 1 else sub
 
@@ -422,12 +422,7 @@ class Node:
         Yields:
             Node: A descendant node.
         """
-        child = self.first_child
-        while child:
-            assert child.parent is self, f"Child '{child.name}' has incorrect parent."
-            yield child
-            yield from child.enum_descend()
-            child = child.next_sibling
+        return self.iter_preorder()
 
     def enum_ascend(self) -> Iterable["Node"]:
         """
@@ -455,11 +450,6 @@ class Node:
             yield current
             current = current.parent
 
-    def enum_depth_first(self):
-        for sub in self:
-            yield sub
-            yield from sub
-
     def enum_depth_first(self) -> Iterable["Node"]:
         """
         Iterates over all nodes in the subtree rooted at this node using a
@@ -468,7 +458,120 @@ class Node:
         Yields:
             Node: A node in the subtree.
         """
-        for child in self:
-            assert child.parent is self, f"Child '{child.name}' has incorrect parent."
+        return self.iter_preorder()
+
+    # traversal
+
+    def iter_preorder(
+        self, prune: "Callable[[Node], bool] | None" = None
+    ) -> Iterable["Node"]:
+        """
+        Iterates over the descendants, each node before its children.
+
+        Uses an explicit stack, so the cost per node does not grow with the
+        depth of the tree and deep trees do not hit the recursion limit.
+
+        Args:
+            prune: Called with each yielded node; when it returns true the
+                children of that node are skipped.
+
+        Yields:
+            Node: A descendant node.
+        """
+        stack: "list[Node|None]" = []
+        child = self.first_child
+        while True:
+            while child:
+                yield child
+                if prune is None or not prune(child):
+                    first = child.first_child
+                    if first:
+                        stack.append(child.next_sibling)
+                        child = first
+                        continue
+                child = child.next_sibling
+            if not stack:
+                return
+            child = stack.pop()
+
+    def iter_postorder(
+        self, prune: "Callable[[Node], bool] | None" = None
+    ) -> Iterable["Node"]:
+        """
+        Iterates over the descendants, each node after its children.
+
+        Args:
+            prune: Called with each node before descending into it; when it
+                returns true the children of that node are skipped.
+
+        Yields:
+            Node: A descendant node.
+        """
+        stack: "list[Node]" = []
+        child = self.first_child
+        while True:
+            while child:
+                if prune is None or not prune(child):
+                    first = child.first_child
+                    if first:
+                        stack.append(child)
+                        child = first
+                        continue
+                yield child
+                child = child.next_sibling
+            if not stack:
+                return
+            child = stack.pop()
             yield child
-            yield from child
+            child = child.next_sibling
+
+    def iter_breadth_first(
+        self, prune: "Callable[[Node], bool] | None" = None
+    ) -> Iterable["Node"]:
+        """
+        Iterates over the descendants level by level.
+
+        Args:
+            prune: Called with each yielded node; when it returns true the
+                children of that node are skipped.
+
+        Yields:
+            Node: A descendant node.
+        """
+        queue = deque((self,))
+        while queue:
+            child = queue.popleft().first_child
+            while child:
+                yield child
+                if prune is None or not prune(child):
+                    queue.append(child)
+                child = child.next_sibling
+
+    def peek(self, name: str, default=None):
+        """
+        Gets an attribute without triggering its lazy getter.
+
+        Args:
+            name: The attribute name.
+            default: Returned when the attribute is not set yet.
+        """
+        try:
+            return object.__getattribute__(self, name)
+        except AttributeError:
+            return default
+
+    def forget(self, *names: str) -> None:
+        """
+        Drops cached attributes so that their lazy getters run again.
+
+        Args:
+            names: The attribute names; unset ones are skipped.
+        """
+        for name in names:
+            try:
+                object.__delattr__(self, name)
+            except AttributeError:
+                pass
+
+
+Node._lazy = lazy_getters(Node)
@@ -0,0 +1,52 @@
+import os
+
+# not on every platform (macOS): the hints are then skipped
+_fadvise = getattr(os, "posix_fadvise", None)
+
+
+def inode_order(node) -> "tuple[int, int]":
+    """Sort key of files in the order their inodes, and often data, are laid out."""
+    st = node.st
+    return st.st_dev, st.st_ino
+
+
+def will_need(path, size: int) -> None:
+    """Asks the kernel to start reading the first size bytes of path."""
+    if _fadvise is None:
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # the hasher reports it
+    try:
+        _fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def dont_need(fd: int) -> None:
+    """Drops the cached pages of a file read once."""
+    _fadvise and _fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def iter_readahead(files: list, window: int, stats=None):
+    """
+    Yields files (LocalNode) in order, having asked the kernel to read the
+    ones within window bytes ahead, so that the disk is busy while they
+    are hashed; a file larger than window is asked for its first window
+    bytes when its turn comes.
+    """
+    n = len(files)
+    j = 0
+    ahead = 0  # bytes asked for, from the current file on
+    for i, x in enumerate(files):
+        while j < n and (j <= i or ahead + files[j].size <= window):
+            size = min(files[j].size, window)
+            will_need(files[j]._path, size)
+            ahead += size
+            j += 1
+            if stats:
+                stats.count("readahead.files")
+                stats.count("readahead.bytes", size)
+        yield x
+        ahead -= min(x.size, window)
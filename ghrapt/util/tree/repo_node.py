@@ -1,14 +1,19 @@
+from .digest import empty_tree
 from .node import Node, Aux
 
 
 class RepoNode(Node):
     __slots__ = (
+        "mode",
         "type",
         "size",
         "perm",
         "mtime",
         "hash",
-    )  # type: tuple[int, int, int, int, str]
+    )  # type: tuple[int, int, int, int, int, str]
+
+    def _get_mode(self):
+        return self.type | self.perm
 
     def is_dir(self):
         return self.aux.is_dir(self)
@@ -27,8 +32,11 @@ class RepoNode(Node):
             perm = node.perm
             yield name + "/" if 0x4000 == kind else name, name, kind, perm, node
 
-    def calc_hash_tree(self, file_mode=False, skip_empty=True):
+    def calc_hash_tree(self, file_mode=None, skip_empty=True):
         # debug("calc_hash_tree %r", self)
+        object_format = self.aux.object_format
+        if file_mode is None:
+            file_mode = self.aux.file_mode
         content = []
         for _, name, kind, perm, sub in sorted(self.iter_sort()):
             if 0x4000 == kind:
@@ -36,7 +44,7 @@ class RepoNode(Node):
                 # checksum = sub.calc_hash_tree()
                 checksum = sub.get_hash()
                 if skip_empty:
-                    if checksum == "4b825dc642cb6eb9a060e54bf8d69288fbee4904":
+                    if checksum == empty_tree(object_format):
                         info("EMD %r", sub)
                         # self.remove(sub)
                         continue
@@ -47,7 +55,7 @@ class RepoNode(Node):
             elif 0xA000 == kind:
                 mode = b"120000 "
                 checksum = unhexlify(sub.hash)
-            elif file_mode and (perm & 0b001001001) != 0:
+            elif file_mode and perm & S_IXUSR:
                 mode = b"100755 "
                 checksum = unhexlify(sub.hash)
             else:
@@ -57,37 +65,72 @@ class RepoNode(Node):
         content = b"".join(content)
         content = b"tree " + str(len(content)).encode() + b"\x00" + content
         self.size = len(content)
-        m = sha1()
+        stats = self.aux.stats
+        if stats:
+            stats.count("tree.built")
+            stats.count("tree.bytes", len(content))
+        m = new(object_format)
         m.update(content)
         return m.hexdigest()
 
     def calc_hash_symlink_target(self, content: str):
         content = content.encode("UTF-8")
         self.size = size = len(content)
-        m = sha1()
+        m = new(self.aux.object_format)
         m.update(b"blob ")
         m.update(str(size).encode())
         m.update(b"\x00")
         m.update(content)
         return m.hexdigest()
 
+    def calc_hash_subtree(self, file_mode=None, skip_empty=True):
+        """
+        Computes the tree hash, hashing sub directories bottom-up first.
+
+        Sub directories that already have a hash, or whose hash the aux
+        already knows, are not descended into.
+        """
+        aux = self.aux
+        h = aux.cached_tree_hash(self)
+        if h:
+            return h
+        todo = set()
+
+        def done(sub: RepoNode):
+            if sub.is_dir() and not sub.peek("hash"):
+                h = aux.cached_tree_hash(sub)
+                if h:
+                    sub.hash = h
+                    return True
+                todo.add(sub)
+                return False
+            return True
+
+        for sub in self.iter_postorder(done):
+            if sub in todo:
+                sub.hash = h = sub.calc_hash_tree(file_mode, skip_empty)
+                aux.cache_tree_hash(sub, h)
+        h = self.calc_hash_tree(file_mode, skip_empty)
+        aux.cache_tree_hash(self, h)
+        return h
+
+    def invalidate_hash(self) -> None:
+        """Forgets the hash of this node and of its ancestors."""
+        for node in self.iter_self_and_parents():
+            node.forget("hash")
+
     def get_hash(self):
         aux = self.aux
         if aux.is_dir(self):
-            try:
-                h = self.hash
-            except AttributeError:
-                h = None
-            except NotImplementedError:
-                h = None
+            h = self.peek("hash")
             if not h:
-                self.hash = h = self.calc_hash_tree()
+                self.hash = h = self.calc_hash_subtree()
             return h
         else:
             return aux.get_hash(self)
 
     def get_sub_dir(self, name, *names):
-        sub = self.get_name(name)
+        sub = self.get_child_by_name(name)
         if not sub:
             raise RuntimeError(f"Not found: {name!r}")
         elif not sub.is_dir():
@@ -97,12 +140,15 @@ class RepoNode(Node):
         return sub
 
     def get_sub_dir_or_intern(self, name, *names):
-        sub = self.get_name(name)
+        sub = self.get_child_by_name(name)
         if not sub:
-            sub = self.intern(name)
+            sub = self.ensure_child(name)
+            sub.type = 0x4000
+            sub.perm = 0
+            sub.first_child = None
         elif not sub.is_dir():
             raise RuntimeError(f"Not a directory: {name!r}")
-        elif names:
+        if names:
             return sub.get_sub_dir_or_intern(*names)
         return sub
 
@@ -110,7 +156,94 @@ class RepoNode(Node):
         return "%s(%r)" % (self.__class__.__name__, self.aux)
 
 
+def build_tree(entries, root: "RepoNode|None" = None, sep="/") -> RepoNode:
+    """
+    Builds a RepoNode tree in one pass from a flat listing.
+
+    Args:
+        entries: Iterable of (path, mode, hash, size[, mtime]) records,
+            sorted or not. Mode is an int or an octal string as printed by
+            git ("100644"); unknown fields are None.
+            Directories missing from the listing are created on the way.
+        root: The node to populate (its children are replaced), or None
+            to create a new root.
+        sep: The path separator used in the listing.
+
+    Returns:
+        The root node.
+    """
+    if root is None:
+        root = RepoNode("ROOT")
+        root.aux = RepoAux()
+        root.type = 0x4000
+        root.perm = 0
+    root.first_child = None
+    cls = root.__class__
+    dirs = {"": root}
+    tails = {}
+
+    def add(parent: RepoNode, name: str) -> RepoNode:
+        node = cls(name, parent)
+        node.next_sibling = None
+        node.first_child = None
+        tail = tails.get(parent)
+        if tail is None:
+            parent.first_child = node
+        else:
+            tail.next_sibling = node
+        tails[parent] = node
+        return node
+
+    def ensure_dir(path: str) -> RepoNode:
+        missing = []
+        node = dirs.get(path)
+        while node is None:
+            missing.append(path)
+            path = path.rpartition(sep)[0]
+            node = dirs.get(path)
+        while missing:
+            path = missing.pop()
+            node = add(node, path.rpartition(sep)[2])
+            node.type = 0x4000
+            node.perm = 0
+            dirs[path] = node
+        return node
+
+    last_head = ""
+    last_parent = root
+    for path, mode, sha, size, *mtime in entries:
+        path = path.strip(sep)
+        if not path:
+            continue
+        if isinstance(mode, str):
+            mode = int(mode, 8)
+        head, _, name = path.rpartition(sep)
+        if head != last_head:
+            # sorted input: siblings share the parent, skip the lookups
+            last_parent = ensure_dir(head)
+            last_head = head
+        kind = S_IFMT(mode)
+        if 0x4000 == kind:
+            node = dirs.get(path)
+            if node is None:
+                node = dirs[path] = add(last_parent, name)
+        else:
+            node = add(last_parent, name)
+        node.type = kind
+        node.perm = S_IMODE(mode)
+        if sha:
+            node.hash = sha
+        if size is not None and size != "-":
+            node.size = int(size)
+        if mtime and mtime[0] is not None:
+            node.mtime = mtime[0]
+    return root
+
+
 class RepoAux(Aux):
+    stats: "Stats|None" = None  # see ghrapt.util.stats
+    object_format = "sha1"  # of the hashes, see digest.OBJECT_FORMATS
+    file_mode = False  # hash user-executable files as 100755, as git does
 
     def is_dir(self, node: RepoNode):
         return node.type == 0x4000
@@ -121,7 +254,24 @@ class RepoAux(Aux):
     def is_symlink(self, node: RepoNode):
         return node.type == 0xA000
 
+    def get_hash(self, node: RepoNode) -> str:
+        """The hash of a file or symlink, computed by its lazy getter if any."""
+        return node.hash
+
+    def cached_tree_hash(self, node: RepoNode) -> "str|None":
+        """Returns a tree hash already known for the directory, if any."""
+        return None
+
+    def cache_tree_hash(self, node: RepoNode, h: str) -> None:
+        """Remembers the tree hash computed for the directory."""
+        pass
+
 
 from binascii import unhexlify
-from hashlib import sha1
+from hashlib import new
 from logging import info
+from stat import S_IFMT, S_IMODE, S_IXUSR
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..stats import Stats
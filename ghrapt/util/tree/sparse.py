@@ -0,0 +1,75 @@
+from fnmatch import fnmatchcase
+
+from .ignore import GitIgnore
+
+# what select tells of a path
+DROP = 0  # not wanted; a directory is not listed at all
+KEEP = 1  # wanted; for a directory, every entry below is (excludes aside)
+DESCEND = 2  # a directory not wanted itself that may hold wanted entries
+
+
+class Sparse:
+    """
+    Selects paths of a tree by gitignore-style patterns, entry by entry as
+    the tree is listed, so that dropped directories are never listed.
+
+    Patterns are compiled with GitIgnore.parse_line and matched against
+    paths relative to the top ("src/a.py").
+
+    Args:
+        include: Patterns of the paths to keep (everything when empty); a
+            matching directory is kept whole.
+        exclude: Patterns of the paths to drop, as in .gitignore: the last
+            matching one wins, "!" re-includes, and nothing is re-included
+            under a dropped directory.
+    """
+
+    def __init__(self, include=(), exclude=()) -> None:
+        g = GitIgnore()
+        self.include = [g.parse_line(x) for x in include if _is_rule(x)]
+        self.exclude = [g.parse_line(x) for x in exclude if _is_rule(x)]
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude)
+
+    def select(self, path: str, is_dir: bool, inside=False) -> int:
+        """
+        DROP, KEEP or DESCEND (directories only) for path; inside tells if
+        its directory was kept whole already.
+        """
+        excluded = False
+        for neg, rx, dir_only, _ in self.exclude:
+            if (is_dir or not dir_only) and rx.search(path):
+                excluded = not neg
+        if excluded:
+            return DROP
+        if inside or not self.include:
+            return KEEP
+        for neg, rx, dir_only, _ in self.include:
+            if (is_dir or not dir_only) and rx.search(path):
+                return DROP if neg else KEEP
+        if is_dir and any(_may_hold(rule[3], path) for rule in self.include):
+            return DESCEND
+        return DROP
+
+    def top(self) -> int:
+        """What select says of the top directory."""
+        return DESCEND if self.include else KEEP
+
+
+def _is_rule(line: str) -> bool:
+    line = line.strip()
+    return bool(line) and not line.startswith("#")
+
+
+def _may_hold(pattern: str, path: str) -> bool:
+    """Tells if the directory path may hold entries the pattern matches."""
+    if not pattern.startswith("/"):
+        return True  # matches at any depth
+    segs = pattern[1:].split("/")
+    for i, name in enumerate(path.split("/")):
+        if i < len(segs) and segs[i] == "**":
+            return True
+        if i >= len(segs) - 1 or not fnmatchcase(name, segs[i]):
+            return False
+    return True
@@ -0,0 +1,114 @@
+from operator import attrgetter, ge, le, lt
+from stat import S_IFBLK, S_IFCHR, S_IFIFO, S_IFLNK, S_IFMT, S_IFREG, S_IFSOCK
+
+# find -type letters
+TYPES = {
+    "f": S_IFREG,
+    "l": S_IFLNK,
+    "p": S_IFIFO,
+    "s": S_IFSOCK,
+    "b": S_IFBLK,
+    "c": S_IFCHR,
+}
+
+
+def _kind(st) -> int:
+    return S_IFMT(st.st_mode)
+
+
+def _is_in(kind: int, kinds: frozenset) -> bool:
+    return kind in kinds
+
+
+class StatFilter:
+    """
+    Keeps the entries that pass size, mtime, type and extension tests.
+
+    Directories always pass. The extension test runs on the name from the
+    directory scan, before any stat; the others run on the lstat the scan
+    makes anyway (the target's stat for followed symlinks). Each set of
+    tests makes one predicate, by_name and by_stat, which are None when
+    there is nothing to test.
+
+    Args:
+        min_size: Keep files of at least this size.
+        max_size: Keep files of at most this size.
+        newer: Keep entries modified at or after this time (epoch seconds).
+        older: Keep entries modified before this time.
+        types: Keep these types, as find -type letters ("f", "l", ...).
+        extensions: Keep names with one of these extensions ("py", ".md").
+    """
+
+    def __init__(
+        self,
+        min_size: "float|None" = None,
+        max_size: "float|None" = None,
+        newer: "float|None" = None,
+        older: "float|None" = None,
+        types: "str|None" = None,
+        extensions=None,
+    ) -> None:
+        terms = []
+        tests = []
+
+        def add(term: str, get, op, bound) -> None:
+            terms.append(term)
+            tests.append(lambda st: op(get(st), bound))
+
+        if min_size is not None:
+            add(f"size >= {min_size!r}", attrgetter("st_size"), ge, min_size)
+        if max_size is not None:
+            add(f"size <= {max_size!r}", attrgetter("st_size"), le, max_size)
+        if newer is not None:
+            newer = float(newer)
+            add(f"mtime >= {newer!r}", attrgetter("st_mtime"), ge, newer)
+        if older is not None:
+            older = float(older)
+            add(f"mtime < {older!r}", attrgetter("st_mtime"), lt, older)
+        if types:
+            try:
+                kinds = frozenset(TYPES[x] for x in types if x != ",")
+            except KeyError as e:
+                raise ValueError(f"Unknown file type {e.args[0]!r}") from None
+            add(f"type in {types!r}", _kind, _is_in, kinds)
+        self.by_stat = None
+        if tests:
+
+            def by_stat(st) -> bool:
+                if S_IFMT(st.st_mode) == 0x4000:
+                    return True
+                for test in tests:
+                    if not test(st):
+                        return False
+                return True
+
+            self.by_stat = by_stat
+        self.by_name = None
+        if extensions:
+            exts = frozenset(x.lstrip(".").lower() for x in extensions)
+
+            def by_name(name: str) -> bool:
+                i = name.rfind(".")
+                return i > 0 and name[i + 1 :].lower() in exts
+
+            self.by_name = by_name
+        self.terms = terms
+        self.extensions = extensions
+
+    def __bool__(self) -> bool:
+        return bool(self.by_stat or self.by_name)
+
+    def __call__(self, name: str, st) -> bool:
+        """Tells if an entry passes, given its name and stat data."""
+        if S_IFMT(st.st_mode) == 0x4000:
+            return True
+        by_name = self.by_name
+        if by_name and not by_name(name):
+            return False
+        by_stat = self.by_stat
+        return not by_stat or by_stat(st)
+
+    def __repr__(self) -> str:
+        terms = list(self.terms)
+        self.extensions and terms.append(f"ext in {sorted(self.extensions)}")
+        return "%s(%s)" % (self.__class__.__name__, " and ".join(terms))
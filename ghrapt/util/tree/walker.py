@@ -0,0 +1,278 @@
+from collections import deque
+from os import PathLike
+from pathlib import Path
+from stat import S_IFREG
+from typing import TYPE_CHECKING
+
+from .digest import OBJECT_FORMATS, check_digest
+from .git_index import GitIndex, find_git_dir
+from .hash_cache import HashCache
+from .ignore import GitIgnoreCache, collect_ignore
+from .local_node import LocalAux, LocalNode, cached_hash_reg, get_hash_reg
+
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+    from ..stats import Stats
+    from .ignore import FilterBase
+    from .lfs import Lfs
+    from .stat_filter import StatFilter
+
+
+class Walker:
+    """
+    Builds and hashes local trees with one configuration, call after call.
+
+    What is safe to keep survives between calls: parsed .gitignore files
+    (checked by size and mtime), blob hashes (hash_cache, in memory unless
+    one with a file is given), hardlinked inode hashes and the thread pool.
+    Directory tree hashes are not kept: a directory's stat data does not
+    change when a file in it is rewritten.
+
+    Args:
+        gitignore: Honour .gitignore files, of the ancestors of the walked
+            directory too, and skip .git directories.
+        links: "keep" symlinks to files as links, or "follow" them.
+        dir_links: The same for symlinks to directories.
+        keep: Size, mtime, type and extension tests of the entries.
+        workers: Hash files with this many threads (0: in the caller).
+        hash_cache: Blob hashes by path, see HashCache.
+        fingerprint_size: Check files of this size or more by fingerprint
+            when only their mtime changed (0: never).
+        stats: Counters and timers to record into.
+        git_index: Take the hashes of unchanged files and directories from
+            the index of the git work tree being walked, see GitIndex.
+        list_workers: List the directories of each tree with this many
+            threads as soon as it is made, see list_tree (0: as walked).
+        readahead: Hash the files of hash_files in inode order, asking the
+            kernel to read this many bytes ahead (see iter_readahead), and
+            drop each file from the page cache once hashed, so that a large
+            tree does not evict what the host caches (0: neither).
+        lfs: Hash the files it selects as Git LFS pointers, see Lfs; the
+            git index is not used then, its hashes being of the content.
+        object_format: The hash of git objects, "sha1" or "sha256"; the git
+            index is used with sha1 only.
+        digests: More digests of each file hashed, computed in the same
+            read (node.digests), see Digests.
+        file_mode: Hash user-executable files as 100755 in the trees, as git
+            does, rather than all as 100644.
+    """
+
+    def __init__(
+        self,
+        gitignore=True,
+        links="keep",
+        dir_links="keep",
+        keep: "StatFilter|None" = None,
+        workers=0,
+        hash_cache: "HashCache|None" = None,
+        fingerprint_size=0,
+        stats: "Stats|None" = None,
+        git_index=True,
+        list_workers=0,
+        readahead=0,
+        lfs: "Lfs|None" = None,
+        object_format="sha1",
+        digests=(),
+        file_mode=False,
+    ) -> None:
+        if object_format not in OBJECT_FORMATS:
+            raise ValueError(f"Unknown object format {object_format!r}")
+        for name in digests:
+            check_digest(name)
+        self.gitignore = gitignore
+        self.links = links
+        self.dir_links = dir_links
+        self.keep = keep or None
+        self.workers = workers
+        self.hash_cache = HashCache() if hash_cache is None else hash_cache
+        self.fingerprint_size = fingerprint_size
+        self.stats = stats
+        self.gitignores = GitIgnoreCache()
+        self.inode_hashes: "dict[tuple[int, int], tuple[int, int, str]]" = {}
+        self.git_index = git_index
+        self.list_workers = list_workers
+        self.readahead = readahead
+        self.lfs = lfs
+        self.object_format = object_format
+        self.digests = tuple(digests)
+        self.file_mode = file_mode
+        self._pool: "ThreadPoolExecutor|None" = None
+        # git directory -> (index size, mtime_ns, GitIndex)
+        self._indexes: "dict[Path, tuple[int, int, GitIndex]]" = {}
+
+    def new_aux(self) -> LocalAux:
+        """A LocalAux for one walk, sharing the caches of the walker."""
+        aux = LocalAux()
+        aux.symlink_strategy(self.links, self.dir_links)
+        aux.hash_cache = self.hash_cache
+        aux.fingerprint_size = self.fingerprint_size
+        aux.inode_hashes = self.inode_hashes
+        aux.stats = self.stats
+        aux.stat_filter = self.keep
+        aux.drop_cache = bool(self.readahead)
+        aux.lfs = self.lfs
+        aux.object_format = self.object_format
+        aux.digests = self.digests
+        aux.file_mode = self.file_mode
+        if self.gitignore:
+            aux.read_gitignore = self.gitignores
+        else:
+            aux.filter_dir = _no_filter
+        return aux
+
+    def tree(self, path: "str|PathLike") -> LocalNode:
+        """
+        The root node of path; it is hashed lazily, and listed lazily too
+        unless there are list_workers.
+        """
+        if self.lfs is not None:
+            self.lfs.reset()  # its records are those of this tree
+        root = self.new_aux().node_from(Path(path).absolute(), "ROOT")
+        if root.is_dir():
+            self._prepare(root)
+            if self.git_index and self.lfs is None and self.object_format == "sha1":
+                root.aux.git_index = self._find_index(root._path)
+            if self.list_workers:
+                self.list_dirs(root)
+        return root
+
+    def list_dirs(self, root: LocalNode) -> int:
+        """Lists the directories under root with list_workers threads."""
+        from .lister import list_tree
+
+        stats = self.stats
+        if stats:
+            t = stats.clock()
+        n = list_tree(root, self.list_workers)
+        stats and stats.lap("list", t)
+        return n
+
+    def _find_index(self, path: Path) -> "GitIndex|None":
+        # the index is parsed again only when it changed
+        v = find_git_dir(path)
+        if v is None:
+            return None
+        try:
+            st = (v[1] / "index").stat()
+        except OSError:
+            return None
+        w = self._indexes.get(v[1])
+        if w and w[0] == st.st_size and w[1] == st.st_mtime_ns:
+            index = w[2]
+            index.verified.clear()  # node keys of the previous walks
+            return index
+        try:
+            index = GitIndex(*v)
+        except (OSError, ValueError):
+            return None
+        self._indexes[v[1]] = (st.st_size, st.st_mtime_ns, index)
+        return index
+
+    def _prepare(self, root: LocalNode) -> None:
+        # the .gitignore files above the root apply to the whole tree
+        if not self.gitignore:
+            return
+        v = collect_ignore(root._path, self.gitignores)
+        if v:
+            root.aux.filter_dir(root)
+            own = getattr(root, "_ignore", None) or (None, None)
+            root._ignore = (_chain(v[0], own[0]), _chain(v[1], own[1]))
+
+    def hash_files(self, root: LocalNode) -> int:
+        """
+        Hashes the regular files under root in the thread pool, if any,
+        and in inode order with readahead. Those whose hash is known
+        without reading them (git index, hash cache, hardlinks) are set
+        first, and neither prefetched nor counted.
+
+        Returns:
+            The number of files read that way (0 without workers and
+            readahead).
+        """
+        if not ((self.workers or self.readahead) and root.is_dir()):
+            return 0
+        files = []
+        links = []  # more links to an inode in files: hashed after it
+        inodes = set()
+        for x in root.iter_preorder():
+            if x.type == S_IFREG and x.peek("hash") is None:
+                # only the files to read go to the pool and the readahead
+                h = cached_hash_reg(x)
+                if h:
+                    x.hash = h
+                    continue
+                st = x.st
+                if st.st_nlink > 1:
+                    key = (st.st_dev, st.st_ino)
+                    if key in inodes:
+                        links.append(x)
+                        continue
+                    inodes.add(key)
+                files.append(x)
+        todo = files
+        if self.readahead:
+            from .readahead import inode_order, iter_readahead
+
+            files.sort(key=inode_order)
+            todo = iter_readahead(files, self.readahead, self.stats)
+        if not self.workers:
+            results = map(get_hash_reg, todo)
+        elif self.readahead:
+            # no further ahead than the window: pool.map would submit all
+            results = _map_ahead(self.pool, get_hash_reg, todo, 4 * self.workers)
+        else:
+            results = self.pool.map(get_hash_reg, todo)
+        for x, h in zip(files, results):
+            x.hash = h
+        for x in links:
+            x.hash = get_hash_reg(x)
+        return len(files)
+
+    def hash(self, path: "str|PathLike") -> str:
+        """The git hash of path (a tree hash for a directory)."""
+        root = self.tree(path)
+        self.hash_files(root)
+        return root.get_hash()
+
+    @property
+    def pool(self) -> "ThreadPoolExecutor":
+        pool = self._pool
+        if pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            pool = self._pool = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="ghrapt-hash"
+            )
+        return pool
+
+    def close(self) -> None:
+        pool, self._pool = self._pool, None
+        pool and pool.shutdown()
+
+    def __enter__(self) -> "Walker":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _map_ahead(pool: "ThreadPoolExecutor", fn, items, depth: int):
+    # pool.map, with at most depth calls submitted and not collected
+    pending = deque()
+    for x in items:
+        pending.append(pool.submit(fn, x))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _no_filter(node: LocalNode):
+    return None
+
+
+def _chain(first: "FilterBase|None", then: "FilterBase|None"):
+    """Links two filter chains, either of which may be None."""
+    if first and then:
+        first.append(then)
+    return first or then
@@ -0,0 +1,408 @@
+import os
+from logging import info, warning
+from select import select
+from stat import S_IFMT
+from struct import unpack_from
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from threading import Event
+    from .local_node import LocalNode
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_DONT_FOLLOW = 0x2000000
+IN_EXCL_UNLINK = 0x4000000
+
+# attributes derived from stat data or content, dropped when a file changes
+STAT_ATTRS = ("st", "mode", "type", "perm", "size", "mtime", "hash")
+
+
+def _listed(node: "LocalNode"):
+    # do not list directories that were never listed (they may be gone)
+    return node.is_dir() and node.peek("first_child") is not None
+
+
+class Inotify:
+    """Directory watches through the Linux inotify calls."""
+
+    MASK = (
+        IN_MODIFY
+        | IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_ONLYDIR
+        | IN_DONT_FOLLOW
+        | IN_EXCL_UNLINK
+    )
+
+    def __init__(self) -> None:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self._errno = ctypes.get_errno
+        self.libc = libc
+        self.fd = fd
+        self.nodes: "dict[int, LocalNode]" = {}
+        self.wds: "dict[LocalNode, int]" = {}
+
+    def watch(self, node: "LocalNode") -> None:
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(node._path), self.MASK
+        )
+        if wd < 0:
+            e = self._errno()
+            raise OSError(e, os.strerror(e), str(node._path))
+        self.nodes[wd] = node
+        self.wds[node] = wd
+
+    def unwatch(self, node: "LocalNode") -> None:
+        wd = self.wds.pop(node, None)
+        if wd is not None:
+            self.nodes.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: float):
+        """
+        Waits up to timeout seconds for events.
+
+        Returns:
+            A list of (directory node, name) pairs; (None, None) when the
+            kernel queue overflowed and everything must be rescanned.
+        """
+        if not select((self.fd,), (), (), timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return []
+        events = []
+        i, n = 0, len(data)
+        while i < n:
+            wd, mask, _, size = unpack_from("iIII", data, i)
+            i += 16
+            name = data[i : i + size].rstrip(b"\0")
+            i += size
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, None))
+            elif mask & IN_IGNORED:
+                node = self.nodes.pop(wd, None)
+                node is None or self.wds.pop(node, None)
+            elif name:
+                node = self.nodes.get(wd)
+                if node is not None:
+                    events.append((node, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Poller:
+    """Fallback that compares stat data of the watched tree every interval."""
+
+    def __init__(self, interval=2.0) -> None:
+        self.interval = interval
+        self.dirs: "dict[LocalNode, int]" = {}
+        self.due = monotonic() + interval
+
+    def watch(self, node: "LocalNode") -> None:
+        self.dirs[node] = os.stat(node._path).st_mtime_ns
+        for x in node:
+            x.is_dir() or (x.size, x.mtime)
+
+    def unwatch(self, node: "LocalNode") -> None:
+        self.dirs.pop(node, None)
+
+    def read(self, timeout: float):
+        wait = self.due - monotonic()
+        if wait > timeout:
+            sleep(timeout)
+            return []
+        wait > 0 and sleep(wait)
+        self.due = monotonic() + self.interval
+        events = []
+        for node, mtime in tuple(self.dirs.items()):
+            try:
+                cur = os.stat(node._path).st_mtime_ns
+            except OSError:
+                continue  # the parent reports it
+            if cur != mtime:
+                self.dirs[node] = cur
+                events.append((node, None))
+                continue
+            for x in node:
+                if not x.is_dir():
+                    try:
+                        st = os.lstat(x._path)
+                    except OSError:
+                        events.append((node, x.name))
+                        continue
+                    if st.st_size != x.size or st.st_mtime != x.mtime:
+                        events.append((node, x.name))
+        return events
+
+    def close(self) -> None:
+        pass
+
+
+class Watcher:
+    """
+    Keeps a LocalNode tree up to date from filesystem events.
+
+    Events are debounced, then only the named entries are re-read; changed
+    nodes drop their cached stat data and hash, and the hashes of their
+    ancestors are forgotten so the next root hash query only rehashes what
+    changed. Queries may come from other threads (see serve).
+
+    The last generation each path changed in is kept for changed_since;
+    past max_changes paths the older half is dropped, and generations
+    before the ones kept can no longer be answered.
+    """
+
+    def __init__(
+        self, root: "LocalNode", source=None, debounce=0.2, max_changes=100000
+    ) -> None:
+        self.root = root
+        self.debounce = debounce
+        self.lock = Lock()
+        self.generation = 0
+        self.changes: "dict[str, int]" = {}
+        self.max_changes = max_changes
+        # the oldest generation changed_since answers for
+        self.oldest = 0
+        self.root_hash: "str|None" = None
+        if source is None:
+            try:
+                source = Inotify()
+            except (OSError, AttributeError) as e:
+                warning("inotify unavailable (%s), polling", e)
+                source = Poller()
+        self.source = source
+        try:
+            self._watch_tree(root)
+        except OSError as e:
+            if isinstance(source, Poller):
+                raise
+            warning("inotify watch failed (%s), polling", e)
+            source.close()
+            self.source = Poller()
+            self._watch_tree(root)
+
+    def _watch_tree(self, node: "LocalNode") -> None:
+        watch = self.source.watch
+        if node.is_dir():
+            watch(node)
+            for x in node.iter_preorder(lambda n: not n.is_dir()):
+                x.is_dir() and watch(x)
+
+    def _unwatch_tree(self, node: "LocalNode") -> None:
+        unwatch = self.source.unwatch
+        if node.is_dir():
+            unwatch(node)
+            for x in node.iter_preorder(lambda n: not _listed(n)):
+                x.is_dir() and unwatch(x)
+
+    def run(self, stop: "Event|None" = None, on_change=None) -> None:
+        """Applies events until stop is set; on_change(self) follows each batch."""
+        while not (stop and stop.is_set()):
+            if self.run_once(1.0) and on_change:
+                on_change(self)
+
+    def run_once(self, timeout: float) -> int:
+        """Waits for a burst of events, applies it and returns the change count."""
+        read = self.source.read
+        events = read(timeout)
+        if not events:
+            return 0
+        end = monotonic() + self.debounce * 10
+        while monotonic() < end:
+            more = read(self.debounce)
+            if not more:
+                break
+            events.extend(more)
+        with self.lock:
+            return self.apply(events)
+
+    def apply(self, events) -> int:
+        pending: "dict[LocalNode, set[str]|None]" = {}
+        for node, name in events:
+            if node is None:
+                pending = {self.root: None}
+                for x in self.root.iter_preorder(lambda n: not _listed(n)):
+                    x.is_dir() and pending.setdefault(x, None)
+                break
+            if name is None:
+                pending[node] = None
+            else:
+                names = pending.setdefault(node, set())
+                names is None or names.add(name)
+        root = self.root
+        changed = []
+        for node, names in pending.items():
+            if node.root is root:
+                changed.extend(self._refresh(node, names))
+        if changed:
+            self.generation += 1
+            gen = self.generation
+            changes = self.changes
+            for path in changed:
+                changes.pop(path, None)  # keeps the dict in generation order
+                changes[path] = gen
+            len(changes) > self.max_changes and self._prune()
+            self.root_hash = None
+            info("WATCH %d changes", len(changed))
+        return len(changed)
+
+    def _prune(self) -> None:
+        changes = self.changes
+        gens = list(changes.values())
+        cutoff = gens[len(gens) - self.max_changes // 2 - 1]
+        for path, gen in tuple(changes.items()):
+            if gen > cutoff:
+                break
+            del changes[path]
+        self.oldest = cutoff
+
+    def _refresh(self, parent: "LocalNode", names: "set[str]|None"):
+        kids = {x.name: x for x in parent}
+        if names is None:
+            try:
+                names = set(os.listdir(parent._path))
+            except OSError:
+                return ()
+            names.update(kids)
+        top = len(self.root.get_path())
+        ignore = parent.aux.filter_dir(parent)
+        changed = []
+        for name in names:
+            old = kids.get(name)
+            path = parent._path / name
+            try:
+                st = os.lstat(path if old is None else old._path)
+            except OSError:
+                st = None
+            if old is not None:
+                if st is not None and S_IFMT(st.st_mode) == old.type:
+                    if old.is_dir():
+                        continue  # entries are reported by its own watch
+                    if st.st_size == old.peek("size") and (
+                        st.st_mtime == old.peek("mtime")
+                    ):
+                        continue
+                    old.forget(*STAT_ATTRS)
+                    changed.append(old.get_path()[top:])
+                    old.aux.keeps(old) or parent.remove_child(old)
+                    continue
+                changed.append(old.get_path()[top:])
+                self._unwatch_tree(old)
+                parent.remove_child(old)
+                if st is None and old._path == path:
+                    continue
+                try:
+                    st = os.lstat(path)
+                except OSError:
+                    continue
+            elif st is None:
+                continue
+            new = parent.aux.node_from(path, name, parent, st)
+            if not new.aux.keeps(new) or (ignore and ignore(new)):
+                continue
+            new.parent = None
+            parent.append_child(new)
+            self._watch_tree(new)
+            if new.is_dir():
+                # a moved directory keeps its inode: drop what was cached for it
+                new.aux.forget_tree_hashes(
+                    (new, *new.iter_preorder(lambda n: not n.is_dir()))
+                )
+            changed.append(new.get_path()[top:])
+        changed and parent.invalidate_hash()
+        return changed
+
+    def hash(self) -> str:
+        """The current root hash, recomputed on demand after changes."""
+        h = self.root_hash
+        if h is None:
+            with self.lock:
+                h = self.root_hash
+                if h is None:
+                    h = self.root_hash = self.root.get_hash()
+        return h
+
+    def changed_since(self, generation=0):
+        """
+        Returns the current generation and the paths changed after the given
+        one; None for the paths when that generation is older than the
+        changes kept.
+        """
+        with self.lock:
+            gen = self.generation
+            if generation < self.oldest:
+                return gen, None
+            paths = sorted(k for k, v in self.changes.items() if v > generation)
+        return gen, paths
+
+    def query(self, command="hash", *args: str) -> str:
+        if command == "hash":
+            return self.hash() + "\n"
+        elif command == "gen":
+            return f"{self.generation}\n"
+        elif command == "changed":
+            try:
+                since = int(args[0]) if args else 0
+            except ValueError:
+                return f"error bad generation {args[0]!r}\n"
+            gen, paths = self.changed_since(since)
+            if paths is None:
+                return f"error generation {since} expired\n"
+            return "".join((f"{gen}\n", *(p + "\n" for p in paths)))
+        return f"error unknown command {command!r}\n"
+
+    def serve(self, path: str):
+        """
+        Answers queries on a unix socket, one per connection, from a thread.
+
+        A request is a line: ``hash``, ``gen`` or ``changed [GENERATION]``;
+        ``changed`` answers the current generation then one path per line.
+        Requests that cannot be answered get an ``error ...`` line.
+        """
+        from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+
+        query = self.query
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline().decode("utf-8", "surrogateescape")
+                try:
+                    out = query(*line.split())
+                except Exception as e:  # e.g. the root is gone: still answer
+                    out = f"error {e}\n"
+                self.wfile.write(out.encode("utf-8", "surrogateescape"))
+
+        if os.path.exists(path):
+            os.unlink(path)
+        server = ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self) -> None:
+        self.source.close()
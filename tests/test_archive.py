@@ -0,0 +1,86 @@
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from ghrapt.util.tree.archive import archive_tree
+from ghrapt.util.tree.walker import Walker
+
+
+def make_tree(top: Path):
+    (top / "a" / "b").mkdir(parents=True)
+    (top / "empty").mkdir()
+    (top / "a" / "b" / "x.txt").write_text("x" * 100000)
+    (top / "a" / "run.sh").write_text("#!/bin/sh\n")
+    (top / "a" / "run.sh").chmod(0o755)
+    (top / "README").write_text("read me\n")
+    (top / "link").symlink_to("a/run.sh")
+    os.link(top / "README", top / "a" / "hard")  # a tar link member
+    return Walker(gitignore=False).hash(top)
+
+
+def test_tar(tmp_path: Path):
+    top = tmp_path / "proj-1.0"
+    want = make_tree(top)
+    for mode, name in (("w", "p.tar"), ("w:gz", "p.tar.gz"), ("w:xz", "p.tar.xz")):
+        with tarfile.open(tmp_path / name, mode) as tar:
+            tar.add(top, "proj-1.0")
+        assert archive_tree(str(tmp_path / name)).get_hash() == want
+    assert archive_tree(str(tmp_path / "p.tar"), strip=0).get_sub_dir("proj-1.0")
+
+
+def test_tar_bad_members(tmp_path: Path):
+    import io
+
+    def tar_of(*members):
+        out = io.BytesIO()
+        with tarfile.open(fileobj=out, mode="w") as tar:
+            for info in members:
+                tar.addfile(info, io.BytesIO(b"x" * info.size))
+        path = tmp_path / "t.tar"
+        path.write_bytes(out.getvalue())
+        return str(path)
+
+    def member(name, **kw):
+        info = tarfile.TarInfo(name)
+        for k, v in kw.items():
+            setattr(info, k, v)
+        return info
+
+    ok = member("./", type=tarfile.DIRTYPE), member("./a", size=1)
+    assert archive_tree(tar_of(*ok), strip=0).get_hash()
+    for bad in ("../a", "/etc/a", "d/../../a"):
+        with pytest.raises(ValueError, match="Unsafe path"):
+            archive_tree(tar_of(member(bad, size=1)), strip=0)
+    hard = member("h", type=tarfile.LNKTYPE, linkname="missing")
+    with pytest.raises(ValueError, match="hard link"):
+        archive_tree(tar_of(member("a", size=1), hard), strip=0)
+
+
+def test_zip(tmp_path: Path):
+    top = tmp_path / "proj"
+    want = make_tree(top)
+    with zipfile.ZipFile(tmp_path / "p.zip", "w", zipfile.ZIP_DEFLATED) as z:
+        for dirpath, dirs, files in os.walk(top):
+            for name in files + [d for d in dirs if os.path.islink(f"{dirpath}/{d}")]:
+                p = Path(dirpath) / name
+                arc = str(p.relative_to(tmp_path))
+                if p.is_symlink():
+                    info = zipfile.ZipInfo(arc)
+                    info.external_attr = (0o120777) << 16
+                    z.writestr(info, os.readlink(p))
+                else:
+                    z.write(p, arc)
+    assert archive_tree(str(tmp_path / "p.zip")).get_hash() == want
+
+
+def test_zst(tmp_path: Path):
+    zstandard = pytest.importorskip("zstandard")
+    want = make_tree(tmp_path / "proj")
+    with open(tmp_path / "p.tar.zst", "wb") as f:
+        with zstandard.ZstdCompressor().stream_writer(f) as z:
+            with tarfile.open(fileobj=z, mode="w|") as tar:
+                tar.add(tmp_path / "proj", "proj")
+    assert archive_tree(str(tmp_path / "p.tar.zst")).get_hash() == want
@@ -0,0 +1,142 @@
+import io
+import tarfile
+import threading
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from ghrapt.util.tree.repo_node import build_tree
+
+FILES = {
+    "README": b"read me\n",
+    "src/a.py": b"print('a')\n" * 50,
+    "src/b.py": b"b\n",
+    "src/subst.txt": b"$Format:%H$\n",  # export-subst: differs in the archive
+    "late.txt": b"added after the archive\n",  # not in the archive
+}
+
+
+def blob(data: bytes) -> str:
+    return sha1(b"blob %d\0%s" % (len(data), data)).hexdigest()
+
+
+def fixture_tarball() -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tar:
+        for path, data in FILES.items():
+            if path == "late.txt":
+                continue
+            if path == "src/subst.txt":
+                data = b"0123456789abcdef\n"
+            info = tarfile.TarInfo(f"o-r-0123456/{path}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo("o-r-0123456/link")
+        info.type = tarfile.SYMTYPE
+        info.linkname = "README"
+        tar.addfile(info)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def server():
+    tarball = fixture_tarball()
+    blobs = {blob(v): v for v in FILES.values()}
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if self.path == "/repos/o/r/tarball/main":
+                body = tarball
+            elif self.path.startswith("/repos/o/r/git/blobs/"):
+                body = blobs.get(self.path.rpartition("/")[2])
+            else:
+                body = None
+            if body is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    t = threading.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", hits
+    httpd.shutdown()
+
+
+def test_bulk_download(tmp_path: Path, server):
+    requests = pytest.importorskip("requests")
+    from ghrapt.helper.bulk import BulkDownload
+    from ghrapt.helper.httphelp import HttpHelp
+
+    class Client(HttpHelp):
+        owner = "o"
+        repo = "r"
+        token = None
+
+    client = Client()
+    client.api_url, hits = server
+    client.http = requests.session()
+    records = [(p, "100644", blob(v), len(v)) for p, v in FILES.items()]
+    records.append(("link", "120000", blob(b"README"), 6))
+    want = build_tree(records)
+
+    (tmp_path / "README").write_bytes(FILES["README"])  # already there
+    counts = BulkDownload(client, tmp_path, workers=2).run(want, "main")
+    assert counts == {"skipped": 1, "archive": 3, "blob": 2}
+    for path, data in FILES.items():
+        assert (tmp_path / path).read_bytes() == data
+    assert (tmp_path / "link").readlink() == Path("README")
+    assert len(hits) == 3
+
+    # all there: no request at all
+    hits.clear()
+    counts = BulkDownload(client, tmp_path).run(want, "main")
+    assert counts == {"skipped": 6, "archive": 0, "blob": 0}
+    assert hits == []
+
+
+def test_write_stays_in_dest(tmp_path: Path):
+    from ghrapt.helper.bulk import BulkDownload
+
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    (dest / "lib").symlink_to(outside)  # the tree has a directory there
+    (dest / "f").mkdir()  # and a file there
+    (dest / "f" / "old").write_text("old")
+    (outside / "x").write_bytes(b"x\n")  # would match through the symlink
+    files = {"lib/x": b"x\n", "f": b"f\n", "big": b"b" * 100}
+    want = build_tree((p, "100644", blob(v), len(v)) for p, v in files.items())
+
+    bulk = BulkDownload(None, dest, max_pending=64)
+    todo = bulk.missing(want)
+    assert sorted(todo) == ["big", "f", "lib/x"]
+    for path in ("lib/x", "f"):
+        bulk.write(path, todo[path], files[path])
+    assert [p.name for p in outside.iterdir()] == ["x"]
+    assert not (dest / "lib").is_symlink()
+    assert (dest / "lib" / "x").read_bytes() == b"x\n"
+    assert (dest / "f").read_bytes() == b"f\n"
+
+    # a stream that fails half way leaves no temporary file behind
+    class Broken(io.BytesIO):
+        def read(self, n=-1):
+            if self.tell():
+                raise OSError("connection reset")
+            return super().read(50)
+
+    with pytest.raises(OSError):
+        bulk._take_stream("big", todo["big"], Broken(files["big"]), 100)
+    assert sorted(p.name for p in dest.iterdir()) == ["f", "lib"]
+    assert sorted(bulk.missing(want)) == ["big"]
@@ -0,0 +1,126 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from ghrapt.util.tree.diff import diff_trees
+from ghrapt.util.tree.git_objects import ObjectStore, git_tree
+from ghrapt.util.tree.walker import Walker
+
+
+def git(cwd: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+def test_packed_and_loose(tmp_path: Path):
+    git(tmp_path, "init", "-q")
+    text = "".join(f"line {i}\n" for i in range(2000))
+    for i in range(6):
+        d = tmp_path / "src" / f"d{i % 2}"
+        d.mkdir(parents=True, exist_ok=True)
+        # similar contents across commits: deltas in the pack
+        (d / "big.txt").write_text(text.replace(f"line {i * 7}\n", "changed\n"))
+        (d / f"f{i}").write_text(str(i))
+        git(tmp_path, "add", "-A")
+        git(tmp_path, "commit", "-q", "-m", str(i))
+    git(tmp_path, "tag", "-a", "v1", "-m", "v1")
+    git(tmp_path, "gc", "-q", "--aggressive")
+    (tmp_path / "loose").write_text("loose")
+    git(tmp_path, "add", "loose")
+    git(tmp_path, "commit", "-q", "-m", "loose")
+
+    root = git_tree(tmp_path)
+    assert root.hash == git(tmp_path, "rev-parse", "HEAD^{tree}")
+    listing = git(tmp_path, "ls-tree", "-r", "-t", "-l", "HEAD")
+    found = []
+    for x in root.iter_preorder():
+        mode = "%06o" % x.mode if not x.is_dir() else "040000"
+        kind = "tree" if x.is_dir() else "blob"
+        size = "-" if x.is_dir() else x.size
+        path = x.get_path()[len(root.get_path()) :]
+        found.append(f"{mode} {kind} {x.hash} {size:>7}\t{path}")
+    assert sorted(found) == sorted(listing.splitlines())
+
+    store = root.aux.store
+    for x in root.iter_preorder():
+        if not x.is_dir():
+            data = root.aux.read(x)
+            assert data.decode() == git(tmp_path, "cat-file", "blob", x.hash) + (
+                "\n" if data.endswith(b"\n") else ""
+            )
+    assert store.tree_id("v1") == git(tmp_path, "rev-parse", "v1^{tree}")
+    assert store.tree_id("HEAD:src") == git(tmp_path, "rev-parse", "HEAD:src")
+    assert store.cache_bytes <= store.cache_size
+
+    # the work tree matches HEAD
+    local = Walker().tree(tmp_path)
+    assert list(diff_trees(local, root)) == []
+    (tmp_path / "src" / "d0" / "f0").write_text("x")
+    local = Walker().tree(tmp_path)
+    assert [x[:2] for x in diff_trees(local, root)] == [("M", "src/d0/f0")]
+
+
+def test_gitlink_and_packed_refs(tmp_path: Path):
+    git(tmp_path, "init", "-q", "-b", "master")
+    (tmp_path / "f").write_text("f")
+    git(tmp_path, "add", "f")
+    sub = "1234567890" * 4  # a submodule commit, not in this store
+    git(tmp_path, "update-index", "--add", "--cacheinfo", f"160000,{sub},sub")
+    git(tmp_path, "commit", "-q", "-m", "sub")
+    git(tmp_path, "pack-refs", "--all")
+    assert not (tmp_path / ".git" / "refs" / "heads" / "master").exists()
+
+    store = ObjectStore(tmp_path / ".git")
+    head = git(tmp_path, "rev-parse", "HEAD")
+    assert store.resolve("master") == head
+    root = git_tree(tmp_path)
+    assert {x.name: (x.hash, x.size) for x in root} == {
+        "f": (git(tmp_path, "rev-parse", "HEAD:f"), 1),
+        "sub": (sub, 0),
+    }
+
+
+def test_revisions(tmp_path: Path):
+    git(tmp_path, "init", "-q")
+    for i in range(3):
+        (tmp_path / "f").write_text(str(i))
+        git(tmp_path, "add", "f")
+        git(tmp_path, "commit", "-q", "-m", str(i))
+    git(tmp_path, "tag", "-a", "v1", "-m", "v1", "HEAD~1")
+    store = ObjectStore(tmp_path / ".git")
+    for rev in ("HEAD~0", "HEAD~2", "HEAD^", "HEAD^^", "v1^{}", "v1~1", "HEAD^{tree}"):
+        assert store.resolve(rev) == git(tmp_path, "rev-parse", rev), rev
+    head = git(tmp_path, "rev-parse", "HEAD")
+    assert store.resolve(head[:7]) == head
+    assert store.tree_id(head[:7]) == git(tmp_path, "rev-parse", "HEAD^{tree}")
+    assert store.tree_id("HEAD~1") == git(tmp_path, "rev-parse", "HEAD~1^{tree}")
+    for rev in ("HEAD~3", "HEAD^2", "nope", "0000000", "HEAD:nope"):
+        with pytest.raises(KeyError):
+            store.tree_id(rev)
+    with pytest.raises(ValueError):
+        store.tree_id("HEAD:f")
+
+
+def test_sha256(tmp_path: Path):
+    git(tmp_path, "init", "-q", "--object-format=sha256")
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "x").write_text("x" * 1000)
+    (tmp_path / "run").write_text("#!/bin/sh\n")
+    (tmp_path / "run").chmod(0o755)
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "1")
+    local = Walker(object_format="sha256", file_mode=True).tree(tmp_path)
+    for packed in (False, True):
+        if packed:
+            git(tmp_path, "gc", "-q")
+        root = git_tree(tmp_path)
+        assert root.hash == git(tmp_path, "rev-parse", "HEAD^{tree}")
+        assert root.aux.store.tree_id("HEAD:d") == git(tmp_path, "rev-parse", "HEAD:d")
+        assert list(diff_trees(local, root)) == []
+    assert local.get_hash() == root.hash
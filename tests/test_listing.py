@@ -0,0 +1,105 @@
+import shutil
+import subprocess
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from ghrapt.util.listing import (
+    LsTreeWriter,
+    NdjsonWriter,
+    quote_path,
+    unquote_path,
+)
+from ghrapt.util.tree.local_node import LocalAux
+
+
+def local_tree(path: Path):
+    aux = LocalAux()
+    aux.symlink_strategy("keep", "keep")
+    aux.file_mode = True
+    return aux.node_from(path, "ROOT")
+
+
+def make_files(top: Path):
+    (top / "a" / "b").mkdir(parents=True)
+    (top / "a" / "b" / "x").write_bytes(b"x")
+    (top / "a" / "y").write_bytes(b"")
+    (top / "a-b").write_bytes(b"dash")
+    (top / "run").write_bytes(b"#!/bin/sh\n")
+    (top / "run").chmod(0o755)
+    (top / "sp ace").write_bytes(b"s")
+    (top / "ü\n").write_bytes(b"u")
+    (top / "lnk").symlink_to("a/y")
+
+
+def test_quote_path():
+    assert quote_path("plain/name") == "plain/name"
+    assert quote_path('a"b\\c\td') == '"a\\"b\\\\c\\td"'
+    assert quote_path("ü") == '"\\303\\274"'
+    for path in ("plain", 'a"b\\c\td', "ü\n", "\x7f\x01", "bad\udcff"):
+        assert unquote_path(quote_path(path)) == path
+    # core.quotePath=false: quoted for the tab, the rest left as is
+    assert unquote_path('"a\\tb/日本.txt"') == "a\tb/日本.txt"
+
+
+@pytest.mark.skipif(not shutil.which("git"), reason="needs git")
+@pytest.mark.parametrize("zero", [False, True])
+def test_ls_tree_matches_git(tmp_path: Path, zero):
+    make_files(tmp_path)
+    run = dict(cwd=tmp_path, check=True, capture_output=True)
+    subprocess.run(["git", "init", "-q"], **run)
+    subprocess.run(["git", "add", "-A"], **run)
+    tree = subprocess.run(["git", "write-tree"], **run).stdout.strip()
+    cmd = ["git", "ls-tree", "-r", "-l"] + (["-z"] if zero else []) + [tree]
+    expected = subprocess.run(cmd, **run).stdout
+
+    out = BytesIO()
+    root = local_tree(tmp_path)
+    LsTreeWriter(out, "\0" if zero else "\n").write_tree(root)
+    assert out.getvalue() == expected
+    assert root.get_hash() == tree.decode()  # "run" hashed as 100755 too
+
+
+def test_ndjson(tmp_path: Path):
+    import json
+
+    make_files(tmp_path)
+    out = BytesIO()
+    root = local_tree(tmp_path)
+    NdjsonWriter(out).write_tree(root)
+    rows = [json.loads(x) for x in out.getvalue().splitlines()]
+    assert rows[-1]["path"] == "" and rows[-1]["hash"] == root.hash
+    assert {x["path"]: x["mode"] for x in rows}["run"] == "100755"
+    assert {x["path"]: x["size"] for x in rows}["a"] == root.get_sub_dir("a").size
+
+
+def test_quick_snapshot(tmp_path: Path):
+    import json
+    import os
+    from io import StringIO
+
+    from ghrapt.util.listing import load_listing
+    from ghrapt.util.tree.diff import diff_trees
+
+    make_files(tmp_path)
+    out = BytesIO()
+    root = local_tree(tmp_path)
+    NdjsonWriter(out, quick=True).write_tree(root)
+    assert root.peek("hash") is None  # nothing was read
+    # tree sizes are known with their hash only, not the directory's lstat
+    rows = [json.loads(x) for x in out.getvalue().splitlines()]
+    assert {x["path"]: x["size"] for x in rows}["a"] is None
+    assert {x["path"]: x["size"] for x in rows}["a/y"] == 0
+    want = load_listing(StringIO(out.getvalue().decode()))
+    assert list(diff_trees(local_tree(tmp_path), want, True)) == []
+
+    # same size, same mtime: quick mode takes it as unchanged
+    x = tmp_path / "a-b"
+    st = x.stat()
+    x.write_bytes(b"DASH")
+    os.utime(x, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert list(diff_trees(local_tree(tmp_path), want, True)) == []
+    os.utime(x, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    diff = list(diff_trees(local_tree(tmp_path), want, True))
+    assert [d[:2] for d in diff] == [("M", "a-b")]
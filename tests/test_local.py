@@ -1,20 +1,145 @@
+import os
 from pathlib import Path
 from ghrapt.util.tree.local_node import LocalAux
 
 
-def test_1():
+def test_1(tmp_path: Path):
+    (tmp_path / "command_line").mkdir()
+    (tmp_path / "command_line" / "index.rst").write_text("Command Line\n")
+    (tmp_path / "command_line" / "empty").write_text("")
     aux = LocalAux()
-    no = aux.node_from(
-        Path("/mnt/SHARE/dev/blender_manual_v430_en/advanced/command_line")
-    )
+    no = aux.node_from(tmp_path / "command_line")
     assert no.is_dir()
     assert not no.is_file()
     assert not no.is_symlink()
-    for x in no:
-        print(x.name, x.size, x.hash)
-    # print(no, hex(no.mode), hex(no.type), no.is_dir())
-    # assert add(2, 3) == 5
-    # assert add(-1, 1) == 0
-
-    # assert add(0, 0) == 0
-    # no.intern("PWES")
+    hashes = {x.name: (x.size, x.hash) for x in no}
+    assert hashes == {
+        "index.rst": (13, "c47572a21a513a368404101d2f779b4e70d29229"),
+        "empty": (0, "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"),
+    }
+
+
+def test_symlink_cycle_and_shared_dirs(tmp_path: Path):
+    (tmp_path / "real" / "sub").mkdir(parents=True)
+    (tmp_path / "real" / "sub" / "f").write_text("f")
+    (tmp_path / "real" / "sub" / "up").symlink_to("../..")
+    (tmp_path / "l1").symlink_to("real")
+    (tmp_path / "l2").symlink_to("real/")
+
+    aux = LocalAux()
+    aux.symlink_strategy("follow", "follow")
+    listed = []
+    items = aux.items
+
+    def counting(node):
+        listed.append(node._path)
+        return items(node)
+
+    aux.items = counting
+    no = aux.node_from(tmp_path, "ROOT")
+    h = no.hash
+    assert h
+    by_name = {x.name: x for x in no}
+    assert by_name["l1"].is_dir() and by_name["l2"].is_dir()
+    assert by_name["l1"].hash == by_name["real"].hash == by_name["l2"].hash
+    # the real directory is listed once, the links reuse its hash
+    assert listed.count(tmp_path / "real") == 1
+    # real/sub/up points back to the top: kept as a link, not followed
+    up = by_name["real"].get_sub(["sub", "up"])
+    assert up.is_symlink()
+
+
+def test_hardlinks_hashed_once(tmp_path: Path):
+    (tmp_path / "a").write_bytes(b"data" * 1000)
+    os.link(tmp_path / "a", tmp_path / "b")
+    os.link(tmp_path / "a", tmp_path / "c")
+    aux = LocalAux()
+    no = aux.node_from(tmp_path, "ROOT")
+    assert len({x.hash for x in no}) == 1
+    assert aux.hardlink_hits == 2
+    assert aux.hardlink_bytes == 8000
+
+
+def test_hash_cache_fingerprint(tmp_path: Path):
+    from ghrapt.util.tree.hash_cache import HashCache
+
+    f = tmp_path / "big"
+    f.write_bytes(bytes(range(256)) * 4096)  # 1M
+    os.utime(f, ns=(0, 10**9))  # not racily clean: cached
+    store = str(tmp_path / ".cache")
+
+    def hash_with_cache():
+        aux = LocalAux()
+        aux.hash_cache = HashCache(store)
+        aux.fingerprint_size = 1 << 19
+        h = aux.node_from(f, "big").hash
+        aux.hash_cache.save()
+        return h, aux.fingerprint_hits
+
+    h, hits = hash_with_cache()
+    assert (h, hits) == (LocalAux().node_from(f).hash, 0)
+    # only touched: the sampled blocks match, the file is not read again
+    os.utime(f, ns=(0, 10**18))
+    assert hash_with_cache() == (h, 1)
+    # first block changed
+    with f.open("r+b") as w:
+        w.write(b"X")
+    h2, hits = hash_with_cache()
+    assert h2 != h and hits == 0
+    assert h2 == LocalAux().node_from(f).hash
+
+
+def test_hash_cache_load_and_racy(tmp_path: Path):
+    from ghrapt.util.tree.hash_cache import HEADER, HashCache
+
+    store = tmp_path / ".cache"
+    sha = "ab" * 20
+    store.write_text(
+        f"{HEADER}1 1000 {sha} -\ta\nbad line\tb\n2 x {sha} -\tc\n3 3000 {sha} -\td"
+    )
+    cache = HashCache(str(store))
+    assert cache.entries == {"a": (1, 1000, sha, None)}
+    assert cache.dirty  # saved without the bad lines
+
+    # a file written as it is read may keep its size and mtime: not entered
+    f = tmp_path / "f"
+    f.write_text("f")
+    aux = LocalAux()
+    aux.hash_cache = cache
+    aux.node_from(f, "f").hash
+    assert cache.get(str(f)) is None
+    os.utime(f, ns=(0, 10**9))
+    aux.node_from(f, "f").hash
+    assert cache.get(str(f))[:2] == (1, 10**9)
+
+
+def test_stats(tmp_path: Path):
+    from ghrapt.util.stats import Stats
+
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "f").write_bytes(b"12345")
+    (tmp_path / "g.o").write_bytes(b"")
+    (tmp_path / ".gitignore").write_text("*.o\n")
+    aux = LocalAux()
+    aux.stats = stats = Stats()
+    events = []
+    stats.subscribe(lambda name, *args: events.append(name))
+    assert aux.node_from(tmp_path, "ROOT").hash
+    c = stats.counts
+    assert c["listdir"] == 2 and c["listdir.entries"] == 4
+    assert c["hash.files"] == 2 and c["hash.bytes"] == 4 + 5
+    assert c["tree.built"] == 2
+    assert c["ignore.Path<*.o>.hit"] == 1 and c["ignore.Path<*.o>.miss"] == 3
+    assert "ignore.exclude" in events and stats.times["hash"] > 0
+
+    # recorded from several threads: no update lost
+    from concurrent.futures import ThreadPoolExecutor
+
+    def count_many(_):
+        for _ in range(2000):
+            stats.count("n")
+
+    stats = Stats()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(count_many, range(8)))
+    assert stats.counts["n"] == 16000
@@ -0,0 +1,92 @@
+from hashlib import sha1
+
+from ghrapt.util.tree.repo_node import build_tree
+
+EMPTY = "e69de29bb2d1d6434b8b29ae775ad8c2e48c5391"
+LISTING = [
+    ("a/b/x", "100644", EMPTY, 0),
+    ("a/y", "100644", EMPTY, 0),
+    ("z", 0o100644, EMPTY, 0),
+]
+
+
+def names(node):
+    return [x.name for x in node]
+
+
+def test_build_sorted():
+    root = build_tree(LISTING)
+    assert names(root) == ["a", "z"]
+    a = root.get_sub_dir("a")
+    assert a.is_dir()
+    assert names(a) == ["b", "y"]
+    assert root.get_sub(["a", "b", "x"]).hash == EMPTY
+    assert root.get_hash() == "73945e2906d82689bc140718cec74aea492fd781"
+
+
+def test_build_unsorted():
+    root = build_tree(
+        [LISTING[2], LISTING[1], ("a/b", "40000", None, None), LISTING[0]]
+    )
+    assert names(root) == ["z", "a"]
+    assert names(root.get_sub_dir("a")) == ["y", "b"]
+    assert root.get_hash() == "73945e2906d82689bc140718cec74aea492fd781"
+
+
+def test_build_deep():
+    path = "/".join(["d"] * 3000)
+    root = build_tree([(path + "/f", "100644", EMPTY, 0)])
+    sub = root
+    while sub.is_dir():
+        sub = sub.first_child
+    assert sub.name == "f"
+    assert sub.get_path() == "/" + path + "/f"
+    assert root.get_sub_dir_or_intern("d", "d", "e").get_path() == "/d/d/e"
+
+
+def test_traversal_order():
+    root = build_tree(LISTING)
+    paths = lambda it: [x.get_path() for x in it]  # noqa: E731
+    assert paths(root.iter_preorder()) == ["/a", "/a/b", "/a/b/x", "/a/y", "/z"]
+    assert paths(root.iter_postorder()) == ["/a/b/x", "/a/b", "/a/y", "/a", "/z"]
+    assert paths(root.iter_breadth_first()) == ["/a", "/z", "/a/b", "/a/y", "/a/b/x"]
+    prune = lambda x: x.name == "b"  # noqa: E731
+    assert paths(root.iter_preorder(prune)) == ["/a", "/a/b", "/a/y", "/z"]
+    assert paths(root.iter_postorder(prune)) == ["/a/b", "/a/y", "/a", "/z"]
+    assert paths(root.iter_breadth_first(prune)) == ["/a", "/z", "/a/b", "/a/y"]
+
+
+def test_deep_hash():
+    root = build_tree([("/".join(["d"] * 5000) + "/f", "100644", EMPTY, 0)])
+    assert sum(1 for _ in root.iter_postorder()) == 5001
+    entry = b"100644 f\x00" + bytes.fromhex(EMPTY)
+    for _ in range(5001):
+        tree = b"tree %d\x00%s" % (len(entry), entry)
+        entry = b"40000 d\x00" + sha1(tree).digest()
+    assert root.get_hash() == sha1(tree).hexdigest()
+
+
+def test_diff_trees():
+    from ghrapt.util.tree.diff import diff_trees
+
+    other = "0" * 40
+    left = build_tree(
+        LISTING + [("a/e", "40000", None, None), ("n", "100644", other, 0)]
+    )
+    right = build_tree(
+        [LISTING[0], ("a/y", "100644", other, 0), ("g", "100644", other, 0)]
+    )
+    assert [x[:2] for x in diff_trees(left, right)] == [
+        ("+", "z"),
+        ("+", "n"),
+        ("-", "g"),
+        ("M", "a/y"),
+    ]
+    assert not list(diff_trees(build_tree(LISTING), build_tree(reversed(LISTING))))
+
+    # a directory with the same tree hash is not descended into
+    a = left.get_sub_dir("a").get_hash()
+    right = build_tree([("a", "40000", a, None), ("a/w", "100644", other, 0)])
+    assert [x[:2] for x in diff_trees(left, right)] == [("+", "z"), ("+", "n")]
+    right = build_tree([("a", "40000", other, None), ("a/w", "100644", other, 0)])
+    assert ("-", "a/w") in [x[:2] for x in diff_trees(left, right)]
@@ -0,0 +1,174 @@
+import os
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from ghrapt.util.stats import Stats
+from ghrapt.util.tree.git_objects import ObjectStore
+from ghrapt.util.tree.walker import Walker
+
+
+def git(*args, cwd=None) -> str:
+    env = dict(os.environ, GIT_CONFIG_NOSYSTEM="1", HOME=str(cwd or "."))
+    out = subprocess.run(
+        ["git", *args], cwd=cwd, env=env, check=True, capture_output=True
+    )
+    return out.stdout.decode().strip()
+
+
+@pytest.fixture
+def server(tmp_path: Path):
+    """git http-backend as a CGI script, for the repositories in tmp_path."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.cgi(b"")
+
+        def do_POST(self):
+            if self.headers.get("Transfer-Encoding") == "chunked":
+                body = []
+                while True:
+                    n = int(self.rfile.readline().strip(), 16)
+                    body.append(self.rfile.read(n))
+                    self.rfile.readline()
+                    if not n:
+                        break
+                body = b"".join(body)
+            else:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+            self.cgi(body)
+
+        def cgi(self, body: bytes):
+            path, _, query = self.path.partition("?")
+            env = {
+                "PATH": os.environ["PATH"],
+                "HOME": str(tmp_path),
+                "GIT_CONFIG_NOSYSTEM": "1",
+                "GIT_PROJECT_ROOT": str(tmp_path),
+                "GIT_HTTP_EXPORT_ALL": "1",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "REQUEST_METHOD": self.command,
+                "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+                "CONTENT_LENGTH": str(len(body)),
+                "REMOTE_ADDR": "127.0.0.1",
+            }
+            if self.headers.get("Git-Protocol"):
+                env["HTTP_GIT_PROTOCOL"] = self.headers["Git-Protocol"]
+            out = subprocess.run(
+                ["git", "http-backend"], input=body, env=env, capture_output=True
+            ).stdout
+            head, _, payload = out.partition(b"\r\n\r\n")
+            status = 200
+            headers = []
+            for line in head.decode().split("\r\n"):
+                k, _, v = line.partition(": ")
+                if k.lower() == "status":
+                    status = int(v.split()[0])
+                else:
+                    headers.append((k, v))
+            self.send_response(status)
+            for k, v in headers:
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    t = threading.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_fetch_and_push(tmp_path: Path, server):
+    pytest.importorskip("requests")
+    from ghrapt.helper.smart_http import SmartHttp
+
+    work = tmp_path / "work"
+    (work / "src").mkdir(parents=True)
+    (work / "README").write_text("read me\n")
+    (work / "src" / "a.py").write_text("print('a')\n" * 100)
+    (work / "src" / "b.py").write_text("b = 1\n")
+    git("init", "-q", "-b", "main", cwd=work)
+    git("add", ".", cwd=work)
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "1", cwd=work)
+    (work / "src" / "a.py").write_text("print('a')\n" * 101)  # a delta
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qam", "2", cwd=work)
+    git("clone", "-q", "--bare", str(work), str(tmp_path / "remote.git"))
+    bare = tmp_path / "remote.git"
+    git("config", "http.receivepack", "true", cwd=bare)
+    git("config", "uploadpack.allowFilter", "true", cwd=bare)
+    git("repack", "-adq", cwd=bare)
+    head = git("rev-parse", "main", cwd=bare)
+
+    remote = SmartHttp(f"{server}/remote.git")
+    refs = remote.ls_refs()
+    assert refs["refs/heads/main"] == head
+    assert refs["HEAD"] == head
+
+    # trees and commits only
+    (tmp_path / "local" / "objects").mkdir(parents=True)
+    store = ObjectStore(tmp_path / "local")
+    name, count = remote.fetch([head], store)
+    assert count == 6  # 2 commits, 2 root and 2 src trees
+    assert store.tree_id(head) == git("rev-parse", "main^{tree}", cwd=bare)
+    a_py = git("rev-parse", "main:src/a.py", cwd=bare)
+    assert not store.has(a_py)
+    git("verify-pack", str(store.dirs[0] / "pack" / f"{name}.idx"))
+
+    # everything, blobs as deltas of each other
+    (tmp_path / "full" / "objects").mkdir(parents=True)
+    full = ObjectStore(tmp_path / "full")
+    assert remote.fetch([head], full, None)[1] == 10
+    old_a = git("rev-parse", "main^:src/a.py", cwd=bare)
+    assert full.read(old_a)[1] == b"print('a')\n" * 100
+
+    # the blobs are fetched by checkout
+    out = tmp_path / "out"
+    assert remote.checkout(store, head, out) == 3
+    assert (out / "src" / "a.py").read_text() == "print('a')\n" * 101
+    assert store.has(a_py)
+    assert remote.checkout(store, head, out) == 0
+
+    # push a change: only what differs is sent
+    (out / "src" / "b.py").write_text("b = 2\n")
+    (out / "run.sh").write_text("#!/bin/sh\n")
+    (out / "run.sh").chmod(0o755)
+    (out / "empty").mkdir()
+    remote.stats = stats = Stats()
+    root = Walker(gitignore=False).tree(out)
+    new = remote.push("refs/heads/main", root, "update", store)
+    # commit, root and src trees, b.py and run.sh
+    assert stats.counts["push.objects"] == 5
+    assert git("rev-parse", "main", cwd=bare) == new
+    assert git("rev-parse", "main^", cwd=bare) == head
+    git("fsck", "--strict", cwd=bare)
+    assert git("show", "main:src/b.py", cwd=bare) == "b = 2"
+    assert git("ls-tree", "main", "run.sh", cwd=bare).startswith("100755 blob")
+
+    # to a new branch of an unknown history: everything is sent
+    remote.push("refs/heads/other", root, "again")
+    assert git("rev-parse", "other^{tree}", cwd=bare) == git(
+        "rev-parse", "main^{tree}", cwd=bare
+    )
+
+
+
+def test_pkt_lines():
+    from ghrapt.helper.smart_http import iter_pkt_lines, pkt_line
+
+    data = pkt_line("hello") + b"0004" + pkt_line(b"world") + b"00010000"
+    assert data == b"0009hello00040009world00010000"
+    want = [b"hello", b"", b"world", None, None]
+    assert list(iter_pkt_lines([data])) == want
+    assert list(iter_pkt_lines(data[i : i + 3] for i in range(0, 30, 3))) == want
+    # 000a announces six bytes: the last length is cut short
+    with pytest.raises(ValueError, match="Truncated"):
+        list(iter_pkt_lines([b"0009hello0004000aworld0000"]))
@@ -0,0 +1,91 @@
+import re
+import subprocess
+from pathlib import Path
+
+from ghrapt.helper.remote import remote_tree
+from ghrapt.util.tree.git_objects import ObjectStore, parse_tree
+from ghrapt.util.tree.sparse import DESCEND, DROP, KEEP, Sparse
+
+
+def test_select():
+    s = Sparse(["/docs/api/", "*.md"], ["build/", "*.tmp", "!keep.tmp"])
+    assert s.select("docs", True) == DESCEND
+    assert s.select("docs/api", True) == KEEP
+    assert s.select("docs/api/x.tmp", False, True) == DROP
+    assert s.select("docs/api/keep.tmp", False, True) == KEEP
+    assert s.select("src", True) == DESCEND  # may hold *.md files
+    assert s.select("src/a.py", False) == DROP
+    assert s.select("src/a.md", False) == KEEP
+    assert s.select("build", True) == DROP
+    assert Sparse(["/docs/api/*.md"]).select("src", True) == DROP
+    assert not Sparse()
+
+
+class FakeGitHub:
+    """Answers the tree queries of RemoteAux from a local repository."""
+
+    def __init__(self, store: ObjectStore) -> None:
+        self.store = store
+        self.owner = "o"
+        self.repo = "r"
+        self.queries = []
+
+    def post_gql(self, json):
+        query = json["query"]
+        self.queries.append(query)
+        repo = {}
+        found = re.findall(r'(\w+): object\((oid|expression): "([^"]*)"\)', query)
+        for alias, how, arg in found:
+            oid = arg if how == "oid" else self.store.tree_id(arg.rstrip(":"))
+            entries = []
+            for mode, name, sha in parse_tree(self.store.read(oid)[1]):
+                obj = None if mode == 0o40000 else {"byteSize": self.store.size(sha)}
+                entries.append(
+                    {
+                        "name": name.decode(),
+                        "mode": mode,
+                        "oid": sha.hex(),
+                        "object": obj,
+                    }
+                )
+            repo[alias] = {"oid": oid, "entries": entries}
+        return {"data": {"repository": repo}}
+
+
+def test_remote_sparse(tmp_path: Path):
+    for d in ("docs/api", "docs/guide", "src/pkg", "build/out"):
+        for i in range(3):
+            p = tmp_path / d / f"f{i}.md"
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text(f"{d} {i}\n")
+            (tmp_path / d / f"f{i}.py").write_text(f"{d} {i}\n")
+    git = ["git", "-c", "user.name=t", "-c", "user.email=t@t"]
+    subprocess.run([*git, "init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run([*git, "add", "."], cwd=tmp_path, check=True)
+    subprocess.run([*git, "commit", "-qm", "x"], cwd=tmp_path, check=True)
+    client = FakeGitHub(ObjectStore(tmp_path / ".git"))
+
+    def paths(root):
+        top = len(root.get_path())
+        return sorted(x.get_path()[top:] for x in root.iter_preorder())
+
+    full = paths(remote_tree(client, batch=100))
+    assert len(full) == 4 * 6 + 7
+    assert len(client.queries) == 3  # one per level
+
+    client.queries.clear()
+    root = remote_tree(client, "HEAD", ["/docs/api/", "/src/**/*.py"], ["f0.*"])
+    assert paths(root) == [
+        "docs",
+        "docs/api",
+        "docs/api/f1.md",
+        "docs/api/f1.py",
+        "docs/api/f2.md",
+        "docs/api/f2.py",
+        "src",
+        "src/pkg",
+        "src/pkg/f1.py",
+        "src/pkg/f2.py",
+    ]
+    fetched = " ".join(client.queries)
+    assert fetched.count("oid:") == 4  # docs, docs/api, src, src/pkg
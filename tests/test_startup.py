@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+LAZY = (
+    "ghrapt.util.tree",
+    "ghrapt.util.listing",
+    "ghrapt.helper",
+    "hashlib",
+    "json",
+    "logging",
+    "pathlib",
+)
+
+
+def test_lazy_imports():
+    code = "import sys, ghrapt.__main__; print(*sys.modules, sep='\\n')"
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert [x for x in out.split() if x.startswith(LAZY)] == []
+
+
+def test_formats():
+    from ghrapt.__main__ import FORMATS
+    from ghrapt.util.listing import WRITERS
+
+    assert FORMATS == tuple(WRITERS)
+
+
+def test_list_ext(tmp_path: Path):
+    import json
+
+    for name in ("x.py", "y.md", "z.p", "py"):
+        (tmp_path / name).write_text(name)
+    out = subprocess.run(
+        [sys.executable, "-m", "ghrapt", "list", str(tmp_path), "--ext", "py"]
+        + ["--ext", "md", "--format", "ndjson"],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    paths = sorted(json.loads(line)["path"] for line in out.splitlines())
+    assert paths == ["", "x.py", "y.md"]  # not z.p for "py", nor py
+
+
+def test_verify(tmp_path: Path):
+    def run(*args: str):
+        return subprocess.run(
+            [sys.executable, "-m", "ghrapt", *args],
+            cwd=Path(__file__).parent.parent,
+            capture_output=True,
+            text=True,
+        )
+
+    top = tmp_path / "top"
+    (top / "d").mkdir(parents=True)
+    (top / "d" / "f").write_text("f")
+    (top / "run").write_text("#!/bin/sh\n")
+    (top / "run").chmod(0o755)
+    for x in (top / "d" / "f", top / "run"):
+        os.utime(x, ns=(0, 10**9))  # not racily clean: cached
+    git = dict(cwd=top, check=True, capture_output=True, text=True)
+    subprocess.run(["git", "init", "-q"], **git)
+    subprocess.run(["git", "add", "-A"], **git)
+    tree = subprocess.run(["git", "write-tree"], **git).stdout.strip()
+    assert run("verify", str(top), tree).returncode == 0  # "run" is 100755
+    out = run("verify", str(top), "HEAD")  # no commit yet
+    assert (out.returncode, out.stderr) == (1, "error: Unknown revision 'HEAD'\n")
+
+    (top / "run").chmod(0o644)
+    cache = tmp_path / "cache"
+    out = run("verify", str(top), tree, "--cache", str(cache))
+    assert out.returncode == 1
+    assert cache.exists()  # done() ran before the exit
+    snapshot = tmp_path / "snapshot"
+    (top / "run").chmod(0o755)
+    run("list", str(top), "--format", "ndjson", "-o", str(snapshot))
+    (top / "run").chmod(0o644)
+    out = run("verify", str(top), str(snapshot))
+    assert (out.returncode, out.stdout) == (1, "M run\n")
@@ -0,0 +1,266 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from ghrapt.util.stats import Stats
+from ghrapt.util.tree.local_node import LocalAux
+from ghrapt.util.tree.walker import Walker
+
+
+def plain_hash(path: Path):
+    return LocalAux().node_from(path, "ROOT").hash
+
+
+def test_walker_reuse(tmp_path: Path):
+    for i in range(20):
+        (tmp_path / "d" / str(i % 3)).mkdir(parents=True, exist_ok=True)
+        (tmp_path / "d" / str(i % 3) / f"f{i}").write_text(f"{i}" * i)
+    (tmp_path / "d" / ".gitignore").write_text("f1*\n")
+    (tmp_path / "d" / "1" / "f19").write_text("x")
+    for f in tmp_path.glob("d/**/*"):
+        os.utime(f, ns=(0, 10**9))  # not racily clean: cached
+
+    with Walker(workers=4, stats=Stats()) as w:
+        h = w.hash(tmp_path)
+        assert h == plain_hash(tmp_path)
+        read = w.stats.counts["hash.files"]
+        # again: the files and the .gitignore are not read again
+        assert w.hash(tmp_path) == h
+        assert w.stats.counts["hash.files"] == read
+        assert len(w.gitignores.files) > 0
+        parsed = dict(w.gitignores.files)
+        w.hash(tmp_path)
+        assert w.gitignores.files == parsed
+
+        # a rewritten file is seen
+        f = tmp_path / "d" / "0" / "f0"
+        f.write_text("changed")
+        os.utime(f, ns=(0, 10**9))
+        assert w.hash(tmp_path) == plain_hash(tmp_path) != h
+        assert w.stats.counts["hash.files"] == read + 1
+
+
+def test_stat_filter(tmp_path: Path):
+    from ghrapt.util.tree.stat_filter import StatFilter
+
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "small.txt").write_text("abc")
+    (tmp_path / "big.txt").write_text("x" * 100)
+    (tmp_path / "small.bin").write_text("abc")
+    (tmp_path / "sub" / "old.TXT").write_text("abc")
+    os.utime(tmp_path / "sub" / "old.TXT", (0, 0))
+    (tmp_path / "link.txt").symlink_to("small.txt")
+
+    def names(keep):
+        stats = Stats()
+        root = Walker(keep=keep, stats=stats).tree(tmp_path)
+        top = len(root.get_path())
+        found = sorted(x.get_path()[top:] for x in root.iter_preorder())
+        return found, stats.counts["stat"]
+
+    keep = StatFilter(max_size=10, extensions=["txt"])
+    found, stat_calls = names(keep)
+    assert found == ["link.txt", "small.txt", "sub", "sub/old.TXT"]
+    # root, big, small, link and its target, sub, old: small.bin is not stat'ed
+    assert stat_calls == 7
+    found, _ = names(StatFilter(newer=1000, types="f"))
+    assert found == ["big.txt", "small.bin", "small.txt", "sub"]
+    found, _ = names(StatFilter(max_size=float("inf"), older=float("inf")))
+    assert found == names(StatFilter())[0]
+
+
+def test_nested_gitignore(tmp_path: Path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / ".gitignore").write_text("*.o\nbuild/\n")
+    (tmp_path / "a" / "b" / "x.o").write_text("")
+    (tmp_path / "a" / "b" / "x.c").write_text("")
+    (tmp_path / "a" / "b" / "build").mkdir()
+    (tmp_path / "a" / "b" / "build" / "y").write_text("")
+    root = Walker().tree(tmp_path)
+    found = [x.name for x in root.iter_preorder()]
+    assert sorted(found) == [".gitignore", "a", "b", "x.c"]
+
+
+def test_git_index(tmp_path: Path):
+    import subprocess
+
+    def git(*args):
+        return subprocess.run(
+            ["git", "-c", "core.autocrlf=false", *args],
+            cwd=tmp_path,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    git("init", "-q")
+    for i in range(12):
+        d = tmp_path / "a" / f"d{i % 3}" / f"e{i % 2}"
+        d.mkdir(parents=True, exist_ok=True)
+        (d / f"f{i}").write_text(f"{i}\n" * i)
+    (tmp_path / "a" / "link").symlink_to("d0")
+    for p in tmp_path.glob("a/**/*"):
+        os.utime(p, (1, 1), follow_symlinks=False)  # not racily clean
+    git("add", "a")
+    tree = git("write-tree")
+    (tmp_path / "untracked").write_text("u")
+
+    for version in ("2", "3", "4"):
+        git("update-index", "--index-version", version)
+        stats = Stats()
+        with Walker(stats=stats) as w:
+            root = w.tree(tmp_path)
+            assert root.get_sub_dir("a").get_hash() == git("rev-parse", f"{tree}:a")
+            assert root.get_hash() == Walker(git_index=False).hash(tmp_path)
+        assert stats.counts["hash.files"] == 1  # untracked
+        assert stats.counts["index.trees"] == 1
+
+    # a rewritten file, and a file now executable: recomputed
+    f = tmp_path / "a" / "d1" / "e1" / "f1"
+    f.write_text("changed")
+    (tmp_path / "a" / "d2" / "e0" / "f2").chmod(0o755)
+    git("update-index", "--chmod=+x", "a/d2/e0/f2")
+    stats = Stats()
+    with Walker(stats=stats) as w:
+        assert w.hash(tmp_path) == Walker(git_index=False).hash(tmp_path)
+    assert stats.counts["hash.files"] == 2
+
+
+def test_list_workers(tmp_path: Path):
+    for i in range(60):
+        d = tmp_path / f"d{i % 4}" / f"e{i % 5}" / f"g{i % 3}"
+        d.mkdir(parents=True, exist_ok=True)
+        (d / f"f{i}").write_text(f"{i}")
+    (tmp_path / "d1" / ".gitignore").write_text("e2/\nf1*\n")
+
+    def walk(**kw):
+        stats = Stats()
+        root = Walker(stats=stats, **kw).tree(tmp_path)
+        top = len(root.get_path())
+        paths = [x.get_path()[top:] for x in root.iter_preorder()]
+        return paths, root.get_hash(), stats.counts["listdir"]
+
+    paths, h, listed = walk()
+    assert "/d1/e2" not in paths and "/d1/e0/g0/f15" not in paths
+    assert walk(list_workers=8) == (paths, h, listed)
+    assert listed == 1 + 4 + 19 + 19 * 3  # d1/e2 ignored
+
+
+def test_readahead(tmp_path: Path):
+    for i in range(30):
+        d = tmp_path / f"d{i % 3}"
+        d.mkdir(exist_ok=True)
+        (d / f"f{i}").write_bytes(bytes([i]) * (i * 1000))
+        os.utime(d / f"f{i}", ns=(0, 10**9))  # not racily clean: cached
+    os.link(tmp_path / "d0" / "f3", tmp_path / "d0" / "hard")
+    h = Walker(git_index=False).hash(tmp_path)
+    for workers in (0, 3):
+        stats = Stats()
+        w = Walker(workers=workers, readahead=20000, stats=stats, git_index=False)
+        with w:
+            assert w.hash(tmp_path) == h
+            assert stats.counts["readahead.files"] == stats.counts["hash.files"] == 30
+            # cache hits are neither read nor prefetched
+            assert w.hash(tmp_path) == h
+            assert stats.counts["readahead.files"] == stats.counts["hash.files"] == 30
+
+
+def test_lfs(tmp_path: Path):
+    from hashlib import sha256
+
+    from ghrapt.util.tree.lfs import Lfs, pointer
+
+    files = {
+        "big.bin": b"b" * 5000,
+        "small.txt": b"small\n",
+        "data/x.psd": b"psd",
+        "data/empty.psd": b"",  # git lfs commits an empty blob for it
+        "data/keep.bin": b"k" * 5000,
+        "data/.gitattributes": b"keep.bin -filter\n",
+        ".gitattributes": b"*.psd filter=lfs diff=lfs merge=lfs -text\n",
+    }
+    lfs_paths = ("big.bin", "data/x.psd")
+    top = tmp_path / "top"
+    want = tmp_path / "want"  # the pointers in place of the LFS files
+    for path, data in files.items():
+        for d in (top, want):
+            (d / path).parent.mkdir(parents=True, exist_ok=True)
+        (top / path).write_bytes(data)
+        os.utime(top / path, ns=(0, 10**9))  # not racily clean: cached
+        if path in lfs_paths:
+            data = pointer(sha256(data).hexdigest(), len(data))
+        (want / path).write_bytes(data)
+    assert pointer("ab" * 32, 3) == (
+        b"version https://git-lfs.github.com/spec/v1\n"
+        b"oid sha256:" + b"ab" * 32 + b"\nsize 3\n"
+    )
+
+    stats = Stats()
+    lfs = Lfs(4096)
+    with Walker(lfs=lfs, stats=stats, workers=2) as w:
+        assert w.hash(top) == Walker().hash(want)
+        assert stats.counts["lfs.files"] == 2
+        assert sorted(p[len(str(top)) + 1 :] for p, _ in lfs.objects.values()) == [
+            "big.bin",
+            "data/x.psd",
+        ]
+        # the sha256 is cached: not read again
+        w.hash(top)
+        assert stats.counts["lfs.files"] == 2
+        # another tree: the records of the previous one are dropped
+        other = tmp_path / "other"
+        other.mkdir()
+        (other / "f").write_bytes(b"f")
+        w.hash(other)
+        assert lfs.objects == lfs.pointers == {}
+        assert len(lfs.rules) == 1
+
+    # the digests of the walk come from the same read as the sha256
+    stats = Stats()
+    with Walker(lfs=Lfs(4096), stats=stats, digests=("sha256", "md5")) as w:
+        root = w.tree(top)
+        big = root.get_child_by_name("big.bin")
+        assert big.digests["sha256"] == sha256(files["big.bin"]).hexdigest()
+        assert big.hash == Walker().tree(want).get_child_by_name("big.bin").hash
+        assert w.hash(top) == Walker().hash(want)
+        assert stats.counts["lfs.files"] == 2
+        assert stats.counts["hash.files"] == 4  # the other files, once each
+
+
+def test_object_format(tmp_path: Path):
+    import subprocess
+    from hashlib import sha1, sha256
+
+    def git(*args):
+        return subprocess.run(
+            ["git", "-c", "core.autocrlf=false", *args],
+            cwd=tmp_path,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    git("init", "-q", "--object-format=sha256")
+    (tmp_path / "s").mkdir()
+    (tmp_path / "s" / "b").write_text("yo\n")
+    (tmp_path / "x").write_text("hi\n")
+    (tmp_path / "l").symlink_to("x")
+    git("add", "-A")
+    tree = git("write-tree")
+    blob = git("rev-parse", f"{tree}:x")  # .git itself is not walked
+
+    digests = ("sha256", "git-sha1")
+    with Walker(object_format="sha256", digests=digests) as w:
+        assert w.hash(tmp_path) == tree
+        root = w.tree(tmp_path)
+        x = root.get_child_by_name("x")
+        assert x.hash == blob
+        assert x.digests == {
+            "sha256": sha256(b"hi\n").hexdigest(),
+            "git-sha1": sha1(b"blob 3\0hi\n").hexdigest(),
+        }
+        assert root.get_child_by_name("l").digests == {}
+    for bad in ("md55", "git-md5", "shake_128"):
+        with pytest.raises(ValueError, match="Unknown"):
+            Walker(digests=("sha256", bad))
@@ -0,0 +1,89 @@
+import os
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+from ghrapt.util.tree.local_node import LocalAux
+from ghrapt.util.tree.watch import Inotify, Poller, Watcher
+
+
+def tree_hash(path: Path):
+    aux = LocalAux()
+    aux.symlink_strategy("keep", "keep")
+    return aux.node_from(path, "ROOT").hash
+
+
+def sources():
+    yield "poll", lambda: Poller(0)
+    if sys.platform.startswith("linux"):
+        yield "inotify", Inotify
+
+
+@pytest.mark.parametrize("make_source", [v for _, v in sources()])
+def test_watch_updates_hash(tmp_path: Path, make_source):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "x").write_text("x")
+    (tmp_path / "y").write_text("y")
+    aux = LocalAux()
+    aux.symlink_strategy("keep", "keep")
+    w = Watcher(aux.node_from(tmp_path, "ROOT"), make_source(), debounce=0.05)
+    try:
+        assert w.hash() == tree_hash(tmp_path)
+
+        (tmp_path / "a" / "b" / "x").write_text("changed")
+        (tmp_path / "a" / "new").mkdir()
+        (tmp_path / "a" / "new" / "n").write_text("n")
+        (tmp_path / "y").unlink()
+        while w.run_once(1.0):
+            pass
+        assert w.hash() == tree_hash(tmp_path)
+        gen, paths = w.changed_since(0)
+        assert gen >= 1
+        assert {"a/b/x", "a/new", "y"} <= set(paths)
+
+        os.rename(tmp_path / "a", tmp_path / "c")
+        (tmp_path / "c" / "b" / "x").write_text("again")
+        while w.run_once(1.0):
+            pass
+        assert w.hash() == tree_hash(tmp_path)
+    finally:
+        w.close()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs unix sockets")
+def test_watch_socket(tmp_path: Path):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "f").write_text("f")
+    aux = LocalAux()
+    w = Watcher(aux.node_from(tmp_path / "d", "ROOT"), Poller(0))
+    server = w.serve(str(tmp_path / "sock"))
+
+    def ask(line):
+        with socket.socket(socket.AF_UNIX) as s:
+            s.connect(str(tmp_path / "sock"))
+            s.sendall(line)
+            return b"".join(iter(lambda: s.recv(4096), b"")).decode()
+
+    try:
+        assert ask(b"hash\n") == tree_hash(tmp_path / "d") + "\n"
+        assert ask(b"changed\n") == "0\n"
+        assert ask(b"changed abc\n") == "error bad generation 'abc'\n"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_watch_prunes_changes(tmp_path: Path):
+    (tmp_path / "d").mkdir()
+    aux = LocalAux()
+    w = Watcher(aux.node_from(tmp_path / "d", "ROOT"), Poller(0), max_changes=4)
+    for i in range(6):
+        (tmp_path / "d" / f"f{i}").write_text("f")
+        while w.run_once(1.0):
+            pass
+    assert len(w.changes) <= 4
+    assert w.changed_since(5) == (6, ["f5"])
+    assert w.changed_since(0) == (6, None)
+    assert w.query("changed", "0") == "error generation 0 expired\n"